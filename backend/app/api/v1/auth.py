@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request, Response, Depends
 from app.services.auth_service import auth_service
 from app.services.session_service import session_service
 from app.services.supabase_service import supabase_service
+from app.services.user_directory_service import user_directory_service
 from app.core.dependencies import get_current_user, CurrentUser
 from app.schemas.auth import (
     LoginRequest, LoginResponse, RegisterRequest,
@@ -36,6 +37,7 @@ async def register(data: RegisterRequest):
         )
 
         user = result.user
+        await user_directory_service.put(user)
 
         if user and user.id:
             # 建立 user_profile 記錄
@@ -101,6 +103,7 @@ async def logout(
     await auth_service.logout(
         request=request,
         response=response,
+        user_id=current_user.user_id,
         logout_all_devices=data.logout_all_devices
     )
     
@@ -173,7 +176,7 @@ async def revoke_session(
     
     for s in sessions:
         if s.session_id.startswith(session_id.replace("...", "")):
-            await session_service.destroy_session(s.session_id)
+            await session_service.remove_session(current_user.user_id, s.session_id)
             return BaseResponse(message="Session 已撤銷")
     
     return BaseResponse(success=False, message="Session 不存在")
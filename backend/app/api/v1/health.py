@@ -33,7 +33,8 @@ async def readiness_check():
     try:
         result = await supabase_service.table_select(
             table="courses",
-            columns="id",
+            select="id",
+            limit=1,
             use_service_key=True
         )
         checks["supabase"] = True
@@ -46,4 +47,4 @@ async def readiness_check():
         "status": "ready" if all_healthy else "degraded",
         "checks": checks,
         "timestamp": datetime.utcnow().isoformat()
-    }
\ No newline at end of file
+    }
@@ -11,7 +11,7 @@ from app.services.line_binding_service import (
     NotificationPreferences
 )
 from app.services.line_message_service import line_message_service
-from app.services.supabase_service import supabase_service
+from app.services.database_service import database_service
 from app.core.dependencies import get_current_user, require_staff, CurrentUser
 from app.schemas.line import (
     NotificationPreferencesRequest,
@@ -175,39 +175,22 @@ async def get_notification_history(
     elif user_id and not current_user.is_staff():
         query_user_id = current_user.user_id  # 忽略非員工的 user_id 參數
 
-    # 建立查詢條件
-    filters = {}
+    # 建立查詢條件（員工未指定 user_id 時查詢所有用戶）
+    filter_user_id = None
     if query_user_id and not (current_user.is_staff() and user_id is None):
-        filters["user_id"] = f"eq.{query_user_id}"
-
-    if channel:
-        filters["channel_type"] = f"eq.{channel}"
-
-    if notification_type:
-        filters["notification_type"] = f"eq.{notification_type}"
+        filter_user_id = query_user_id
 
     # 計算 offset
     offset = (page - 1) * page_size
 
     try:
-        # 查詢總數
-        count_result = await supabase_service.table_select(
-            table="line_notification_logs",
-            select="id",
-            filters=filters,
-            use_service_key=True
-        )
-        total = len(count_result) if count_result else 0
-
-        # 查詢資料
-        result = await supabase_service.table_select(
-            table="line_notification_logs",
-            select="*",
-            filters=filters,
-            order="created_at.desc",
+        # 單次查詢取得當頁資料與總數（啟用直連時走 asyncpg，否則走 PostgREST）
+        result, total = await database_service.get_notification_history(
+            user_id=filter_user_id,
+            channel_type=channel,
+            notification_type=notification_type,
             limit=page_size,
-            offset=offset,
-            use_service_key=True
+            offset=offset
         )
 
         items = [
@@ -227,7 +210,7 @@ async def get_notification_history(
 
         return NotificationHistoryResponse(
             items=items,
-            total=total,
+            total=total or 0,
             page=page,
             page_size=page_size,
         )
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from app.core.dependencies import require_admin
+from app.services.redis_service import redis_service
+from app.services.supabase_service import supabase_service
+from app.services.query_cache_service import query_cache_service
+from app.services.session_service import session_service
+from app.services.user_directory_service import user_directory_service
+from app.core.security import token_cache
+from datetime import datetime
+
+# 內部狀態（斷路器、副本、快取命中率等）僅限管理員查看，不放在公開的 /health 之下
+router = APIRouter(prefix="/metrics", tags=["監控"], dependencies=[Depends(require_admin)])
+
+@router.get("/", response_model=dict)
+async def metrics():
+    """上游呼叫指標（斷路器狀態、各端點延遲分佈、請求合併、唯讀副本、查詢快取、Redis、Session 活動寫入、Token 驗證快取與用戶目錄統計）"""
+    return {
+        "supabase": supabase_service.resilience_stats,
+        "coalesce": supabase_service.coalesce_stats,
+        "replicas": supabase_service.replica_stats,
+        "query_cache": query_cache_service.stats(),
+        "redis": redis_service.stats(),
+        "sessions": session_service.stats(),
+        "token_cache": token_cache.stats(),
+        "user_directory": await user_directory_service.stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
@@ -1,10 +1,11 @@
 from fastapi import APIRouter
-from app.api.v1 import auth, users, health, line_auth, line_notifications
+from app.api.v1 import auth, users, health, metrics, line_auth, line_notifications
 
 api_router = APIRouter(prefix="/api/v1")
 
 api_router.include_router(auth.router)
 api_router.include_router(users.router)
 api_router.include_router(health.router)
+api_router.include_router(metrics.router)
 api_router.include_router(line_auth.router)
 api_router.include_router(line_notifications.router)
\ No newline at end of file
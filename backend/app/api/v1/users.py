@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from app.core.dependencies import (
-    get_current_user, require_staff, require_admin, CurrentUser
+    get_current_user, get_data_loader, require_staff, require_admin, CurrentUser
 )
-from app.services.supabase_service import supabase_service
+from app.services.data_loader import DataLoader
+from app.services.profile_service import profile_service
 from app.schemas.response import DataResponse, PaginatedResponse
 from app.schemas.user import UserProfile
 from typing import List
@@ -11,85 +12,52 @@ router = APIRouter(prefix="/users", tags=["用戶管理"])
 
 @router.get("/profile", response_model=DataResponse[UserProfile])
 async def get_profile(
-    current_user: CurrentUser = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    loader: DataLoader = Depends(get_data_loader)
 ):
     """取得當前用戶完整資料"""
-    # 根據角色查詢對應的表
-    if current_user.role == "student":
-        table = "students"
-    elif current_user.role == "teacher":
-        table = "teachers"
-    else:
-        table = "employees"
-    
-    # 查詢 user_profile
-    profiles = await supabase_service.table_select(
-        table="user_profiles",
-        columns="*",
-        filters={"id": current_user.user_id},
-        use_service_key=True
-    )
-    
-    entity_data = {}
-    if profiles and len(profiles) > 0:
-        profile = profiles[0]
-        entity_id = profile.get(f"{table.rstrip('s')}_id")
-        
-        if entity_id:
-            entities = await supabase_service.table_select(
-                table=table,
-                columns="*",
-                filters={"id": entity_id},
-                use_service_key=True
-            )
-            if entities:
-                entity_data = entities[0]
+    # user_profiles 與角色實體（students / teachers / employees）一次取回
+    profile = await profile_service.get_profile(current_user.user_id, loader)
+    entity = profile.entity if profile else None
     
     return DataResponse(
         data=UserProfile(
             id=current_user.user_id,
             email=current_user.email,
             role=current_user.role,
-            name=entity_data.get("name"),
-            avatar_url=entity_data.get("avatar_url"),
-            is_active=entity_data.get("is_active", True)
+            name=entity.name if entity else None,
+            avatar_url=entity.avatar_url if entity else None,
+            is_active=entity.is_active is not False if entity else True
         )
     )
 
 @router.get("/", response_model=PaginatedResponse[UserProfile])
 async def list_users(
-    page: int = 1,
-    per_page: int = 20,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
     role: str = None,
     current_user: CurrentUser = Depends(require_staff)
 ):
     """列出所有用戶（僅限員工）"""
-    filters = {}
-    if role:
-        filters["role"] = role
-    
-    # 查詢 user_profiles
-    profiles = await supabase_service.table_select(
-        table="user_profiles",
-        columns="*",
-        filters=filters if filters else None,
-        use_service_key=True
+    # 查詢 user_profiles 當頁資料與角色實體（總數由 Content-Range 取得）
+    profiles, total = await profile_service.list_profiles(
+        role=role,
+        limit=per_page,
+        offset=(page - 1) * per_page
     )
     
-    # 分頁處理
-    total = len(profiles)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_profiles = profiles[start:end]
-    
     users = []
-    for item in paginated_profiles:
+    for profile in profiles:
+        entity = profile.entity
         users.append(UserProfile(
-            id=item["id"],
-            email="",  # 需要額外查詢
-            role=item.get("role", "student"),
-            name=None,
-            is_active=True
+            id=profile.id,
+            email=(entity.email if entity else None) or "",
+            role=profile.role,
+            name=entity.name if entity else None,
+            avatar_url=entity.avatar_url if entity else None,
+            # 未設定（NULL）視為啟用
+            is_active=profile.is_active is not False and (entity is None or entity.is_active is not False),
+            created_at=profile.created_at
         ))
     
     total_pages = (total + per_page - 1) // per_page
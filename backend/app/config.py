@@ -1,7 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 from functools import lru_cache
-from typing import Optional, Dict, Literal
+from typing import Optional, Dict, List, Literal
 
 # 頻道類型
 ChannelType = Literal["student", "teacher", "employee"]
@@ -25,6 +25,16 @@ class LineChannelConfig(BaseModel):
         return bool(self.messaging_token)
 
 
+class HttpUpstreamConfig(BaseModel):
+    """單一對外 HTTP 上游的連線池設定"""
+    timeout: float = 30.0
+    connect_timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+
+
 class Settings(BaseSettings):
     # App
     APP_NAME: str = "Education Management System"
@@ -38,9 +48,90 @@ class Settings(BaseSettings):
     SUPABASE_SERVICE_ROLE_KEY: str
     SUPABASE_JWT_SECRET: str
 
+    # 批次寫入（bulk insert / upsert）每批上限
+    SUPABASE_BULK_CHUNK_ROWS: int = 500
+    SUPABASE_BULK_CHUNK_BYTES: int = 1_000_000
+
+    # 上游呼叫韌性：冪等請求的重試次數與退避（秒）、斷路器門檻與冷卻時間（秒）
+    SUPABASE_RETRY_ATTEMPTS: int = 2
+    SUPABASE_RETRY_BACKOFF_BASE: float = 0.1
+    SUPABASE_RETRY_BACKOFF_MAX: float = 1.0
+    SUPABASE_BREAKER_FAILURE_THRESHOLD: int = 5
+    SUPABASE_BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # 單一 API 請求的處理期限（秒），上游呼叫逾時不超過剩餘期限；0 表示不限制
+    REQUEST_DEADLINE_SECONDS: float = 25.0
+
+    # PostgREST 唯讀副本（各副本的 Kong URL，空列表表示所有讀取走主庫）
+    SUPABASE_READ_URLS: List[str] = []
+    # 用戶寫入後多久內讀取固定走主庫（讀寫一致），副本失敗後暫停使用的秒數
+    SUPABASE_READ_STICKY_SECONDS: float = 5.0
+    SUPABASE_READ_REPLICA_DOWN_SECONDS: float = 30.0
+
+    # 批次 id 查詢（in.(...)）每次請求上限，避免 URL 過長
+    SUPABASE_IN_FILTER_MAX_IDS: int = 200
+    SUPABASE_IN_FILTER_MAX_CHARS: int = 4000
+
+    # 合併同時送出的相同讀取請求（single-flight）
+    SUPABASE_COALESCE_READS: bool = True
+
+    # PostgREST 讀取快取（存於 Redis）：表格名稱 → TTL 秒數，未列出的表格不快取
+    SUPABASE_CACHE_ENABLED: bool = False
+    SUPABASE_CACHE_TABLES: Dict[str, int] = {
+        "courses": 300,
+        "course_details": 300,
+        "employee_permission_levels": 3600,
+        "teachers": 120,
+        "teacher_details": 120,
+    }
+    # 快取鍵是否將 select 欄位排序（不含嵌入資源時）
+    SUPABASE_CACHE_NORMALIZE_SELECT: bool = True
+
+    # Postgres 直連（asyncpg，經 Supavisor）：熱門查詢略過 Kong/PostgREST
+    # 使用 Supavisor session 模式埠（預設 5432）才能快取 prepared statements；
+    # 若指向 transaction 模式埠（6543），請將 DATABASE_STATEMENT_CACHE_SIZE 設為 0
+    DATABASE_ENABLED: bool = False
+    DATABASE_URL: Optional[str] = None
+    DATABASE_POOL_MIN_SIZE: int = 1
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100
+    DATABASE_COMMAND_TIMEOUT: float = 10.0
+
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_PASSWORD: Optional[str] = None
+    # Redis Cluster：REDIS_URL 為任一節點；同一用戶的鍵以 {user_id} hash tag 落在同一個 slot
+    REDIS_CLUSTER_ENABLED: bool = False
+    # 舊鍵格式相容（session:<hash>、blacklist:<hash>、user_sessions:<user_id>）：
+    # 讀取不到新格式的 Session 時改讀舊鍵並搬移到新鍵，黑名單同時檢查舊鍵，登出所有裝置時一併刪除舊鍵。
+    # 升級後經過 REFRESH_TOKEN_EXPIRE_DAYS（舊黑名單的最長有效期）即可關閉
+    REDIS_LEGACY_KEY_FALLBACK: bool = True
+    # 連線池（叢集模式為每個節點的上限）：全部借出時最多等待 REDIS_POOL_TIMEOUT 秒（None 表示無限等待）
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: Optional[float] = 2.0
+    REDIS_SOCKET_TIMEOUT: Optional[float] = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: Optional[float] = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # 斷路器：連續失敗達門檻後開啟，開啟期間直接失敗；冷卻後放行一次試探
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 3
+    REDIS_BREAKER_RESET_TIMEOUT: float = 10.0
+    # 降級模式：Redis 無法使用時僅依 Access Token 簽章與聲明驗證身分
+    # （無法檢查黑名單與 Session，已撤銷的 Token 在到期前仍有效；需要 Redis 的寫入回應 503）
+    AUTH_DEGRADED_MODE_ENABLED: bool = False
+    # 近端快取：以 CLIENT TRACKING 失效通知維持一致的程序內 LRU（需 Redis 6+）
+    REDIS_NEAR_CACHE_ENABLED: bool = False
+    REDIS_NEAR_CACHE_PREFIXES: List[str] = [
+        "permission_level:", "employee_type:", "user_profile:"
+    ]
+    REDIS_NEAR_CACHE_MAX_ENTRIES: int = 10000
+    REDIS_NEAR_CACHE_TTL_SECONDS: float = 60.0
+
+    # 用戶目錄鏡像（auth.users 的 Redis 索引，取代 GoTrue 的 id/email 查詢）
+    USER_DIRECTORY_ENABLED: bool = False
+    USER_DIRECTORY_PAGE_SIZE: int = 500
+    # 增量更新依 updated_at 讀取變更（需 supabase/migrations/003_user_directory.sql）；全量同步另負責移除已刪除的用戶
+    USER_DIRECTORY_REFRESH_SECONDS: int = 60
+    USER_DIRECTORY_FULL_SYNC_SECONDS: int = 3600
 
     # Cookie
     COOKIE_DOMAIN: str = "localhost"
@@ -50,8 +141,22 @@ class Settings(BaseSettings):
 
     # Session & Token
     SESSION_EXPIRE_MINUTES: int = 1440  # 24 hours
+    # Session 寫入格式：hash（欄位可個別讀寫）或 json（舊格式）；兩種格式皆可讀取
+    # 滾動升級時先以 json（預設）部署，所有實例更新後再改為 hash，否則舊版實例無法讀取 hash Session
+    # 改為 session:{user_id}:<hash> 鍵格式之前建立的 Session 由 REDIS_LEGACY_KEY_FALLBACK 讀取並搬移
+    SESSION_STORAGE_FORMAT: Literal["hash", "json"] = "json"
+    # 活動時間寫入間隔：last_activity 未超過此秒數時不寫入（0 表示每個請求都寫入）
+    # Session 的滑動過期因此最多提早「間隔 + 批次週期」秒
+    SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS: int = 60
+    # 活動時間緩衝：於程序內累積，每 SESSION_ACTIVITY_FLUSH_SECONDS 秒以單次 pipeline 寫入
+    SESSION_ACTIVITY_BUFFER_ENABLED: bool = False
+    SESSION_ACTIVITY_FLUSH_SECONDS: float = 5.0
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # JWT 編解碼後端：jose（python-jose）/ pyjwt（需安裝 PyJWT）/ hmac（標準庫），見 app/core/jwt_codec.py
+    JWT_BACKEND: Literal["jose", "pyjwt", "hmac"] = "jose"
+    # 已驗證 Token 的聲明快取筆數（於 Token 的 exp 到期，0 表示停用）
+    JWT_VERIFY_CACHE_SIZE: int = 10000
 
     # ============================================
     # Line Login（登入認證）- 所有角色共用同一個 Channel
@@ -75,10 +180,44 @@ class Settings(BaseSettings):
     # Frontend URL (for OAuth redirects)
     FRONTEND_URL: str = "http://localhost:4173"
 
+    # ============================================
+    # 對外 HTTP 連線池（Kong/PostgREST、GoTrue、Line）
+    # ============================================
+    # 共用設定
+    HTTP2_ENABLED: bool = True
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    # 各上游的逾時（秒）與最大連線數
+    SUPABASE_REST_TIMEOUT: float = 30.0
+    SUPABASE_REST_MAX_CONNECTIONS: int = 100
+    SUPABASE_AUTH_TIMEOUT: float = 30.0
+    SUPABASE_AUTH_MAX_CONNECTIONS: int = 50
+    LINE_API_TIMEOUT: float = 10.0
+    LINE_API_MAX_CONNECTIONS: int = 100
+
     @property
     def is_production(self) -> bool:
         return self.APP_ENV == "production"
 
+    def get_http_upstream(self, upstream: str) -> HttpUpstreamConfig:
+        """取得指定上游的 HTTP 連線池設定"""
+        limits = {
+            "postgrest": (self.SUPABASE_REST_TIMEOUT, self.SUPABASE_REST_MAX_CONNECTIONS),
+            "gotrue": (self.SUPABASE_AUTH_TIMEOUT, self.SUPABASE_AUTH_MAX_CONNECTIONS),
+            "line_api": (self.LINE_API_TIMEOUT, self.LINE_API_MAX_CONNECTIONS),
+        }
+        timeout, max_connections = limits.get(upstream, (30.0, 100))
+        return HttpUpstreamConfig(
+            timeout=timeout,
+            connect_timeout=self.HTTP_CONNECT_TIMEOUT,
+            max_connections=max_connections,
+            max_keepalive_connections=min(self.HTTP_MAX_KEEPALIVE_CONNECTIONS, max_connections),
+            keepalive_expiry=self.HTTP_KEEPALIVE_EXPIRY,
+            http2=self.HTTP2_ENABLED,
+        )
+
     @property
     def line_login_config(self) -> LineChannelConfig:
         """取得 Line Login Channel 設定（所有角色共用）"""
@@ -0,0 +1,65 @@
+"""
+請求範圍的認證內容 - 每個請求只解碼一次 Token、只計算一次雜湊
+
+AuthMiddleware 建立並檢查黑名單後存放於 request.state.auth；
+認證依賴（get_current_user 等）直接使用，不再重複解碼或查詢黑名單。
+未經過中間件的請求（公開路徑、單元測試）於第一次使用時建立。
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from fastapi import Request
+
+from app.core.security import decode_token, get_token_from_request, hash_session_id
+
+# request.state 尚未建立認證內容
+_UNSET = object()
+
+
+@dataclass(frozen=True, slots=True)
+class AuthContext:
+    """已驗證簽章的 Token 與其衍生值（不可變）"""
+
+    token: str
+    claims: Mapping[str, Any]
+    token_hash: str
+    session_id: Optional[str]
+    session_hash: Optional[str]
+    # 黑名單檢查結果；None 表示尚未檢查（或 Redis 無法使用）
+    blacklisted: Optional[bool] = None
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self.claims.get("sub")
+
+    @property
+    def role(self) -> Optional[str]:
+        return self.claims.get("role")
+
+    @classmethod
+    def from_request(cls, request: Request) -> Optional["AuthContext"]:
+        """解碼請求的 Token；未提供或無效時回傳 None"""
+        token = get_token_from_request(request)
+        if not token:
+            return None
+        claims = decode_token(token)
+        if not claims:
+            return None
+        session_id = request.cookies.get("session_id")
+        return cls(
+            token=token,
+            claims=MappingProxyType(claims),
+            token_hash=hash_session_id(token),
+            session_id=session_id,
+            session_hash=hash_session_id(session_id) if session_id else None
+        )
+
+
+def get_auth_context(request: Request) -> Optional[AuthContext]:
+    """取得請求的認證內容（同一請求只建立一次）"""
+    context = getattr(request.state, "auth", _UNSET)
+    if context is _UNSET:
+        context = AuthContext.from_request(request)
+        request.state.auth = context
+    return context
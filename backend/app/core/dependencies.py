@@ -1,13 +1,21 @@
+import logging
+from datetime import datetime, timezone
 from fastapi import Depends, Request
 from typing import Optional
+from app.config import settings
 from app.services.session_service import session_service
 from app.services.permission_service import permission_service
-from app.core.security import get_token_from_request, decode_token, TokenType
+from app.services.data_loader import DataLoader
+from app.core.auth_context import AuthContext, get_auth_context
+from app.core.security import get_token_from_request, TokenType
 from app.core.exceptions import (
     AuthException, InvalidTokenException,
     SessionExpiredException, PermissionDeniedException
 )
 from app.models.session import SessionData
+from app.services.redis_pool import RedisUnavailableError
+
+logger = logging.getLogger(__name__)
 
 
 class CurrentUser:
@@ -21,7 +29,8 @@ class CurrentUser:
         session_id: str,
         session_data: SessionData,
         employee_type: Optional[str] = None,
-        permission_level: int = 0
+        permission_level: int = 0,
+        degraded: bool = False
     ):
         self.user_id = user_id
         self.email = email
@@ -30,6 +39,8 @@ class CurrentUser:
         self.session_data = session_data
         self.employee_type = employee_type
         self.permission_level = permission_level
+        # Redis 無法使用時僅依 Token 聲明驗證（未檢查黑名單與 Session）
+        self.degraded = degraded
 
     def is_admin(self) -> bool:
         """檢查是否為管理員（權限等級 100）"""
@@ -68,67 +79,104 @@ class CurrentUser:
         return permission_service.can_manage(self.employee_type, target_employee_type)
 
 
-async def get_current_user(request: Request) -> CurrentUser:
-    """取得當前已認證的用戶"""
-    # 1. 取得 Token
-    token = get_token_from_request(request)
-    if not token:
-        raise AuthException("未提供認證資訊")
+def get_data_loader(request: Request) -> DataLoader:
+    """取得請求範圍的 DataLoader（同一請求內的依賴與路由共用）"""
+    loader = getattr(request.state, "data_loader", None)
+    if loader is None:
+        loader = DataLoader()
+        request.state.data_loader = loader
+    return loader
+
+
+def _session_from_claims(context: AuthContext) -> SessionData:
+    """降級模式：由 Token 聲明建立 Session 資料（不經過 Redis）"""
+    payload = context.claims
+    issued_at = datetime.fromtimestamp(payload.get("iat", 0), tz=timezone.utc).isoformat()
+    return SessionData(
+        session_id=context.session_hash,
+        user_id=payload["sub"],
+        user_role=payload.get("role", "student"),
+        created_at=issued_at,
+        last_activity=datetime.now(timezone.utc).isoformat(),
+        extra_data={"email": payload.get("email", ""), "degraded": True}
+    )
 
-    # 2. 檢查 Token 是否在黑名單
-    if await session_service.is_token_blacklisted(token):
-        raise InvalidTokenException()
 
-    # 3. 解碼 Token
-    payload = decode_token(token)
-    if not payload:
+async def get_current_user(
+    request: Request,
+    loader: DataLoader = Depends(get_data_loader)
+) -> CurrentUser:
+    """取得當前已認證的用戶（同一請求只驗證一次）"""
+    current_user = getattr(request.state, "current_user", None)
+    if current_user is not None:
+        return current_user
+
+    # 1. 取得認證內容（Token 於中間件或第一次使用時解碼，無效的 Token 不需查詢 Redis）
+    context = get_auth_context(request)
+    if context is None:
+        if not get_token_from_request(request):
+            raise AuthException("未提供認證資訊")
         raise InvalidTokenException()
 
+    payload = context.claims
     if payload.get("type") != TokenType.ACCESS:
         raise InvalidTokenException()
 
-    # 4. 取得 Session
-    session_id = request.cookies.get("session_id")
-    if not session_id:
+    if not context.session_id:
         raise SessionExpiredException()
 
-    session_data = await session_service.get_session(session_id)
-    if not session_data:
-        raise SessionExpiredException()
-
-    # 5. 驗證 Session 與 Token 匹配
-    if session_data.user_id != payload.get("sub"):
+    # 2. 單次往返：檢查黑名單（中間件已檢查時略過）、取得並更新 Session、取得權限快取
+    if context.blacklisted:
         raise InvalidTokenException()
-
-    # 6. 更新 Session 活動時間
-    await session_service.update_session_activity(session_id)
-
-    # 7. 取得權限等級（從 token 或查詢）
-    user_id = payload.get("sub")
+    user_id = context.user_id
+    degraded = False
+    cached_level = cached_type = None
+    try:
+        session_data, cached_level, cached_type = await session_service.authenticate(
+            user_id, context.token_hash, context.session_hash,
+            check_blacklist=context.blacklisted is None
+        )
+    except RedisUnavailableError:
+        # Redis 無法使用：未啟用降級模式時回應 503；啟用時在 Token 有效期內信任其聲明
+        if not settings.AUTH_DEGRADED_MODE_ENABLED:
+            raise
+        logger.warning(f"Redis 無法使用，以 Token 聲明驗證用戶 {user_id}（降級模式）")
+        session_data = _session_from_claims(context)
+        degraded = True
+
+    # 3. 取得權限等級（從 token 或查詢）
     employee_type = payload.get("employee_type")
     permission_level = payload.get("permission_level", 0)
 
-    # 如果 token 中沒有權限資訊，從服務查詢
+    # 如果 token 中沒有權限資訊，使用認證時取得的快取；未命中時從服務查詢
     if permission_level == 0 and payload.get("role") in ["admin", "employee"]:
-        permission_level = await permission_service.get_user_permission_level(user_id)
-        if not employee_type:
-            employee_type = await permission_service.get_user_employee_type(user_id)
+        permissions = permission_service.parse_cached(cached_level, cached_type)
+        if permissions is None:
+            permissions = await permission_service.get_user_permissions(user_id, loader)
+        permission_level, cached_type = permissions
+        employee_type = employee_type or cached_type
 
-    return CurrentUser(
+    current_user = CurrentUser(
         user_id=user_id,
         email=payload.get("email", ""),
         role=payload.get("role", "student"),
-        session_id=session_id,
+        session_id=context.session_id,
         session_data=session_data,
         employee_type=employee_type,
-        permission_level=permission_level
+        permission_level=permission_level,
+        degraded=degraded
     )
+    # require_role 等依賴與路由共用同一結果
+    request.state.current_user = current_user
+    return current_user
 
 
 async def get_optional_user(request: Request) -> Optional[CurrentUser]:
     """取得當前用戶（可選，未登入返回 None）"""
+    if get_auth_context(request) is None:
+        return None
     try:
-        return await get_current_user(request)
+        return await get_current_user(request, get_data_loader(request))
     except:
         return None
 
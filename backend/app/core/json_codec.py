@@ -0,0 +1,29 @@
+"""
+JSON 編解碼：安裝 orjson 時使用 orjson，否則退回標準庫 json
+
+- loads 直接解析原始 bytes（不需先解碼為 str）
+- dumps 回傳 str，可直接取代 json.dumps；無法序列化的型別以 str() 表示
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """解析 JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """序列化為 JSON 字串"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=str).decode()
+    return json.dumps(value, default=str)
@@ -0,0 +1,149 @@
+"""
+JWT 編解碼後端（HS256）：依 JWT_BACKEND 設定選擇實作
+
+- jose：python-jose（預設）
+- pyjwt：PyJWT（需另行安裝 PyJWT）
+- hmac：標準庫 hmac + json_codec（安裝 orjson 時使用 orjson），不需額外套件
+
+各後端產生的 Token 可互相驗證；驗證失敗一律拋出 JWTDecodeError。
+效能比較見 benchmarks/jwt_codec.py。
+"""
+import base64
+import hashlib
+import hmac
+import time
+from calendar import timegm
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from jose import jwt as jose_jwt, JWTError
+
+from app.core import json_codec
+
+try:
+    import jwt as pyjwt
+    PYJWT_AVAILABLE = True
+except ImportError:
+    pyjwt = None
+    PYJWT_AVAILABLE = False
+
+ALGORITHM = "HS256"
+
+# 以時間戳記表示的聲明（datetime 於編碼時轉換）
+TIME_CLAIMS = ("exp", "iat", "nbf")
+
+
+class JWTDecodeError(Exception):
+    """簽章、格式或聲明驗證失敗"""
+
+
+class JoseBackend:
+    """python-jose"""
+
+    name = "jose"
+
+    def encode(self, claims: Dict[str, Any], key: str) -> str:
+        return jose_jwt.encode(claims, key, algorithm=ALGORITHM)
+
+    def decode(self, token: str, key: str, audience: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            return jose_jwt.decode(token, key, algorithms=[ALGORITHM], audience=audience)
+        except JWTError as e:
+            raise JWTDecodeError(str(e)) from e
+
+
+class PyJWTBackend:
+    """PyJWT"""
+
+    name = "pyjwt"
+
+    def encode(self, claims: Dict[str, Any], key: str) -> str:
+        return pyjwt.encode(claims, key, algorithm=ALGORITHM)
+
+    def decode(self, token: str, key: str, audience: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            return pyjwt.decode(token, key, algorithms=[ALGORITHM], audience=audience)
+        except pyjwt.PyJWTError as e:
+            raise JWTDecodeError(str(e)) from e
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class HmacBackend:
+    """標準庫 HMAC-SHA256（聲明驗證規則與 python-jose 相同）"""
+
+    name = "hmac"
+
+    # 標頭固定，預先編碼
+    HEADER = _b64encode(json_codec.dumps({"alg": ALGORITHM, "typ": "JWT"}).encode())
+
+    def encode(self, claims: Dict[str, Any], key: str) -> str:
+        claims = {
+            name: timegm(value.utctimetuple()) if name in TIME_CLAIMS and isinstance(value, datetime) else value
+            for name, value in claims.items()
+        }
+        signing_input = self.HEADER + b"." + _b64encode(json_codec.dumps(claims).encode())
+        signature = hmac.new(key.encode(), signing_input, hashlib.sha256).digest()
+        return (signing_input + b"." + _b64encode(signature)).decode()
+
+    def decode(self, token: str, key: str, audience: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            header, payload, signature = token.split(".")
+            if json_codec.loads(_b64decode(header)).get("alg") != ALGORITHM:
+                raise JWTDecodeError("不支援的演算法")
+            expected = hmac.new(key.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise JWTDecodeError("簽章驗證失敗")
+            claims = json_codec.loads(_b64decode(payload))
+        except JWTDecodeError:
+            raise
+        except Exception as e:
+            # 分段數量、base64 或 JSON 格式錯誤
+            raise JWTDecodeError(f"Token 格式錯誤: {e}") from e
+        if not isinstance(claims, dict):
+            raise JWTDecodeError("Token 聲明格式錯誤")
+        self._verify_claims(claims, audience)
+        return claims
+
+    @staticmethod
+    def _verify_claims(claims: Dict[str, Any], audience: Optional[str]) -> None:
+        now = int(time.time())
+        for name in TIME_CLAIMS:
+            if name in claims and not isinstance(claims[name], int):
+                raise JWTDecodeError(f"{name} 必須為整數時間戳記")
+        if "exp" in claims and claims["exp"] < now:
+            raise JWTDecodeError("Token 已過期")
+        if "nbf" in claims and claims["nbf"] > now:
+            raise JWTDecodeError("Token 尚未生效")
+        if audience is None:
+            if "aud" in claims:
+                raise JWTDecodeError("未指定 audience")
+            return
+        aud = claims.get("aud")
+        if audience != aud and not (isinstance(aud, list) and audience in aud):
+            raise JWTDecodeError("audience 不符")
+
+
+BACKENDS = {
+    JoseBackend.name: JoseBackend,
+    PyJWTBackend.name: PyJWTBackend,
+    HmacBackend.name: HmacBackend,
+}
+
+
+def available_backends() -> list:
+    """目前環境可用的後端名稱"""
+    return [name for name in BACKENDS if name != PyJWTBackend.name or PYJWT_AVAILABLE]
+
+
+def get_backend(name: str):
+    """建立指定名稱的後端"""
+    if name not in available_backends():
+        raise ValueError(f"JWT 後端無法使用: {name}（可用: {', '.join(available_backends())}）")
+    return BACKENDS[name]()
@@ -0,0 +1,141 @@
+"""
+讀取副本路由：將 PostgREST 讀取分散到唯讀副本
+
+- 輪詢（round-robin）選擇健康的副本；請求失敗的副本暫停使用一段時間
+- 讀寫一致（read-your-writes）：同一用戶寫入後的短時間內，讀取固定走主庫；
+  寫入時間記錄在 Redis（read_sticky:{<user_id>}），其他 worker 與實例同樣適用
+- 用戶識別由 set_read_affinity 設定（每個 HTTP 請求各自的 contextvar）；
+  未設定識別的請求（未登入）不追蹤，需要讀到自己寫入的呼叫端應指定 primary=True
+"""
+import itertools
+import logging
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.services import redis_keys
+
+logger = logging.getLogger(__name__)
+
+# 目前請求的讀寫一致識別（通常為用戶 ID）；未設定時不追蹤讀寫一致
+_affinity: ContextVar[Optional[str]] = ContextVar("read_affinity", default=None)
+
+
+def set_read_affinity(key: Optional[str]) -> None:
+    """設定目前請求的讀寫一致識別"""
+    _affinity.set(key)
+
+
+class ReplicaRouter:
+    """唯讀副本選擇器"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        sticky_seconds: float,
+        down_seconds: float,
+        redis: Optional[Any] = None
+    ):
+        """
+        Args:
+            redis: 共用讀寫一致紀錄的 RedisService；未提供時只在本行程內追蹤
+        """
+        self.urls = [url.rstrip("/") for url in urls]
+        self.sticky_seconds = sticky_seconds
+        self.down_seconds = down_seconds
+        self._cycle = itertools.cycle(self.urls) if self.urls else None
+        self._down_until: Dict[str, float] = {}
+        self.redis = redis
+        # 本行程寫入的紀錄：同一 worker 內的讀取不需查詢 Redis
+        self._last_write: Dict[str, float] = {}
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failovers = 0
+
+    # ========== 讀寫一致 ==========
+
+    async def record_write(self) -> None:
+        """記錄目前用戶的寫入時間（未設定識別時略過，避免所有匿名讀取一起改走主庫）"""
+        key = _affinity.get()
+        if not self.urls or not key:
+            return
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    redis_keys.read_sticky(key), "1", expire_seconds=math.ceil(self.sticky_seconds)
+                )
+            except Exception as e:
+                logger.warning(f"讀寫一致紀錄寫入失敗，僅本行程有效: {e}")
+        now = time.monotonic()
+        self._last_write[key] = now
+        # 清除已過期的紀錄，避免長時間累積
+        if len(self._last_write) > 10_000:
+            self._last_write = {
+                key: at for key, at in self._last_write.items()
+                if now - at < self.sticky_seconds
+            }
+
+    async def is_sticky(self) -> bool:
+        """目前用戶是否在寫入後的讀寫一致期間內（Redis 無法使用時視為是，改走主庫）"""
+        key = _affinity.get()
+        if not key:
+            return False
+        at = self._last_write.get(key)
+        if at is not None and time.monotonic() - at < self.sticky_seconds:
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return await self.redis.exists(redis_keys.read_sticky(key))
+        except Exception as e:
+            logger.warning(f"讀寫一致紀錄查詢失敗，改走主庫: {e}")
+            return True
+
+    # ========== 副本選擇 ==========
+
+    async def pick(self, primary: bool = False) -> Optional[str]:
+        """
+        選擇讀取用的副本
+
+        Args:
+            primary: 強制走主庫
+
+        Returns:
+            副本 URL；應走主庫（未設定副本、強制主庫、讀寫一致期間、副本皆不可用）時返回 None
+        """
+        if self._cycle is None or primary or await self.is_sticky():
+            self.primary_reads += 1
+            return None
+
+        now = time.monotonic()
+        for _ in range(len(self.urls)):
+            url = next(self._cycle)
+            if self._down_until.get(url, 0) <= now:
+                self.replica_reads += 1
+                return url
+
+        self.primary_reads += 1
+        return None
+
+    def mark_down(self, url: str) -> None:
+        """副本請求失敗，暫停使用 down_seconds 秒"""
+        self.failovers += 1
+        self._down_until[url] = time.monotonic() + self.down_seconds
+
+    def mark_up(self, url: str) -> None:
+        """副本恢復正常"""
+        self._down_until.pop(url, None)
+
+    def stats(self) -> dict:
+        """取得副本狀態與讀取分佈"""
+        now = time.monotonic()
+        return {
+            "replicas": {
+                url: "down" if self._down_until.get(url, 0) > now else "up"
+                for url in self.urls
+            },
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "failovers": self.failovers,
+        }
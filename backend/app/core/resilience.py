@@ -0,0 +1,190 @@
+"""
+上游呼叫韌性元件：斷路器、重試退避、請求期限與延遲直方圖
+
+- CircuitBreaker：連續失敗達門檻後開啟，開啟期間直接失敗；冷卻後放行一次試探請求
+- backoff_delay：指數退避加全抖動（full jitter）
+- 請求期限：以 contextvar 從進入的 HTTP 請求傳遞到所有上游呼叫
+- LatencyHistogram：固定區間的延遲分佈，供儀表板使用
+"""
+import bisect
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class UpstreamUnavailableError(Exception):
+    """上游暫時無法使用（斷路器開啟或超過請求期限）"""
+
+    def __init__(self, upstream: str, message: str):
+        super().__init__(message)
+        self.upstream = upstream
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """斷路器開啟中，未送出請求"""
+
+    def __init__(self, upstream: str):
+        super().__init__(upstream, f"{upstream} 斷路器開啟中，暫停呼叫")
+
+
+class DeadlineExceededError(UpstreamUnavailableError):
+    """剩餘請求期限不足，未送出（或中止）請求"""
+
+    def __init__(self, upstream: str):
+        super().__init__(upstream, f"呼叫 {upstream} 時已超過請求期限")
+
+
+# ========== 斷路器 ==========
+
+class CircuitBreaker:
+    """單一上游的斷路器（closed → open → half_open → closed）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """目前狀態（冷卻時間到時由 open 轉為 half_open）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否放行請求；half_open 時只放行一個試探請求"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        # 試探請求未回報結果（例如被取消）超過冷卻時間時，允許下一個試探
+        if state == self.HALF_OPEN and (
+            not self._probing or now - self._probe_started >= self.reset_timeout
+        ):
+            self._probing = True
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def reset(self) -> None:
+        """回到 closed 狀態並清除連續失敗次數"""
+        self.record_success()
+
+    def record_success(self) -> None:
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened += 1
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> dict:
+        """取得狀態與統計"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+# ========== 重試退避 ==========
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    第 attempt 次重試前的等待秒數（0 起算，full jitter）
+
+    在 [0, min(cap, base * 2^attempt)] 之間均勻取值，避免多個呼叫端同時重試
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ========== 請求期限 ==========
+
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    在區塊內設定請求期限（monotonic 時間）
+
+    巢狀使用時取較早的期限；seconds 為 None 或 <= 0 時不設定新期限
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds and seconds > 0:
+        candidate = time.monotonic() + seconds
+        deadline = candidate if current is None else min(current, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """距離請求期限的剩餘秒數，未設定期限時返回 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# ========== 延遲直方圖 ==========
+
+class LatencyHistogram:
+    """延遲分佈（毫秒，累積區間與 Prometheus histogram 相同）"""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+    def observe(self, ms: float, error: bool = False) -> None:
+        self._counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if error:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        """取得累積區間計數（le = 小於等於該毫秒數）"""
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip((*self.BUCKETS_MS, "+Inf"), self._counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum_ms": round(self.sum_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": buckets,
+        }
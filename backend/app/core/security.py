@@ -1,11 +1,13 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Any
-from jose import jwt, JWTError
+from typing import Dict, Optional, Any, Tuple
 from passlib.context import CryptContext
 from fastapi import Response, Request
 from app.config import settings
+from app.core.jwt_codec import JWTDecodeError, get_backend
 import secrets
 import hashlib
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -14,6 +16,70 @@ class TokenType:
     ACCESS = "access"
     REFRESH = "refresh"
 
+
+class VerifiedTokenCache:
+    """
+    已驗證 Token 的聲明快取（程序內 LRU）
+    
+    以 Token 的 SHA-256 摘要為鍵，於 Token 的 exp 到期；驗證失敗的 Token 不快取。
+    更換 SECRET_KEY 需重新啟動（或呼叫 clear）。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        # 回傳複本，呼叫端修改不影響快取
+        return dict(claims)
+
+    def store(self, digest: bytes, claims: Dict[str, Any]) -> None:
+        exp = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        self._entries[digest] = (dict(claims), exp)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# 單例
+token_cache = VerifiedTokenCache(settings.JWT_VERIFY_CACHE_SIZE)
+_backends: Dict[str, Any] = {}
+
+
+def jwt_backend():
+    """目前設定的 JWT 後端（見 app.core.jwt_codec）"""
+    backend = _backends.get(settings.JWT_BACKEND)
+    if backend is None:
+        backend = _backends[settings.JWT_BACKEND] = get_backend(settings.JWT_BACKEND)
+    return backend
+
+
 def create_token(
     data: dict,
     token_type: str = TokenType.ACCESS,
@@ -39,35 +105,26 @@ def create_token(
         "type": token_type
     })
     
-    return jwt.encode(
-        to_encode,
-        settings.SECRET_KEY,
-        algorithm="HS256"
-    )
+    return jwt_backend().encode(to_encode, settings.SECRET_KEY)
 
 def decode_token(token: str) -> Optional[dict]:
-    """解碼 JWT Token"""
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=["HS256"]
-        )
+    """解碼 JWT Token（已驗證的 Token 於到期前由快取取得聲明）"""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
         return payload
-    except JWTError:
+    try:
+        payload = jwt_backend().decode(token, settings.SECRET_KEY)
+    except JWTDecodeError:
         return None
+    token_cache.store(digest, payload)
+    return payload
 
 def verify_supabase_token(token: str) -> Optional[dict]:
     """驗證 Supabase JWT Token"""
     try:
-        payload = jwt.decode(
-            token,
-            settings.SUPABASE_JWT_SECRET,
-            algorithms=["HS256"],
-            audience="authenticated"
-        )
-        return payload
-    except JWTError:
+        return jwt_backend().decode(token, settings.SUPABASE_JWT_SECRET, audience="authenticated")
+    except JWTDecodeError:
         return None
 
 def generate_session_id() -> str:
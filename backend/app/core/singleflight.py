@@ -0,0 +1,62 @@
+"""
+Single-flight：合併相同鍵值的同時請求
+
+同一時間內相同鍵值的呼叫只會真正執行一次，其餘呼叫（followers）
+等待第一個呼叫（leader）的結果。
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """同時請求合併器"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.issued = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        執行 fn，若相同 key 已在執行中則等待其結果
+
+        Args:
+            key: 判斷是否為相同請求的鍵值
+            fn: 實際執行請求的函式
+
+        Returns:
+            fn 的結果（leader 與 followers 共用同一份結果）
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.issued += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # shield：單一呼叫端被取消時，不影響其他等待同一結果的呼叫端
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出例外，避免所有呼叫端都已取消時出現未處理例外警告
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        """目前執行中的請求數"""
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        """取得統計數據"""
+        return {
+            "issued": self.issued,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight,
+        }
@@ -5,8 +5,14 @@ from contextlib import asynccontextmanager
 from app.config import settings
 from app.api.v1.router import api_router
 from app.services.redis_service import redis_service
+from app.services.http_client_service import http_client_service
+from app.services.database_service import database_service
+from app.services.user_directory_service import user_directory_service
+from app.services.session_service import session_service
 from app.middleware.auth_middleware import AuthMiddleware, RateLimitMiddleware
+from app.middleware.deadline_middleware import DeadlineMiddleware
 from app.core.exceptions import AuthException
+from app.core.resilience import UpstreamUnavailableError
 import logging
 
 # 設定日誌
@@ -29,15 +35,36 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Redis 連接失敗: {e}")
     
+    # 建立對外 HTTP 連線池
+    await http_client_service.open()
+    
+    # 建立 Postgres 直連連線池（未啟用時略過，熱門查詢走 PostgREST）
+    try:
+        await database_service.connect()
+        if database_service.available:
+            logger.info("✅ Postgres 直連成功")
+    except Exception as e:
+        logger.error(f"❌ Postgres 直連失敗，改走 PostgREST: {e}")
+    
+    # 背景同步用戶目錄鏡像（auth.users → Redis）
+    await user_directory_service.start()
+    
+    # Session 活動時間批次寫入（未啟用緩衝時略過）
+    await session_service.start()
+    
     yield
     
     # 關閉時
     logger.info("🛑 關閉應用...")
+    await user_directory_service.stop()
+    await session_service.stop()
     await redis_service.disconnect()
     
-    # 關閉 Supabase httpx client
-    from app.services.supabase_service import supabase_service
-    await supabase_service.close()
+    # 關閉 Postgres 直連連線池
+    await database_service.disconnect()
+    
+    # 關閉對外 HTTP 連線池
+    await http_client_service.close()
 
 # 建立 FastAPI 應用
 app = FastAPI(
@@ -71,6 +98,9 @@ app.add_middleware(RateLimitMiddleware, requests_per_minute=100)
 # 認證中間件
 app.add_middleware(AuthMiddleware)
 
+# 請求期限（最外層，涵蓋所有中間件與路由的上游呼叫）
+app.add_middleware(DeadlineMiddleware)
+
 # ========== 例外處理 ==========
 
 @app.exception_handler(AuthException)
@@ -84,6 +114,19 @@ async def auth_exception_handler(request: Request, exc: AuthException):
         }
     )
 
+@app.exception_handler(UpstreamUnavailableError)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailableError):
+    logger.warning(f"上游暫時無法使用: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "success": False,
+            "message": "服務暫時無法使用，請稍後再試",
+            "error_code": "UPSTREAM_UNAVAILABLE",
+            "upstream": exc.upstream
+        }
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.exception(f"未處理的例外: {exc}")
@@ -1,8 +1,11 @@
+from dataclasses import replace
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 from app.services.session_service import session_service
-from app.core.security import get_token_from_request, decode_token
+from app.core.auth_context import get_auth_context
+from app.core.replica_router import set_read_affinity
+from app.services.redis_pool import RedisUnavailableError
 from app.config import settings
 import time
 import logging
@@ -32,22 +35,38 @@ class AuthMiddleware(BaseHTTPMiddleware):
         is_public = any(path.startswith(p) for p in self.PUBLIC_PATHS)
         
         if not is_public:
-            # 驗證 Token
-            token = get_token_from_request(request)
+            # 解碼 Token 並建立認證內容（無效的 Token 由路由的認證依賴拒絕）
+            context = get_auth_context(request)
             
-            if token:
-                # 檢查黑名單
-                if await session_service.is_token_blacklisted(token):
+            if context:
+                # 檢查黑名單（Redis 無法使用時：降級模式略過並交由依賴處理，否則回應 503）
+                try:
+                    blacklisted = await session_service.is_blacklisted(context.user_id, context.token_hash)
+                except RedisUnavailableError:
+                    if not settings.AUTH_DEGRADED_MODE_ENABLED:
+                        return JSONResponse(
+                            status_code=503,
+                            content={
+                                "success": False,
+                                "message": "服務暫時無法使用，請稍後再試",
+                                "error_code": "UPSTREAM_UNAVAILABLE",
+                                "upstream": "redis"
+                            }
+                        )
+                    blacklisted = None
+                if blacklisted:
                     return JSONResponse(
                         status_code=401,
                         content={"detail": "Token 已失效"}
                     )
+                # 記錄檢查結果，認證依賴不再重複查詢
+                request.state.auth = replace(context, blacklisted=blacklisted)
                 
-                # 解碼並附加到 request.state
-                payload = decode_token(token)
-                if payload:
-                    request.state.user_id = payload.get("sub")
-                    request.state.user_role = payload.get("role")
+                # 附加到 request.state
+                request.state.user_id = context.user_id
+                request.state.user_role = context.role
+                # 同一用戶寫入後的讀取走主庫（見 ReplicaRouter）
+                set_read_affinity(context.user_id)
         
         # 執行請求
         response = await call_next(request)
@@ -75,10 +94,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         try:
             from app.services.redis_service import redis_service
             
-            current = await redis_service.client.incr(rate_key)
-            
-            if current == 1:
-                await redis_service.expire(rate_key, 60)
+            current = await redis_service.incr_with_expire(rate_key, 60)
             
             if current > self.requests_per_minute:
                 return JSONResponse(
@@ -86,7 +102,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     content={"detail": "請求過於頻繁，請稍後再試"}
                 )
         except:
-            # Redis 不可用時跳過速率限制
+            # Redis 不可用時跳過速率限制（斷路器開啟後直接失敗，不等待連線逾時）
             pass
         
         return await call_next(request)
@@ -0,0 +1,23 @@
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.core.resilience import deadline_scope
+from app.config import settings
+
+class DeadlineMiddleware(BaseHTTPMiddleware):
+    """請求期限中間件：設定本次請求的處理期限，供所有上游呼叫縮短逾時"""
+    
+    # 呼叫端可用此標頭（秒）要求更短的期限
+    TIMEOUT_HEADER = "X-Request-Timeout"
+    
+    async def dispatch(self, request: Request, call_next) -> Response:
+        seconds = settings.REQUEST_DEADLINE_SECONDS
+        
+        try:
+            requested = float(request.headers.get(self.TIMEOUT_HEADER, ""))
+            if requested > 0:
+                seconds = min(seconds, requested) if seconds > 0 else requested
+        except ValueError:
+            pass
+        
+        with deadline_scope(seconds):
+            return await call_next(request)
@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ProfileEntity(BaseModel):
+    """角色實體資料（students / teachers / employees）"""
+    id: str
+    name: Optional[str] = None
+    email: Optional[str] = None
+    avatar_url: Optional[str] = None
+    is_active: Optional[bool] = None
+
+class UserProfileRecord(BaseModel):
+    """user_profiles 資料列（含嵌入的角色實體）"""
+    id: str
+    role: str
+    employee_subtype: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    students: Optional[ProfileEntity] = None
+    teachers: Optional[ProfileEntity] = None
+    employees: Optional[ProfileEntity] = None
+
+    @property
+    def entity(self) -> Optional[ProfileEntity]:
+        """依角色取得對應的實體資料"""
+        if self.role == "student":
+            return self.students
+        if self.role == "teacher":
+            return self.teachers
+        return self.employees
@@ -3,8 +3,10 @@ from fastapi import Request, Response
 from app.services.supabase_service import supabase_service
 from app.services.session_service import session_service
 from app.services.redis_service import redis_service
+from app.services import redis_keys
+from app.services.user_directory_service import user_directory_service
 from app.core.security import (
-    create_token, decode_token, verify_supabase_token,
+    create_token, decode_token, verify_supabase_token, hash_session_id,
     set_auth_cookies, clear_auth_cookies, TokenType
 )
 from app.core.exceptions import (
@@ -25,7 +27,7 @@ class AuthService:
     
     async def _cache_user_profile(self, user_id: str, profile: dict) -> None:
         """快取用戶資料"""
-        cache_key = f"user_profile:{user_id}"
+        cache_key = redis_keys.user_profile(user_id)
         await self.redis.set_json(
             cache_key,
             profile,
@@ -34,12 +36,12 @@ class AuthService:
     
     async def _get_cached_user_profile(self, user_id: str) -> Optional[dict]:
         """取得快取的用戶資料"""
-        cache_key = f"user_profile:{user_id}"
+        cache_key = redis_keys.user_profile(user_id)
         return await self.redis.get_json(cache_key)
     
     async def _invalidate_user_cache(self, user_id: str) -> None:
         """清除用戶快取"""
-        cache_key = f"user_profile:{user_id}"
+        cache_key = redis_keys.user_profile(user_id)
         await self.redis.delete(cache_key)
     
     # ========== 登入/登出 ==========
@@ -116,6 +118,7 @@ class AuthService:
         self,
         request: Request,
         response: Response,
+        user_id: str,
         logout_all_devices: bool = False
     ) -> bool:
         """用戶登出"""
@@ -123,23 +126,22 @@ class AuthService:
         access_token = request.cookies.get("access_token")
         
         if session_id:
-            session_data = await self.session.get_session(session_id)
+            session_exists = await self.session.get_session_fields(session_id, user_id, "user_id")
             
-            if session_data:
+            if session_exists:
                 if logout_all_devices:
                     # 登出所有裝置
-                    await self.session.destroy_all_user_sessions(
-                        session_data.user_id
-                    )
-                    await self._invalidate_user_cache(session_data.user_id)
+                    await self.session.destroy_all_user_sessions(user_id)
+                    await self._invalidate_user_cache(user_id)
                 else:
                     # 只登出當前裝置
-                    await self.session.destroy_session(session_id)
+                    await self.session.destroy_session(session_id, user_id)
         
         # 將 Token 加入黑名單
         if access_token:
             await self.session.blacklist_token(
                 access_token,
+                user_id,
                 settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
             )
         
@@ -172,17 +174,16 @@ class AuthService:
         if not payload or payload.get("type") != TokenType.REFRESH:
             raise InvalidTokenException()
         
-        # 驗證 Session
-        session_data = await self.session.get_session(session_id)
-        if not session_data:
+        user_id = payload.get("sub")
+        
+        # 驗證 Session（只需確認存在）
+        if not await self.session.get_session_fields(session_id, user_id, "user_id"):
             raise SessionExpiredException()
         
         # 檢查 Token 是否在黑名單
-        if await self.session.is_token_blacklisted(refresh_token):
+        if await self.session.is_token_blacklisted(refresh_token, user_id):
             raise InvalidTokenException()
         
-        user_id = payload.get("sub")
-        
         # 取得用戶資料
         user_profile = await self._get_cached_user_profile(user_id)
         if not user_profile:
@@ -190,26 +191,28 @@ class AuthService:
             user_profile = {"role": user_role}
         
         # 建立新 Tokens
+        session_hash = hash_session_id(session_id)
         token_data = {
             "sub": user_id,
             "role": user_profile.get("role", "student"),
-            "session_id": session_data.session_id
+            "session_id": session_hash
         }
         
         new_access_token = create_token(token_data, TokenType.ACCESS)
         new_refresh_token = create_token(
-            {"sub": user_id, "session_id": session_data.session_id},
+            {"sub": user_id, "session_id": session_hash},
             TokenType.REFRESH
         )
         
         # 將舊的 Refresh Token 加入黑名單
         await self.session.blacklist_token(
             refresh_token,
+            user_id,
             settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
         )
         
         # 更新 Session 活動時間
-        await self.session.update_session_activity(session_id)
+        await self.session.update_session_activity(session_id, user_id)
         
         # 設定新 Cookies
         set_auth_cookies(response, new_access_token, new_refresh_token, session_id)
@@ -241,8 +244,8 @@ class AuthService:
         # 取得用戶資料
         user_role = await self._get_user_role(user_id)
 
-        # 取得用戶 email (user_data is a SupabaseUser object)
-        user_data = await self.supabase.admin_get_user(user_id)
+        # 取得用戶 email（由用戶目錄鏡像查詢，未命中時才呼叫 GoTrue）
+        user_data = await user_directory_service.get_by_id(user_id)
         user_email = user_data.email if user_data else ""
 
         # 建立 Session
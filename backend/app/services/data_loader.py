@@ -0,0 +1,139 @@
+"""
+DataLoader - 合併同一請求內的 id 查詢
+
+同一個事件迴圈循環（tick）內對同一表格發出的 load() 會合併成一次
+`key=in.(a,b,c,...)` 查詢（過長時由 table_select_in 切成多批），
+再將結果分送給各呼叫端。查詢結果在請求期間內快取，相同 id 不會重複查詢。
+
+每個 HTTP 請求使用獨立的 DataLoader（見 app.core.dependencies.get_data_loader），
+避免不同用戶之間共用資料。
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.services.supabase_service import supabase_service
+
+# (表格, key 欄位, select)
+BatchKey = Tuple[str, str, str]
+
+
+class DataLoader:
+    """請求範圍的批次查詢器"""
+
+    def __init__(self, use_service_key: bool = True, supabase=None):
+        self.supabase = supabase or supabase_service
+        self.use_service_key = use_service_key
+        self._cache: Dict[BatchKey, Dict[str, asyncio.Future]] = {}
+        self._queue: Dict[BatchKey, Dict[str, asyncio.Future]] = {}
+        # 執行中的批次查詢（事件迴圈只保留弱參照，需自行持有以免被回收）
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+
+    async def load(
+        self,
+        table: str,
+        value: Any,
+        key: str = "id",
+        select: str = "*"
+    ) -> Optional[dict]:
+        """
+        取得單筆資料
+
+        Args:
+            table: 表格名稱
+            value: key 欄位的值
+            key: 比對的欄位（預設 id）
+            select: 查詢欄位
+
+        Returns:
+            資料列，不存在時返回 None
+        """
+        if value is None:
+            return None
+
+        batch = (table, key, select)
+        value = str(value)
+        cached = self._cache.setdefault(batch, {})
+        future = cached.get(value)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            cached[value] = future
+            queue = self._queue.get(batch)
+            if queue is None:
+                # 第一筆排入時安排派送；同一 tick 內的其他 load() 會加入同一批
+                queue = self._queue[batch] = {}
+                asyncio.get_running_loop().call_soon(self._dispatch, batch)
+            queue[value] = future
+        return await asyncio.shield(future)
+
+    async def load_many(
+        self,
+        table: str,
+        values: List[Any],
+        key: str = "id",
+        select: str = "*"
+    ) -> List[Optional[dict]]:
+        """取得多筆資料，回傳順序與 values 相同（不存在者為 None）"""
+        return list(await asyncio.gather(*[
+            self.load(table, value, key, select) for value in values
+        ]))
+
+    def prime(
+        self,
+        table: str,
+        value: Any,
+        row: Optional[dict],
+        key: str = "id",
+        select: str = "*"
+    ) -> None:
+        """預先放入已知的資料（例如剛寫入的資料列）"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(row)
+        self._cache.setdefault((table, key, select), {})[str(value)] = future
+
+    def clear(self, table: Optional[str] = None) -> None:
+        """清除快取（寫入後呼叫，避免讀到舊資料）"""
+        if table is None:
+            self._cache.clear()
+            return
+        for batch in [b for b in self._cache if b[0] == table]:
+            del self._cache[batch]
+
+    def _dispatch(self, batch: BatchKey) -> None:
+        queue = self._queue.pop(batch, None)
+        if queue:
+            self.batches += 1
+            task = asyncio.ensure_future(self._fetch(batch, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: BatchKey, queue: Dict[str, asyncio.Future]) -> None:
+        table, key, select = batch
+        # 需要 key 欄位才能將結果對應回各呼叫端
+        query_select = select
+        columns = [c.strip() for c in select.split(",")]
+        if "*" not in columns and key not in columns:
+            query_select = f"{select},{key}"
+
+        try:
+            rows = await self.supabase.table_select_in(
+                table,
+                list(queue),
+                key=key,
+                select=query_select,
+                use_service_key=self.use_service_key
+            )
+        except Exception as e:
+            cached = self._cache.get(batch, {})
+            for value, future in queue.items():
+                # 查詢失敗不快取，下次 load() 會重新查詢
+                if cached.get(value) is future:
+                    del cached[value]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_key = {str(row.get(key)): row for row in rows}
+        for value, future in queue.items():
+            if not future.done():
+                future.set_result(by_key.get(value))
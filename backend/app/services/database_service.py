@@ -0,0 +1,261 @@
+"""
+資料庫直連服務 - 熱門查詢以 asyncpg 經 Supavisor 直連 Postgres
+
+一般查詢路徑為 Python → Kong → PostgREST → Postgres；此服務讓白名單內的
+熱門查詢改走 asyncpg 連線池與 prepared statements，省去兩段 HTTP 與 JSON 轉換。
+
+- 只執行 QUERIES 內登錄的 SQL，不接受任意 SQL
+- 回傳格式與 supabase_service.table_select 相同（UUID、時間轉為字串）
+- 未啟用、未安裝 asyncpg 或連線失敗時，自動改走 PostgREST
+"""
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from app.config import settings
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    asyncpg = None
+    ASYNCPG_AVAILABLE = False
+
+
+# 白名單查詢（名稱 → SQL）
+QUERIES: Dict[str, str] = {
+    # 權限查詢：員工類型
+    "user_employee_subtype": """
+        SELECT employee_subtype
+        FROM user_profiles
+        WHERE id = $1::uuid
+    """,
+    # Line 綁定查詢：用戶在指定（或任一）頻道的綁定
+    "line_binding_by_user": """
+        SELECT *
+        FROM line_user_bindings
+        WHERE user_id = $1::uuid
+          AND ($2::line_channel_type IS NULL OR channel_type = $2::line_channel_type)
+        LIMIT 1
+    """,
+    # 通知歷史分頁（count(*) OVER () 同時取得總筆數）
+    "notification_history_page": """
+        SELECT *, count(*) OVER () AS _total
+        FROM line_notification_logs
+        WHERE ($1::uuid IS NULL OR user_id = $1::uuid)
+          AND ($2::line_channel_type IS NULL OR channel_type = $2::line_channel_type)
+          AND ($3::notification_type IS NULL OR notification_type = $3::notification_type)
+        ORDER BY created_at DESC
+        LIMIT $4 OFFSET $5
+    """,
+    "notification_history_count": """
+        SELECT count(*)
+        FROM line_notification_logs
+        WHERE ($1::uuid IS NULL OR user_id = $1::uuid)
+          AND ($2::line_channel_type IS NULL OR channel_type = $2::line_channel_type)
+          AND ($3::notification_type IS NULL OR notification_type = $3::notification_type)
+    """,
+    # 時段查詢：指定日期可預約的時段
+    "available_slots_by_date": """
+        SELECT id, teacher_id, teacher_contract_id, slot_date, start_time, end_time,
+               is_available, is_booked, notes
+        FROM teacher_available_slots
+        WHERE slot_date = $1::date
+          AND ($2::uuid IS NULL OR teacher_id = $2::uuid)
+          AND is_available = TRUE
+          AND is_booked = FALSE
+          AND is_deleted = FALSE
+        ORDER BY start_time, teacher_id
+    """,
+}
+
+# 時段查詢回傳欄位（PostgREST 路徑使用相同欄位）
+SLOT_COLUMNS = (
+    "id,teacher_id,teacher_contract_id,slot_date,start_time,end_time,"
+    "is_available,is_booked,notes"
+)
+
+
+def _to_json_value(value: Any) -> Any:
+    """將 asyncpg 型別轉為與 PostgREST JSON 相同的表示"""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class DatabaseService:
+    """asyncpg 連線池（由應用生命週期開啟與關閉）"""
+
+    def __init__(self):
+        self._pool = None
+
+    @property
+    def enabled(self) -> bool:
+        """是否啟用直連"""
+        return bool(settings.DATABASE_ENABLED and settings.DATABASE_URL and ASYNCPG_AVAILABLE)
+
+    @property
+    def available(self) -> bool:
+        """連線池是否已建立"""
+        return self._pool is not None
+
+    async def connect(self) -> None:
+        """建立連線池"""
+        if not self.enabled or self._pool is not None:
+            if settings.DATABASE_ENABLED and not ASYNCPG_AVAILABLE:
+                logger.warning("未安裝 asyncpg，熱門查詢改走 PostgREST")
+            return
+        self._pool = await asyncpg.create_pool(
+            settings.DATABASE_URL,
+            min_size=settings.DATABASE_POOL_MIN_SIZE,
+            max_size=settings.DATABASE_POOL_MAX_SIZE,
+            statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+            command_timeout=settings.DATABASE_COMMAND_TIMEOUT,
+        )
+
+    async def disconnect(self) -> None:
+        """關閉連線池"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await pool.close()
+
+    async def fetch(self, name: str, *args: Any) -> Optional[List[dict]]:
+        """
+        執行白名單查詢
+
+        Args:
+            name: QUERIES 內的查詢名稱
+            *args: 查詢參數（$1, $2, ...）
+
+        Returns:
+            資料列（格式同 table_select）；未啟用或直連失敗時返回 None，由呼叫端改走 PostgREST
+        """
+        sql = QUERIES[name]
+        if self._pool is None:
+            return None
+        try:
+            records = await self._pool.fetch(sql, *args)
+        except Exception as e:
+            logger.warning(f"直連查詢失敗 {name}，改走 PostgREST: {e}")
+            return None
+        return [
+            {key: _to_json_value(value) for key, value in record.items()}
+            for record in records
+        ]
+
+    # ========== 熱門查詢 ==========
+
+    async def get_employee_subtype(self, user_id: str) -> List[dict]:
+        """查詢用戶的員工類型（權限查詢）"""
+        rows = await self.fetch("user_employee_subtype", user_id)
+        if rows is None:
+            rows = await supabase_service.table_select(
+                table="user_profiles",
+                select="employee_subtype",
+                filters={"id": f"eq.{user_id}"},
+                use_service_key=True
+            )
+        return rows
+
+    async def get_binding_by_user(
+        self,
+        user_id: str,
+        channel_type: Optional[str] = None
+    ) -> List[dict]:
+        """查詢用戶的 Line 綁定"""
+        rows = await self.fetch("line_binding_by_user", user_id, channel_type)
+        if rows is None:
+            filters = {"user_id": f"eq.{user_id}"}
+            if channel_type:
+                filters["channel_type"] = f"eq.{channel_type}"
+            rows = await supabase_service.table_select(
+                table="line_user_bindings",
+                select="*",
+                filters=filters,
+                limit=1,
+                use_service_key=True
+            )
+        return rows
+
+    async def get_notification_history(
+        self,
+        user_id: Optional[str] = None,
+        channel_type: Optional[str] = None,
+        notification_type: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> tuple[List[dict], Optional[int]]:
+        """
+        通知歷史分頁
+
+        Returns:
+            (當頁資料, 總筆數)，格式同 table_select_page
+        """
+        args = (user_id, channel_type, notification_type)
+        rows = await self.fetch("notification_history_page", *args, limit, offset)
+        if rows is not None:
+            if rows:
+                total = rows[0]["_total"]
+                for row in rows:
+                    del row["_total"]
+                return rows, total
+            # 超出範圍的頁碼：沒有資料，另外查詢總筆數
+            count = await self.fetch("notification_history_count", *args)
+            if count is not None:
+                return [], count[0]["count"]
+
+        filters = {}
+        if user_id:
+            filters["user_id"] = f"eq.{user_id}"
+        if channel_type:
+            filters["channel_type"] = f"eq.{channel_type}"
+        if notification_type:
+            filters["notification_type"] = f"eq.{notification_type}"
+        return await supabase_service.table_select_page(
+            table="line_notification_logs",
+            select="*",
+            filters=filters,
+            order="created_at.desc",
+            limit=limit,
+            offset=offset,
+            count="exact",
+            use_service_key=True
+        )
+
+    async def search_available_slots(
+        self,
+        slot_date: date,
+        teacher_id: Optional[str] = None
+    ) -> List[dict]:
+        """查詢指定日期可預約的教師時段"""
+        rows = await self.fetch("available_slots_by_date", slot_date, teacher_id)
+        if rows is None:
+            filters = {
+                "slot_date": f"eq.{slot_date.isoformat()}",
+                "is_available": "eq.true",
+                "is_booked": "eq.false",
+                "is_deleted": "eq.false",
+            }
+            if teacher_id:
+                filters["teacher_id"] = f"eq.{teacher_id}"
+            rows = await supabase_service.table_select(
+                table="teacher_available_slots",
+                select=SLOT_COLUMNS,
+                filters=filters,
+                order="start_time.asc,teacher_id.asc",
+                use_service_key=True
+            )
+        return rows
+
+
+# 單例
+database_service = DatabaseService()
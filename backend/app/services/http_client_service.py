@@ -0,0 +1,78 @@
+"""
+對外 HTTP 連線服務 - 集中管理各上游的長連線 httpx client
+
+每個上游（Kong/PostgREST、GoTrue、api.line.me）各自擁有
+獨立的連線池，避免每次呼叫都重新建立 TCP + TLS 連線。
+"""
+import logging
+from typing import Dict
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援需要 h2 套件
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class Upstream:
+    """上游名稱"""
+    POSTGREST = "postgrest"
+    GOTRUE = "gotrue"
+    LINE_API = "line_api"
+
+    ALL = (POSTGREST, GOTRUE, LINE_API)
+
+
+class HttpClientService:
+    """對外 HTTP client 註冊表（由應用生命週期開啟與關閉）"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _build_client(self, upstream: str) -> httpx.AsyncClient:
+        """依設定建立上游專用的 client"""
+        config = settings.get_http_upstream(upstream)
+
+        http2 = config.http2 and HTTP2_AVAILABLE
+        if config.http2 and not HTTP2_AVAILABLE:
+            logger.warning(f"未安裝 h2，{upstream} 改用 HTTP/1.1")
+
+        return httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+        )
+
+    async def open(self) -> None:
+        """建立所有上游的 client"""
+        for upstream in Upstream.ALL:
+            self.get(upstream)
+
+    def get(self, upstream: str) -> httpx.AsyncClient:
+        """取得上游 client（尚未建立時延遲建立）"""
+        client = self._clients.get(upstream)
+        if client is None or client.is_closed:
+            client = self._build_client(upstream)
+            self._clients[upstream] = client
+        return client
+
+    async def close(self) -> None:
+        """關閉所有上游的 client"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+# 單例
+http_client_service = HttpClientService()
@@ -8,12 +8,13 @@ from datetime import datetime, timezone
 
 from app.config import ChannelType
 from app.services.supabase_service import supabase_service
+from app.services.database_service import database_service
 from app.services.line_oauth_service import LineProfile
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LineBinding:
-    """Line 綁定資料"""
+    """Line 綁定資料（唯讀）"""
     id: str
     user_id: Optional[str]
     line_user_id: str
@@ -28,6 +29,27 @@ class LineBinding:
     bound_at: datetime
     created_at: datetime
 
+    @classmethod
+    def from_row(cls, data: dict) -> "LineBinding":
+        """由 line_user_bindings 資料列建立（位置參數，避免逐欄關鍵字比對）"""
+        get = data.get
+        created_at = get("created_at")
+        return cls(
+            data["id"],
+            data["user_id"],
+            data["line_user_id"],
+            get("line_display_name"),
+            get("line_picture_url"),
+            get("line_email"),
+            get("binding_status", "active"),
+            get("channel_type", "student"),
+            get("notify_booking_confirmation", True),
+            get("notify_booking_reminder", True),
+            get("notify_status_update", True),
+            get("bound_at", created_at),
+            created_at,
+        )
+
 
 @dataclass
 class NotificationPreferences:
@@ -170,16 +192,7 @@ class LineBindingService:
             綁定資料，如果不存在則返回 None
         """
         try:
-            filters = {"user_id": f"eq.{user_id}"}
-            if channel_type:
-                filters["channel_type"] = f"eq.{channel_type}"
-
-            result = await supabase_service.table_select(
-                table="line_user_bindings",
-                select="*",
-                filters=filters,
-                use_service_key=True
-            )
+            result = await database_service.get_binding_by_user(user_id, channel_type)
 
             if result and len(result) > 0:
                 return self._to_binding(result[0])
@@ -471,10 +484,16 @@ class LineBindingService:
         Returns:
             Line User ID，如果未綁定則返回 None
         """
-        binding = await self.get_binding_by_user(user_id, channel_type)
-        if binding and binding.binding_status == "active":
-            return binding.line_user_id
-        return None
+        try:
+            return await supabase_service.rpc(
+                "get_line_user_id_by_channel",
+                {"p_user_id": user_id, "p_channel_type": channel_type},
+                use_service_key=True,
+                returns="scalar",
+                read_only=True
+            )
+        except Exception:
+            return None
 
     async def is_bound(
         self,
@@ -491,26 +510,21 @@ class LineBindingService:
         Returns:
             True 如果已綁定
         """
-        binding = await self.get_binding_by_user(user_id, channel_type)
-        return binding is not None and binding.binding_status == "active"
+        try:
+            result = await supabase_service.rpc(
+                "is_line_bound",
+                {"p_user_id": user_id, "p_channel_type": channel_type},
+                use_service_key=True,
+                returns="scalar",
+                read_only=True
+            )
+            return bool(result)
+        except Exception:
+            return False
 
     def _to_binding(self, data: dict) -> LineBinding:
         """將字典轉換為 LineBinding 物件"""
-        return LineBinding(
-            id=data["id"],
-            user_id=data["user_id"],
-            line_user_id=data["line_user_id"],
-            line_display_name=data.get("line_display_name"),
-            line_picture_url=data.get("line_picture_url"),
-            line_email=data.get("line_email"),
-            binding_status=data.get("binding_status", "active"),
-            channel_type=data.get("channel_type", "student"),
-            notify_booking_confirmation=data.get("notify_booking_confirmation", True),
-            notify_booking_reminder=data.get("notify_booking_reminder", True),
-            notify_status_update=data.get("notify_status_update", True),
-            bound_at=data.get("bound_at", data.get("created_at")),
-            created_at=data.get("created_at"),
-        )
+        return LineBinding.from_row(data)
 
 
 # 單例
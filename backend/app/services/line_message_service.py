@@ -6,10 +6,9 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 from enum import Enum
 
-import httpx
-
 from app.config import settings, ChannelType
 from app.services.supabase_service import supabase_service
+from app.services.http_client_service import http_client_service, Upstream
 from app.services.line_binding_service import line_binding_service
 
 
@@ -73,22 +72,22 @@ class LineMessageService:
         if not channel_token:
             return None
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.PUSH_URL,
-                json={
-                    "to": line_user_id,
-                    "messages": messages,
-                },
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {channel_token}",
-                }
-            )
+        client = http_client_service.get(Upstream.LINE_API)
+        response = await client.post(
+            self.PUSH_URL,
+            json={
+                "to": line_user_id,
+                "messages": messages,
+            },
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {channel_token}",
+            }
+        )
 
-            if response.status_code == 200:
-                return response.headers.get("x-line-request-id")
-            return None
+        if response.status_code == 200:
+            return response.headers.get("x-line-request-id")
+        return None
 
     async def send_text_message(
         self,
@@ -9,11 +9,11 @@ from typing import Optional, Tuple, Literal
 from dataclasses import dataclass
 from urllib.parse import urlencode
 
-import httpx
-
 from app.config import settings, LineChannelConfig, ChannelType
+from app.services.http_client_service import http_client_service, Upstream
 from app.services.redis_service import redis_service
 from app.services.supabase_service import supabase_service
+from app.services.user_directory_service import user_directory_service
 
 
 @dataclass
@@ -106,13 +106,11 @@ class LineOAuthService:
         Returns:
             (是否有效, 關聯的 user_id, 頻道類型)
         """
-        state_data = await redis_service.get_json(f"line_oauth_state:{state}")
+        # 取出並刪除（原子操作，同一個 state 只能使用一次）
+        state_data = await redis_service.pop_json(f"line_oauth_state:{state}")
         if state_data is None:
             return False, None, None
 
-        # 刪除已使用的 state
-        await redis_service.delete(f"line_oauth_state:{state}")
-
         return True, state_data.get("user_id"), state_data.get("channel_type")
 
     def get_authorization_url(
@@ -163,32 +161,32 @@ class LineOAuthService:
         """
         channel = self.get_login_channel()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.TOKEN_URL,
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": channel.callback_url,
-                    "client_id": channel.channel_id,
-                    "client_secret": channel.channel_secret,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
+        client = http_client_service.get(Upstream.LINE_API)
+        response = await client.post(
+            self.TOKEN_URL,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": channel.callback_url,
+                "client_id": channel.channel_id,
+                "client_secret": channel.channel_secret,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
 
-            if response.status_code != 200:
-                error_data = response.json()
-                raise Exception(f"Line token exchange failed: {error_data}")
-
-            data = response.json()
-            return LineTokens(
-                access_token=data["access_token"],
-                token_type=data.get("token_type", "Bearer"),
-                refresh_token=data.get("refresh_token"),
-                expires_in=data.get("expires_in", 0),
-                id_token=data.get("id_token"),
-                scope=data.get("scope", ""),
-            )
+        if response.status_code != 200:
+            error_data = response.json()
+            raise Exception(f"Line token exchange failed: {error_data}")
+
+        data = response.json()
+        return LineTokens(
+            access_token=data["access_token"],
+            token_type=data.get("token_type", "Bearer"),
+            refresh_token=data.get("refresh_token"),
+            expires_in=data.get("expires_in", 0),
+            id_token=data.get("id_token"),
+            scope=data.get("scope", ""),
+        )
 
     async def get_user_profile(self, access_token: str) -> LineProfile:
         """
@@ -203,22 +201,22 @@ class LineOAuthService:
         Raises:
             Exception: 如果取得失敗
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                self.PROFILE_URL,
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
+        client = http_client_service.get(Upstream.LINE_API)
+        response = await client.get(
+            self.PROFILE_URL,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
 
-            if response.status_code != 200:
-                raise Exception(f"Failed to get Line profile: {response.text}")
+        if response.status_code != 200:
+            raise Exception(f"Failed to get Line profile: {response.text}")
 
-            data = response.json()
-            return LineProfile(
-                user_id=data["userId"],
-                display_name=data["displayName"],
-                picture_url=data.get("pictureUrl"),
-                status_message=data.get("statusMessage"),
-            )
+        data = response.json()
+        return LineProfile(
+            user_id=data["userId"],
+            display_name=data["displayName"],
+            picture_url=data.get("pictureUrl"),
+            status_message=data.get("statusMessage"),
+        )
 
     def decode_id_token(self, id_token: str) -> dict:
         """
@@ -271,12 +269,12 @@ class LineOAuthService:
         Returns:
             True 如果有效
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                self.VERIFY_URL,
-                params={"access_token": access_token}
-            )
-            return response.status_code == 200
+        client = http_client_service.get(Upstream.LINE_API)
+        response = await client.get(
+            self.VERIFY_URL,
+            params={"access_token": access_token}
+        )
+        return response.status_code == 200
 
     async def revoke_token(
         self,
@@ -295,17 +293,17 @@ class LineOAuthService:
         """
         channel = self.get_login_channel()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.REVOKE_URL,
-                data={
-                    "access_token": access_token,
-                    "client_id": channel.channel_id,
-                    "client_secret": channel.channel_secret,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            return response.status_code == 200
+        client = http_client_service.get(Upstream.LINE_API)
+        response = await client.post(
+            self.REVOKE_URL,
+            data={
+                "access_token": access_token,
+                "client_id": channel.channel_id,
+                "client_secret": channel.channel_secret,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        return response.status_code == 200
 
     async def find_user_by_email(self, email: str) -> Optional[dict]:
         """
@@ -318,11 +316,10 @@ class LineOAuthService:
             用戶資料 dict，如果不存在則返回 None
         """
         try:
-            users = await supabase_service.admin_list_users()
-            for user in users:
-                # user is a SupabaseUser object, use attribute access
-                if user.email == email:
-                    return {"id": user.id, "email": user.email}
+            # 用戶目錄鏡像未命中時以資料庫函數直接查詢 auth.users
+            user = await user_directory_service.get_by_email(email)
+            if user:
+                return {"id": user.id, "email": email}
             return None
         except Exception:
             return None
@@ -343,20 +340,16 @@ class LineOAuthService:
             用戶資料，如果不存在則返回 None
         """
         try:
-            result = await supabase_service.table_select(
-                table="line_user_bindings",
-                select="user_id",
-                filters={
-                    "line_user_id": f"eq.{line_user_id}",
-                    "channel_type": f"eq.{channel_type}",
-                    "binding_status": "eq.active"
-                },
-                use_service_key=True
+            user_id = await supabase_service.rpc(
+                "get_user_by_line_id",
+                {"p_line_user_id": line_user_id, "p_channel_type": channel_type},
+                use_service_key=True,
+                returns="scalar",
+                read_only=True
             )
 
-            if result and len(result) > 0:
-                user_id = result[0]["user_id"]
-                return await supabase_service.admin_get_user(user_id)
+            if user_id:
+                return await user_directory_service.get_by_id(user_id)
 
             return None
         except Exception:
@@ -405,6 +398,7 @@ class LineOAuthService:
                 "line_user_id": profile.user_id,
             }
         )
+        await user_directory_service.put(result.user)
 
         return result
 
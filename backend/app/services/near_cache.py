@@ -0,0 +1,168 @@
+"""
+Redis 近端快取 - 以 CLIENT TRACKING（BCAST 模式）失效通知維持一致的程序內 LRU
+
+- 只快取指定前綴的鍵；任何 worker / 節點修改、刪除或過期這些鍵時，伺服器推送失效通知
+- 失效通知以 RESP2 REDIRECT 導向專用的訂閱連線（__redis__:invalidate 頻道）
+- 讀取期間收到同一鍵的失效通知時不寫入快取，避免把舊值放回
+- 訂閱連線中斷時清空並停用快取，重新連線並重新啟用追蹤後才恢復
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+# 快取中表示「鍵不存在」的值（與尚未快取區分）
+MISSING = object()
+
+
+class NearCache:
+    """程序內 LRU，由 Redis 失效通知維持一致"""
+
+    def __init__(self, prefixes: Iterable[str], max_entries: int, ttl_seconds: float):
+        self.prefixes = tuple(prefixes)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+        # 讀取中的鍵 → 讀取序號；收到失效通知時移除，表示讀到的值可能已過期
+        self._pending: Dict[str, int] = {}
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._connections: List[redis.Connection] = []
+        self._ready = asyncio.Event()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def active(self) -> bool:
+        """失效通知正常接收中（否則不使用快取）"""
+        return self._ready.is_set()
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    # ========== 讀寫 ==========
+
+    def get(self, key: str) -> object:
+        """取得快取值；未快取時回傳 None，鍵不存在時回傳 MISSING"""
+        if not self.active or not self.tracks(key):
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def begin(self, key: str) -> int:
+        """開始從 Redis 讀取（回傳讀取序號，供 store 確認期間未失效）"""
+        self._sequence += 1
+        self._pending[key] = self._sequence
+        return self._sequence
+
+    def store(self, key: str, token: int, value: Optional[str]) -> None:
+        """寫入快取（讀取期間已失效時略過）"""
+        if self._pending.get(key) != token:
+            return
+        del self._pending[key]
+        if not self.active:
+            return
+        self._entries[key] = (MISSING if value is None else value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable[str]]) -> None:
+        """移除鍵（None 表示伺服器清空資料庫，全部移除）"""
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+            self._pending.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+
+    # ========== 失效通知 ==========
+
+    async def start(self, pool: redis.ConnectionPool) -> None:
+        """啟動失效通知訂閱"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(pool))
+
+    async def stop(self) -> None:
+        """停止訂閱並清空快取"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self._close_connections()
+
+    async def _connect(self, pool: redis.ConnectionPool) -> redis.Connection:
+        """建立訂閱專用連線（不設讀取逾時，長時間等待通知）"""
+        connection = pool.connection_class(**{**pool.connection_kwargs, "socket_timeout": None})
+        await connection.connect()
+        self._connections.append(connection)
+        return connection
+
+    async def _close_connections(self) -> None:
+        self._ready.clear()
+        self.clear()
+        connections, self._connections = self._connections, []
+        for connection in connections:
+            await connection.disconnect()
+
+    async def _listen(self, pool: redis.ConnectionPool) -> None:
+        while True:
+            try:
+                listener = await self._connect(pool)
+                await listener.send_command("CLIENT", "ID")
+                client_id = await listener.read_response()
+                await listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+                await listener.read_response()
+
+                # 追蹤連線只負責啟用 BCAST 追蹤，需保持開啟
+                tracker = await self._connect(pool)
+                prefixes = [arg for prefix in self.prefixes for arg in ("PREFIX", prefix)]
+                await tracker.send_command(
+                    "CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefixes
+                )
+                await tracker.read_response()
+
+                self.clear()
+                self._ready.set()
+                logger.info(f"Redis 近端快取已啟用：{', '.join(self.prefixes)}")
+
+                while True:
+                    message = await listener.read_response()
+                    if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+                        self.invalidate(message[2])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis 近端快取失效通知中斷，暫停使用快取: {e}")
+            await self._close_connections()
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
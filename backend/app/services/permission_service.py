@@ -1,9 +1,12 @@
 """
 權限服務 - 管理員工階層式權限
 """
-from typing import Optional
+from typing import Optional, Tuple
 from app.services.redis_service import redis_service
-from app.services.supabase_service import supabase_service
+from app.services import redis_keys
+from app.services.redis_pool import RedisUnavailableError
+from app.services.data_loader import DataLoader
+from app.services.database_service import database_service
 
 
 class PermissionService:
@@ -45,82 +48,143 @@ class PermissionService:
         """取得權限等級名稱"""
         return self.LEVEL_NAMES.get(level, '未知')
 
-    async def get_user_permission_level(self, user_id: str) -> int:
+    async def _fetch_employee_type(
+        self,
+        user_id: str,
+        loader: Optional[DataLoader] = None
+    ) -> Optional[str]:
+        """
+        從資料庫查詢員工類型
+
+        啟用直連時走 asyncpg；否則有 DataLoader 時併入請求內的批次查詢
+        """
+        if loader is not None and not database_service.available:
+            row = await loader.load("user_profiles", user_id, select="employee_subtype")
+        else:
+            result = await database_service.get_employee_subtype(user_id)
+            row = result[0] if result else None
+        return row.get("employee_subtype") if row else None
+
+    async def get_user_permission_level(
+        self,
+        user_id: str,
+        loader: Optional[DataLoader] = None
+    ) -> int:
         """
         取得用戶的權限等級
 
         Args:
             user_id: 用戶 ID
+            loader: 請求範圍的 DataLoader（可選）
 
         Returns:
             權限等級數值，非員工返回 0
         """
         # 嘗試從快取取得
-        cache_key = f"permission_level:{user_id}"
+        cache_key = redis_keys.permission_level(user_id)
         cached = await redis_service.get(cache_key)
         if cached is not None:
             return int(cached)
 
         # 從資料庫查詢
         try:
-            result = await supabase_service.table_select(
-                table="user_profiles",
-                select="employee_subtype",
-                filters={"id": f"eq.{user_id}"},
-                use_service_key=True
-            )
-
-            if result and len(result) > 0:
-                employee_type = result[0].get("employee_subtype")
-                level = self.get_level_for_type(employee_type)
-            else:
-                level = 0
+            employee_type = await self._fetch_employee_type(user_id, loader)
+            level = self.get_level_for_type(employee_type)
 
             # 快取結果
-            await redis_service.set(cache_key, str(level), ex=self.CACHE_TTL)
+            await redis_service.set(cache_key, str(level), expire_seconds=self.CACHE_TTL)
             return level
 
         except Exception:
             return 0
 
-    async def get_user_employee_type(self, user_id: str) -> Optional[str]:
+    async def get_user_employee_type(
+        self,
+        user_id: str,
+        loader: Optional[DataLoader] = None
+    ) -> Optional[str]:
         """
         取得用戶的員工類型
 
         Args:
             user_id: 用戶 ID
+            loader: 請求範圍的 DataLoader（可選）
 
         Returns:
             員工類型字串，非員工返回 None
         """
         # 嘗試從快取取得
-        cache_key = f"employee_type:{user_id}"
+        cache_key = redis_keys.employee_type(user_id)
         cached = await redis_service.get(cache_key)
         if cached is not None:
             return cached if cached != "null" else None
 
         # 從資料庫查詢
         try:
-            result = await supabase_service.table_select(
-                table="user_profiles",
-                select="employee_subtype",
-                filters={"id": f"eq.{user_id}"},
-                use_service_key=True
-            )
-
-            if result and len(result) > 0:
-                employee_type = result[0].get("employee_subtype")
-            else:
-                employee_type = None
+            employee_type = await self._fetch_employee_type(user_id, loader)
 
             # 快取結果
             cache_value = employee_type if employee_type else "null"
-            await redis_service.set(cache_key, cache_value, ex=self.CACHE_TTL)
+            await redis_service.set(cache_key, cache_value, expire_seconds=self.CACHE_TTL)
             return employee_type
 
         except Exception:
             return None
 
+    def parse_cached(
+        self,
+        cached_level: Optional[str],
+        cached_type: Optional[str]
+    ) -> Optional[Tuple[int, Optional[str]]]:
+        """解析權限快取值；任一未命中時返回 None"""
+        if cached_level is None or cached_type is None:
+            return None
+        return int(cached_level), cached_type if cached_type != "null" else None
+
+    async def get_user_permissions(
+        self,
+        user_id: str,
+        loader: Optional[DataLoader] = None
+    ) -> Tuple[int, Optional[str]]:
+        """
+        一次取得用戶的權限等級與員工類型
+
+        兩個快取鍵（同一 hash tag）以單次 MGET 讀取；未命中時查詢一次資料庫並以單次 pipeline 寫回
+
+        Args:
+            user_id: 用戶 ID
+            loader: 請求範圍的 DataLoader（可選）
+
+        Returns:
+            (權限等級, 員工類型)；非員工返回 (0, None)
+        """
+        level_key = redis_keys.permission_level(user_id)
+        type_key = redis_keys.employee_type(user_id)
+        try:
+            cached_level, cached_type = await redis_service.mget([level_key, type_key])
+        except RedisUnavailableError:
+            # Redis 無法使用時直接查詢資料庫（不快取）
+            cached_level = cached_type = None
+            cache_available = False
+        else:
+            cache_available = True
+        cached = self.parse_cached(cached_level, cached_type)
+        if cached is not None:
+            return cached
+
+        try:
+            employee_type = await self._fetch_employee_type(user_id, loader)
+            level = self.get_level_for_type(employee_type)
+            if cache_available:
+                await redis_service.mset(
+                    {level_key: str(level), type_key: employee_type or "null"},
+                    expire_seconds=self.CACHE_TTL
+                )
+            return level, employee_type
+
+        except Exception:
+            return 0, None
+
     async def check_permission(
         self,
         user_id: str,
@@ -146,8 +210,10 @@ class PermissionService:
         Args:
             user_id: 用戶 ID
         """
-        await redis_service.delete(f"permission_level:{user_id}")
-        await redis_service.delete(f"employee_type:{user_id}")
+        await redis_service.delete_many(
+            redis_keys.permission_level(user_id),
+            redis_keys.employee_type(user_id)
+        )
 
     def is_higher_or_equal(
         self,
@@ -0,0 +1,79 @@
+"""
+用戶資料服務 - 以嵌入資源一次取回 user_profiles 與角色實體
+"""
+from typing import Optional, List
+
+from app.models.user import UserProfileRecord
+from app.services.supabase_service import supabase_service
+from app.services.data_loader import DataLoader
+from app.services.select_builder import Embed, build_select
+
+# 一次取回 user_profiles 與對應角色實體的 select
+PROFILE_SELECT = build_select(
+    "*",
+    Embed("students"),
+    Embed("teachers"),
+    Embed("employees"),
+)
+
+
+class ProfileService:
+    """用戶資料查詢"""
+
+    def __init__(self):
+        self.supabase = supabase_service
+
+    async def get_profile(
+        self,
+        user_id: str,
+        loader: Optional[DataLoader] = None
+    ) -> Optional[UserProfileRecord]:
+        """
+        取得單一用戶資料（含角色實體）
+
+        Args:
+            user_id: 用戶 ID
+            loader: 請求範圍的 DataLoader（可選，同一 tick 的查詢會合併）
+
+        Returns:
+            用戶資料，不存在時返回 None
+        """
+        if loader is not None:
+            row = await loader.load("user_profiles", user_id, select=PROFILE_SELECT)
+            return UserProfileRecord.model_validate(row) if row else None
+
+        rows = await self.supabase.table_select(
+            table="user_profiles",
+            select=PROFILE_SELECT,
+            filters={"id": f"eq.{user_id}"},
+            use_service_key=True
+        )
+        return UserProfileRecord.model_validate(rows[0]) if rows else None
+
+    async def list_profiles(
+        self,
+        role: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> tuple[List[UserProfileRecord], int]:
+        """
+        分頁列出用戶資料（含角色實體）
+
+        Returns:
+            (當頁用戶資料, 總筆數)
+        """
+        rows, total = await self.supabase.table_select_page(
+            table="user_profiles",
+            select=PROFILE_SELECT,
+            filters={"role": f"eq.{role}"} if role else None,
+            order="created_at.desc,id.asc",
+            limit=limit,
+            offset=offset,
+            count="exact",
+            use_service_key=True
+        )
+        return [UserProfileRecord.model_validate(row) for row in rows], total or 0
+
+
+# 單例
+profile_service = ProfileService()
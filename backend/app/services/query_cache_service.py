@@ -0,0 +1,151 @@
+"""
+PostgREST 查詢快取服務 - 以 Redis 快取參考資料表的查詢結果
+
+快取鍵包含表格版本號；任何對該表的寫入都會遞增版本號，
+舊版本的快取因此不再被讀取，並在 TTL 到期後自然淘汰。
+"""
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from typing import Optional, Any
+
+from app.config import settings
+from app.core import json_codec
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCacheService:
+    """讀取快取（read-through）與寫入失效"""
+
+    CACHE_PREFIX = "pgrst_cache:"
+    VERSION_PREFIX = "pgrst_cache_ver:"
+
+    def __init__(self):
+        self.redis = redis_service
+        self._stats: dict = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+        )
+
+    # ========== 設定 ==========
+
+    def ttl_for(self, table: str) -> Optional[int]:
+        """取得表格的快取 TTL（秒），未啟用快取時返回 None"""
+        if not settings.SUPABASE_CACHE_ENABLED:
+            return None
+        ttl = settings.SUPABASE_CACHE_TABLES.get(table)
+        return ttl if ttl and ttl > 0 else None
+
+    # ========== 快取鍵 ==========
+
+    @staticmethod
+    def normalize_select(select: str) -> str:
+        """正規化 select：去除空白，未含嵌入資源時依欄位排序"""
+        columns = [c.strip() for c in select.split(",") if c.strip()]
+        if settings.SUPABASE_CACHE_NORMALIZE_SELECT and "(" not in select:
+            columns = sorted(set(columns))
+        return ",".join(columns)
+
+    def build_key(
+        self,
+        table: str,
+        version: str,
+        select: str,
+        filters: list[str],
+        **query: Any
+    ) -> str:
+        """
+        建立快取鍵
+
+        Args:
+            filters: PostgREST 過濾參數（如 "id=eq.1"），順序不影響快取鍵
+            **query: 其他影響結果的參數（排序、分頁、金鑰類型等）
+        """
+        query["select"] = self.normalize_select(select)
+        query["filters"] = sorted(filters)
+        digest = hashlib.sha256(
+            json.dumps(query, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return f"{self.CACHE_PREFIX}{table}:v{version}:{digest}"
+
+    async def _version(self, table: str) -> str:
+        return await self.redis.get(f"{self.VERSION_PREFIX}{table}") or "0"
+
+    # ========== 讀寫 ==========
+
+    async def key(
+        self,
+        table: str,
+        select: str,
+        filters: list[str],
+        **query: Any
+    ) -> Optional[str]:
+        """取得目前版本的快取鍵（不讀取快取）；Redis 不可用時為 None"""
+        try:
+            version = await self._version(table)
+        except Exception as e:
+            self._stats[table]["errors"] += 1
+            logger.debug(f"查詢快取讀取失敗 {table}: {e}")
+            return None
+        return self.build_key(table, version, select, filters, **query)
+
+    async def get(
+        self,
+        table: str,
+        select: str,
+        filters: list[str],
+        **query: Any
+    ) -> tuple[Optional[str], Optional[Any]]:
+        """
+        查詢快取
+
+        Returns:
+            (快取鍵, 快取資料)；未命中時資料為 None，Redis 不可用時鍵亦為 None
+        """
+        key = await self.key(table, select, filters, **query)
+        if key is None:
+            return None, None
+        try:
+            cached = await self.redis.get(key)
+        except Exception as e:
+            self._stats[table]["errors"] += 1
+            logger.debug(f"查詢快取讀取失敗 {table}: {e}")
+            return None, None
+
+        if cached is None:
+            self._stats[table]["misses"] += 1
+            return key, None
+
+        self._stats[table]["hits"] += 1
+        return key, json_codec.loads(cached)
+
+    async def set(self, table: str, key: str, value: Any, ttl: int) -> None:
+        """寫入快取"""
+        try:
+            await self.redis.set(key, json_codec.dumps(value), expire_seconds=ttl)
+        except Exception as e:
+            self._stats[table]["errors"] += 1
+            logger.debug(f"查詢快取寫入失敗 {table}: {e}")
+
+    async def invalidate(self, table: str) -> None:
+        """遞增表格版本號，使該表所有快取失效"""
+        if self.ttl_for(table) is None:
+            return
+        try:
+            await self.redis.client.incr(f"{self.VERSION_PREFIX}{table}")
+            self._stats[table]["invalidations"] += 1
+        except Exception as e:
+            self._stats[table]["errors"] += 1
+            logger.warning(f"查詢快取失效失敗 {table}: {e}")
+
+    # ========== 統計 ==========
+
+    def stats(self) -> dict:
+        """取得各表格的命中/未命中/失效統計"""
+        return {table: dict(counters) for table, counters in self._stats.items()}
+
+
+# 單例
+query_cache_service = QueryCacheService()
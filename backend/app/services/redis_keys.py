@@ -0,0 +1,64 @@
+"""
+Redis 鍵配置 - 以 hash tag 讓同一用戶的鍵落在 Redis Cluster 的同一個 slot
+
+- session:{<user_id>}:<session_hash>   Session 資料
+- blacklist:{<user_id>}:<token_hash>   已撤銷的 Token
+- user_sessions:{<user_id>}            用戶的 Session 集合
+- permission_level:{<user_id>}         權限等級快取
+- employee_type:{<user_id>}            員工類型快取
+- user_profile:{<user_id>}             用戶資料快取
+- read_sticky:{<user_id>}             寫入後讀取走主庫的期間（見 ReplicaRouter）
+
+同一用戶的多鍵操作（MGET、DEL、pipeline、認證腳本）因此只需一個節點；
+速率限制、OAuth state 等單鍵資料不需要 hash tag。
+單一節點部署時 hash tag 只是鍵名的一部分，不影響行為。
+
+舊鍵格式（不含 hash tag）於 REDIS_LEGACY_KEY_FALLBACK 啟用期間仍會讀取，見 legacy_*。
+"""
+
+
+def user_tag(user_id: str) -> str:
+    """用戶的 hash tag（Cluster 只以大括號內的字串計算 slot）"""
+    return f"{{{user_id}}}"
+
+
+def session(user_id: str, session_hash: str) -> str:
+    return f"session:{user_tag(user_id)}:{session_hash}"
+
+
+def blacklist(user_id: str, token_hash: str) -> str:
+    return f"blacklist:{user_tag(user_id)}:{token_hash}"
+
+
+def user_sessions(user_id: str) -> str:
+    return f"user_sessions:{user_tag(user_id)}"
+
+
+def permission_level(user_id: str) -> str:
+    return f"permission_level:{user_tag(user_id)}"
+
+
+def employee_type(user_id: str) -> str:
+    return f"employee_type:{user_tag(user_id)}"
+
+
+def user_profile(user_id: str) -> str:
+    return f"user_profile:{user_tag(user_id)}"
+
+
+def read_sticky(user_id: str) -> str:
+    return f"read_sticky:{user_tag(user_id)}"
+
+
+# ========== 舊鍵格式（REDIS_LEGACY_KEY_FALLBACK 相容期間使用） ==========
+
+def legacy_session(session_hash: str) -> str:
+    return f"session:{session_hash}"
+
+
+def legacy_blacklist(token_hash: str) -> str:
+    return f"blacklist:{token_hash}"
+
+
+def legacy_user_sessions(user_id: str) -> str:
+    return f"user_sessions:{user_id}"
@@ -0,0 +1,187 @@
+"""
+Redis 連線池與斷路器
+
+- InstrumentedConnectionPool：阻塞式連線池。連線全部借出時，取得連線的協程最多等待
+  timeout 秒（逾時拋出 PoolWaitTimeoutError），並記錄借出數、等待時間分佈、耗盡與逾時次數；
+  建立連線不佔用等待鎖，Redis 無回應時各呼叫依 socket 逾時各自失敗
+- GuardedRedis：每個指令與 pipeline 經過斷路器。Redis 連線失敗或逾時達門檻後開啟，
+  開啟期間直接拋出 RedisUnavailableError，不再等待連線逾時
+- GuardedRedisCluster：Redis Cluster 版本（每個節點各自維護連線池，不支援 MULTI/EXEC）
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import redis.asyncio as redis
+from redis.asyncio.connection import async_timeout
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import ClusterPipeline, RedisCluster
+from redis.exceptions import (
+    ClusterDownError, ConnectionError, MaxConnectionsError, RedisClusterException, TimeoutError
+)
+
+from app.core.resilience import CircuitBreaker, LatencyHistogram, UpstreamUnavailableError
+
+# 視為 Redis 無法使用的錯誤（指令錯誤如 WRONGTYPE、NOSCRIPT 代表連線正常）
+# 叢集所有節點都無法連線時，重新探索拓樸會拋出 RedisClusterException
+REDIS_FAILURES = (
+    ConnectionError, TimeoutError, OSError, asyncio.TimeoutError,
+    ClusterDownError, RedisClusterException
+)
+
+
+class RedisUnavailableError(UpstreamUnavailableError):
+    """Redis 無法使用（斷路器開啟或連線失敗）"""
+
+    def __init__(self, message: str = "Redis 暫時無法使用"):
+        super().__init__("redis", message)
+
+
+class PoolWaitTimeoutError(ConnectionError):
+    """連線全部借出，等待超過 timeout 秒（負載過高，不代表 Redis 故障）"""
+
+
+def _is_pool_wait_timeout(error: BaseException) -> bool:
+    """
+    連線池等待逾時或叢集節點連線數已滿（不計入斷路器失敗）
+
+    只認 InstrumentedConnectionPool 的 PoolWaitTimeoutError：redis-py 其他連線池在建立連線失敗時
+    同樣拋出由 asyncio.TimeoutError 引起的 ConnectionError，需計入失敗
+    """
+    return isinstance(error, (PoolWaitTimeoutError, MaxConnectionsError))
+
+
+async def guarded_call(breaker: CircuitBreaker, call: Callable[[], Awaitable[Any]]) -> Any:
+    """經過斷路器執行 Redis 呼叫"""
+    if not breaker.allow():
+        raise RedisUnavailableError("Redis 斷路器開啟中，暫停呼叫")
+    try:
+        result = await call()
+    except REDIS_FAILURES as e:
+        if _is_pool_wait_timeout(e):
+            raise
+        breaker.record_failure()
+        raise RedisUnavailableError(f"Redis 暫時無法使用: {e}") from e
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+
+class GuardedPipeline(Pipeline):
+    """經過斷路器送出的 pipeline"""
+
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True):
+        return await guarded_call(self.breaker, lambda: super(GuardedPipeline, self).execute(raise_on_error))
+
+
+class GuardedRedis(redis.Redis):
+    """每個指令經過斷路器的 Redis 客戶端"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await guarded_call(self.breaker, lambda: super(GuardedRedis, self).execute_command(*args, **options))
+
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> GuardedPipeline:
+        pipe = GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class GuardedClusterPipeline(ClusterPipeline):
+    """經過斷路器送出的叢集 pipeline（依 slot 分組送往各節點）"""
+
+    breaker: CircuitBreaker
+
+    async def initialize(self) -> "GuardedClusterPipeline":
+        # 進入 async with 時會先探索叢集拓樸
+        return await guarded_call(self.breaker, lambda: super(GuardedClusterPipeline, self).initialize())
+
+    async def execute(self, raise_on_error: bool = True, allow_redirections: bool = True):
+        return await guarded_call(
+            self.breaker,
+            lambda: super(GuardedClusterPipeline, self).execute(raise_on_error, allow_redirections)
+        )
+
+
+class GuardedRedisCluster(RedisCluster):
+    """每個指令經過斷路器的 Redis Cluster 客戶端"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await guarded_call(self.breaker, lambda: super(GuardedRedisCluster, self).execute_command(*args, **options))
+
+    def pipeline(self, transaction: Any = None, shard_hint: Any = None) -> GuardedClusterPipeline:
+        if transaction or shard_hint:
+            # 交給 redis-py 拋出 RedisClusterException
+            return super().pipeline(transaction, shard_hint)
+        pipe = GuardedClusterPipeline(self)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """記錄等待指標的阻塞式連線池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait = LatencyHistogram()
+        self.acquired = 0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.peak_in_use = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        # redis-py 的 BlockingConnectionPool 在持有 _condition 時建立連線，連線緩慢或失敗時
+        # 所有等待者一起卡到等待逾時；這裡只在 _condition 內保留名額，建立連線移到鎖外
+        if not self.can_get_connection():
+            self.exhausted += 1
+        start = time.perf_counter()
+        try:
+            async with async_timeout(self.timeout):
+                async with self._condition:
+                    await self._condition.wait_for(self.can_get_connection)
+                    try:
+                        connection = self._available_connections.pop()
+                    except IndexError:
+                        connection = self.make_connection()
+                    self._in_use_connections.add(connection)
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self.wait.observe((time.perf_counter() - start) * 1000, error=True)
+            raise PoolWaitTimeoutError("No connection available.") from e
+        self.wait.observe((time.perf_counter() - start) * 1000)
+
+        # 連線失敗（含 socket_connect_timeout / socket_timeout）直接拋出，並歸還名額
+        try:
+            await self.ensure_connection(connection)
+        except BaseException:
+            await self.release(connection)
+            raise
+        self.acquired += 1
+        self.peak_in_use = max(self.peak_in_use, len(self._in_use_connections))
+        return connection
+
+    def stats(self) -> dict:
+        """取得連線池狀態與等待指標"""
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "peak_in_use": self.peak_in_use,
+            "acquired": self.acquired,
+            "exhausted": self.exhausted,
+            "timeouts": self.timeouts,
+            "wait_ms": self.wait.snapshot(),
+        }
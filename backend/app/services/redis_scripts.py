@@ -0,0 +1,117 @@
+"""
+Redis Lua 腳本 - 由 RedisService 於連線時載入並以 EVALSHA 呼叫
+
+每個腳本在伺服器端原子地執行，取代多次往返的讀取-修改-寫入
+"""
+
+# 固定視窗計數：INCR，視窗開始（或鍵遺失過期時間）時設定過期
+# KEYS[1] 計數鍵；ARGV[1] 視窗秒數
+# 回傳目前計數
+INCR_WITH_EXPIRE = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 or redis.call('TTL', KEYS[1]) == -1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return current
+"""
+
+# 更新 Session 的 last_activity 並重設過期時間
+# hash 格式只寫入 last_activity 欄位；舊 JSON 格式直接替換欄位字串，不重新編碼
+# Session 不存在時不寫入（避免建立只有 last_activity 的殘缺 Session）
+# KEYS[1] Session 鍵；ARGV[1] ISO 時間字串；ARGV[2] 過期秒數
+# 回傳 1 成功；0 Session 不存在
+TOUCH_SESSION = """
+local kind = redis.call('TYPE', KEYS[1])['ok']
+if kind == 'hash' then
+    redis.call('HSET', KEYS[1], 'last_activity', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if kind ~= 'string' then
+    return 0
+end
+local updated = string.gsub(
+    redis.call('GET', KEYS[1]),
+    '"last_activity"%s*:%s*"[^"]*"', '"last_activity":"' .. ARGV[1] .. '"', 1
+)
+redis.call('SET', KEYS[1], updated, 'EX', ARGV[2])
+return 1
+"""
+
+# 請求認證：檢查 Token 撤銷、取得 Session、確認屬於此用戶、更新活動時間並取得權限快取
+# hash 與 JSON 兩種 Session 格式皆在同一次往返內處理（JSON 格式以字串比對讀取 user_id、last_activity，
+# 與 TOUCH_SESSION 相同，不依賴 cjson）
+# KEYS[1] 黑名單鍵；KEYS[2] Session 鍵；KEYS[3] 權限等級鍵；KEYS[4] 員工類型鍵（同一 hash tag）；
+# KEYS[5] 舊格式黑名單鍵（選用，只在非叢集模式傳入）
+# ARGV[1] user_id；ARGV[2] ISO 現在時間；ARGV[3] 寫入門檻（last_activity 早於此值時寫入，
+# 空字串表示不寫入）；ARGV[4] 過期秒數；ARGV[5] 是否檢查黑名單（'1' / '0'）
+# 回傳 {狀態}；成功時為 {狀態, 是否寫入, 權限等級, 員工類型, Session...}（快取不存在為 nil）
+# 狀態：1 成功（hash，其後為欄位與值）；2 成功（JSON，其後為 JSON 字串）；
+#       0 Session 不存在；-1 Token 已撤銷；-2 Session 不屬於此用戶
+AUTHENTICATE = """
+if ARGV[5] == '1' and (redis.call('EXISTS', KEYS[1]) == 1 or (KEYS[5] and redis.call('EXISTS', KEYS[5]) == 1)) then
+    return {-1}
+end
+local kind = redis.call('TYPE', KEYS[2])['ok']
+if kind == 'string' then
+    local raw = redis.call('GET', KEYS[2])
+    if string.match(raw, '"user_id"%s*:%s*"([^"]*)"') ~= ARGV[1] then
+        return {-2}
+    end
+    local touched = 0
+    local pattern = '"last_activity"%s*:%s*"([^"]*)"'
+    if ARGV[3] ~= '' and (string.match(raw, pattern) or '') < ARGV[3] then
+        raw = string.gsub(raw, pattern, '"last_activity":"' .. ARGV[2] .. '"', 1)
+        redis.call('SET', KEYS[2], raw, 'EX', ARGV[4])
+        touched = 1
+    end
+    return {2, touched, redis.call('GET', KEYS[3]), redis.call('GET', KEYS[4]), raw}
+end
+if kind ~= 'hash' then
+    return {0}
+end
+if redis.call('HGET', KEYS[2], 'user_id') ~= ARGV[1] then
+    return {-2}
+end
+local touched = 0
+if ARGV[3] ~= '' and (redis.call('HGET', KEYS[2], 'last_activity') or '') < ARGV[3] then
+    redis.call('HSET', KEYS[2], 'last_activity', ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[4])
+    touched = 1
+end
+local result = {1, touched, redis.call('GET', KEYS[3]), redis.call('GET', KEYS[4])}
+for _, value in ipairs(redis.call('HGETALL', KEYS[2])) do
+    table.insert(result, value)
+end
+return result
+"""
+
+# 取出並刪除（一次性 token / OAuth state）
+# KEYS[1] 鍵
+# 回傳原值；不存在時回傳 nil
+POP = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('DEL', KEYS[1])
+end
+return value
+"""
+
+# 延長鎖的過期時間（只延長自己持有的鎖）
+# KEYS[1] 鎖的鍵；ARGV[1] 持有者 token；ARGV[2] 過期秒數
+# 回傳 1 已延長；0 鎖已過期或由其他持有者取得
+RENEW_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 腳本名稱 → 原始碼
+SCRIPTS = {
+    "incr_with_expire": INCR_WITH_EXPIRE,
+    "touch_session": TOUCH_SESSION,
+    "authenticate": AUTHENTICATE,
+    "pop": POP,
+    "renew_lock": RENEW_LOCK,
+}
@@ -1,28 +1,96 @@
+import hashlib
+import logging
 import redis.asyncio as redis
-from typing import Optional, Any
-import json
+from redis.asyncio.client import Pipeline
+from redis.exceptions import NoScriptError
+from typing import Optional, Any, AsyncIterator, Dict, List, Sequence, Tuple
 from app.config import settings
+from app.core import json_codec
+from app.services.redis_scripts import SCRIPTS
+from app.services.near_cache import NearCache, MISSING
+from app.services.redis_pool import GuardedRedis, GuardedRedisCluster, InstrumentedConnectionPool
+from app.core.resilience import CircuitBreaker
 from contextlib import asynccontextmanager
 
+logger = logging.getLogger(__name__)
+
 class RedisService:
     def __init__(self):
-        self._pool: Optional[redis.ConnectionPool] = None
+        self._pool: Optional[InstrumentedConnectionPool] = None
         self._client: Optional[redis.Redis] = None
+        # Redis Cluster 模式（REDIS_CLUSTER_ENABLED，多鍵操作依 slot 分組）
+        self.cluster = False
+        # 熱門鍵的程序內近端快取（REDIS_NEAR_CACHE_ENABLED 時於連線後啟用）
+        self.near_cache: Optional[NearCache] = None
+        # Redis 故障時快速失敗（不逐一等待連線逾時）
+        self.breaker = CircuitBreaker(
+            "redis",
+            failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.REDIS_BREAKER_RESET_TIMEOUT
+        )
+        # 腳本名稱 → (原始碼, SHA1)
+        self._scripts: Dict[str, Tuple[str, str]] = {}
+        for name, source in SCRIPTS.items():
+            self.register_script(name, source)
     
     async def connect(self) -> None:
         """建立 Redis 連線"""
-        self._pool = redis.ConnectionPool.from_url(
+        if settings.REDIS_CLUSTER_ENABLED:
+            await self._connect_cluster()
+            return
+        
+        self._pool = InstrumentedConnectionPool.from_url(
             settings.REDIS_URL,
             password=settings.REDIS_PASSWORD,
             decode_responses=True,
-            max_connections=10
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
         )
-        self._client = redis.Redis(connection_pool=self._pool)
+        self._client = GuardedRedis(connection_pool=self._pool, breaker=self.breaker)
         # 測試連線
         await self._client.ping()
+        await self.load_scripts()
+        
+        if settings.REDIS_NEAR_CACHE_ENABLED:
+            self.near_cache = NearCache(
+                settings.REDIS_NEAR_CACHE_PREFIXES,
+                max_entries=settings.REDIS_NEAR_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.REDIS_NEAR_CACHE_TTL_SECONDS
+            )
+            await self.near_cache.start(self._pool)
+    
+    async def _connect_cluster(self) -> None:
+        """
+        連線 Redis Cluster（REDIS_URL 為任一節點，其餘節點自動探索）
+        
+        每個節點各自維護最多 REDIS_MAX_CONNECTIONS 條連線。
+        近端快取的失效通知需逐節點訂閱，叢集模式下不啟用。
+        """
+        self.cluster = True
+        self._client = GuardedRedisCluster.from_url(
+            settings.REDIS_URL,
+            password=settings.REDIS_PASSWORD,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            breaker=self.breaker
+        )
+        await self._client.initialize()
+        await self.load_scripts()
+        
+        if settings.REDIS_NEAR_CACHE_ENABLED:
+            logger.warning("Redis Cluster 模式不支援近端快取，已略過 REDIS_NEAR_CACHE_ENABLED")
     
     async def disconnect(self) -> None:
         """關閉 Redis 連線"""
+        if self.near_cache:
+            await self.near_cache.stop()
+            self.near_cache = None
         if self._client:
             await self._client.close()
         if self._pool:
@@ -34,24 +102,51 @@ class RedisService:
             raise RuntimeError("Redis 尚未連線")
         return self._client
     
+    # ========== 近端快取 ==========
+    
+    def _invalidate_local(self, keys: Sequence[Any]) -> None:
+        """本程序寫入後立即移除近端快取（不等待伺服器通知，確保讀到自己的寫入）"""
+        cache = self.near_cache
+        if cache is not None:
+            cache.invalidate(key for key in keys if isinstance(key, str) and cache.tracks(key))
+    
+    def _pipeline_keys(self, pipe: Pipeline) -> List[Any]:
+        """pipeline 中排入指令的參數（用於本地失效，非鍵參數不符合前綴會被忽略）"""
+        return [arg for args, _ in pipe.command_stack for arg in args[1:]]
+    
     # ========== 基本操作 ==========
     
     async def get(self, key: str) -> Optional[str]:
-        """取得值"""
-        return await self.client.get(key)
+        """取得值（追蹤前綴的鍵優先由近端快取回應）"""
+        cache = self.near_cache
+        if cache is None or not cache.active or not cache.tracks(key):
+            return await self.client.get(key)
+        
+        cached = cache.get(key)
+        if cached is not None:
+            return None if cached is MISSING else cached
+        token = cache.begin(key)
+        value = await self.client.get(key)
+        cache.store(key, token, value)
+        return value
     
     async def set(
         self, 
         key: str, 
         value: str, 
-        expire_seconds: Optional[int] = None
+        expire_seconds: Optional[int] = None,
+        nx: bool = False
     ) -> bool:
-        """設定值"""
-        return await self.client.set(key, value, ex=expire_seconds)
+        """設定值（nx=True 時只在鍵不存在時設定，未設定返回 False）"""
+        result = await self.client.set(key, value, ex=expire_seconds, nx=nx)
+        self._invalidate_local([key])
+        return bool(result)
     
     async def delete(self, key: str) -> int:
         """刪除鍵"""
-        return await self.client.delete(key)
+        result = await self.client.delete(key)
+        self._invalidate_local([key])
+        return result
     
     async def exists(self, key: str) -> bool:
         """檢查鍵是否存在"""
@@ -70,7 +165,7 @@ class RedisService:
     async def get_json(self, key: str) -> Optional[dict]:
         """取得 JSON 物件"""
         data = await self.get(key)
-        return json.loads(data) if data else None
+        return json_codec.loads(data) if data else None
     
     async def set_json(
         self, 
@@ -79,7 +174,208 @@ class RedisService:
         expire_seconds: Optional[int] = None
     ) -> bool:
         """設定 JSON 物件"""
-        return await self.set(key, json.dumps(value), expire_seconds)
+        return await self.set(key, json_codec.dumps(value), expire_seconds)
+    
+    # ========== 批次操作（單次往返） ==========
+    
+    @asynccontextmanager
+    async def pipeline(self) -> AsyncIterator[Pipeline]:
+        """
+        非交易 pipeline：區塊內排入的指令於離開區塊時一次送出
+        
+        需要結果時可在區塊內自行 await pipe.execute()；區塊內拋出例外時不送出；
+        叢集模式下指令依 slot 分組送往各節點（每個節點一次往返）
+        """
+        async with self.client.pipeline(transaction=False) as pipe:
+            yield pipe
+            if len(pipe):
+                keys = self._pipeline_keys(pipe) if self.near_cache else []
+                await pipe.execute()
+                self._invalidate_local(keys)
+    
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Pipeline]:
+        """
+        MULTI/EXEC 交易：區塊內排入的指令於離開區塊時原子地執行
+        
+        叢集模式不支援（需要原子性時改用 Lua 腳本，鍵須位於同一個 slot）
+        """
+        async with self.client.pipeline(transaction=True) as pipe:
+            yield pipe
+            if len(pipe):
+                keys = self._pipeline_keys(pipe)
+                await pipe.execute()
+                self._invalidate_local(keys)
+    
+    async def _mget(self, keys: List[str]) -> List[Optional[str]]:
+        """MGET（叢集模式依 slot 分組，同一 slot 的鍵仍為單一指令）"""
+        if self.cluster:
+            return await self.client.mget_nonatomic(keys)
+        return await self.client.mget(keys)
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """一次取得多個值（順序與 keys 相同，不存在為 None）"""
+        if not keys:
+            return []
+        cache = self.near_cache
+        if cache is None or not cache.active:
+            return await self._mget(keys)
+        
+        # 近端快取命中的鍵不送出，其餘以單次 MGET 讀取
+        values: List[Optional[str]] = [None] * len(keys)
+        remote: List[Tuple[int, str, Optional[int]]] = []
+        for index, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                token = cache.begin(key) if cache.tracks(key) else None
+                remote.append((index, key, token))
+            elif cached is not MISSING:
+                values[index] = cached
+        if remote:
+            fetched = await self._mget([key for _, key, _ in remote])
+            for (index, key, token), value in zip(remote, fetched):
+                values[index] = value
+                if token is not None:
+                    cache.store(key, token, value)
+        return values
+    
+    async def mset(
+        self, 
+        mapping: Dict[str, str], 
+        expire_seconds: Optional[int] = None
+    ) -> None:
+        """一次設定多個值（指定過期時間時以 pipeline 逐鍵 SET EX）"""
+        if not mapping:
+            return
+        if expire_seconds is None:
+            if self.cluster:
+                await self.client.mset_nonatomic(mapping)
+            else:
+                await self.client.mset(mapping)
+            return
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=expire_seconds)
+    
+    async def mget_json(self, keys: List[str]) -> List[Optional[Any]]:
+        """一次取得多個 JSON 物件"""
+        return [
+            json_codec.loads(data) if data else None
+            for data in await self.mget(keys)
+        ]
+    
+    async def mset_json(
+        self, 
+        mapping: Dict[str, Any], 
+        expire_seconds: Optional[int] = None
+    ) -> None:
+        """一次設定多個 JSON 物件"""
+        await self.mset(
+            {key: json_codec.dumps(value) for key, value in mapping.items()},
+            expire_seconds
+        )
+    
+    async def delete_many(self, *keys: str) -> int:
+        """一次刪除多個鍵"""
+        if not keys:
+            return 0
+        result = await self.client.delete(*keys)
+        self._invalidate_local(keys)
+        return result
+    
+    # ========== Lua 腳本 ==========
+    
+    def register_script(self, name: str, source: str) -> str:
+        """註冊腳本（SHA1 於本地計算，連線時或首次 NOSCRIPT 時載入伺服器）"""
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        self._scripts[name] = (source, sha)
+        return sha
+    
+    async def load_scripts(self) -> None:
+        """將所有已註冊腳本載入伺服器腳本快取"""
+        for source, _ in self._scripts.values():
+            await self.client.script_load(source)
+    
+    async def run_script(
+        self, 
+        name: str, 
+        keys: Sequence[str] = (), 
+        args: Sequence[Any] = (),
+        written_keys: Optional[Sequence[str]] = None
+    ) -> Any:
+        """
+        以 EVALSHA 執行已註冊腳本
+        
+        伺服器腳本快取被清空（重啟、SCRIPT FLUSH、容錯移轉）時自動重新載入後再執行；
+        written_keys 為腳本可能寫入的鍵（移除近端快取用，預設為全部 keys）
+        """
+        source, sha = self._scripts[name]
+        try:
+            result = await self.client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await self.client.script_load(source)
+            result = await self.client.evalsha(sha, len(keys), *keys, *args)
+        self._invalidate_local(keys if written_keys is None else written_keys)
+        return result
+    
+    async def _evalsha_many(
+        self, 
+        sha: str, 
+        calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        async with self.pipeline() as pipe:
+            for keys, args in calls:
+                pipe.evalsha(sha, len(keys), *keys, *args)
+            return await pipe.execute(raise_on_error=False)
+    
+    async def run_script_many(
+        self, 
+        name: str, 
+        calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        """
+        以單次 pipeline 多次執行同一個已註冊腳本（calls 為 (keys, args) 序列）
+        
+        伺服器腳本快取被清空時載入後重送失敗的呼叫；其他錯誤於全部執行後拋出第一個
+        """
+        if not calls:
+            return []
+        source, sha = self._scripts[name]
+        results = await self._evalsha_many(sha, calls)
+        missing = [index for index, result in enumerate(results) if isinstance(result, NoScriptError)]
+        if missing:
+            await self.client.script_load(source)
+            retried = await self._evalsha_many(sha, [calls[index] for index in missing])
+            for index, result in zip(missing, retried):
+                results[index] = result
+        self._invalidate_local([key for keys, _ in calls for key in keys])
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+    
+    async def incr_with_expire(self, key: str, window_seconds: int) -> int:
+        """遞增計數並於視窗開始時設定過期時間（原子操作）"""
+        return int(await self.run_script("incr_with_expire", [key], [window_seconds]))
+    
+    async def pop(self, key: str) -> Optional[str]:
+        """取出並刪除值（原子操作，同一個值只會被取出一次）"""
+        return await self.run_script("pop", [key])
+    
+    async def pop_json(self, key: str) -> Optional[Any]:
+        """取出並刪除 JSON 物件"""
+        data = await self.pop(key)
+        return json_codec.loads(data) if data else None
+    
+    # ========== 統計 ==========
+    
+    def stats(self) -> dict:
+        """取得斷路器、連線池與近端快取統計"""
+        return {
+            "breaker": self.breaker.stats(),
+            "pool": self._pool.stats() if isinstance(self._pool, InstrumentedConnectionPool) else None,
+            "near_cache": self.near_cache.stats() if self.near_cache else None,
+        }
     
     # ========== Hash 操作 ==========
     
@@ -89,6 +385,12 @@ class RedisService:
     async def hset(self, name: str, key: str, value: str) -> int:
         return await self.client.hset(name, key, value)
     
+    async def hset_many(self, name: str, mapping: dict) -> int:
+        return await self.client.hset(name, mapping=mapping)
+    
+    async def hmget(self, name: str, keys: Sequence[str]) -> List[Optional[str]]:
+        return await self.client.hmget(name, keys)
+    
     async def hgetall(self, name: str) -> dict:
         return await self.client.hgetall(name)
     
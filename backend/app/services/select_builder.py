@@ -0,0 +1,45 @@
+"""
+PostgREST select 組合工具 - 以嵌入資源（embedded resources）一次取回關聯資料
+
+範例：
+    build_select("*", Embed("students"), Embed("teachers"), Embed("employees"))
+    → "*,students(*),teachers(*),employees(*)"
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Embed:
+    """嵌入資源（透過外鍵關聯的表格）"""
+    relation: str
+    columns: Tuple[str, ...] = ("*",)
+    alias: Optional[str] = None
+    hint: Optional[str] = None      # 外鍵名稱或欄位，用於有多條關聯時消除歧義
+    inner: bool = False             # True 時只保留有關聯資料的列（!inner）
+    embeds: Tuple["Embed", ...] = ()
+
+    def render(self) -> str:
+        """轉為 PostgREST select 語法"""
+        name = self.relation
+        if self.hint:
+            name += f"!{self.hint}"
+        if self.inner:
+            name += "!inner"
+        if self.alias:
+            name = f"{self.alias}:{name}"
+        return f"{name}({build_select(*self.columns, *self.embeds)})"
+
+
+def build_select(*items) -> str:
+    """
+    組合 select 字串
+
+    Args:
+        *items: 欄位名稱（str）或嵌入資源（Embed）
+
+    Returns:
+        PostgREST select 參數值
+    """
+    parts = [item.render() if isinstance(item, Embed) else item for item in items]
+    return ",".join(parts) or "*"
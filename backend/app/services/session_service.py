@@ -1,19 +1,57 @@
-from datetime import datetime, timezone
-from typing import Optional, List
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, List, Tuple
+from redis.exceptions import ResponseError
 from app.services.redis_service import redis_service
+from app.services import redis_keys
 from app.core.security import generate_session_id, hash_session_id
+from app.core.exceptions import InvalidTokenException, SessionExpiredException
 from app.config import settings
 from app.models.session import SessionData
-import json
+from app.core import json_codec
+
+logger = logging.getLogger(__name__)
+
+
+def _is_wrong_type(error: ResponseError) -> bool:
+    """鍵的資料型別不符（以 hash 指令讀取舊 JSON 格式的 Session）"""
+    return str(error).startswith("WRONGTYPE")
+
 
 class SessionService:
-    # Redis Key 前綴
-    SESSION_PREFIX = "session:"
-    USER_SESSIONS_PREFIX = "user_sessions:"
-    BLACKLIST_PREFIX = "blacklist:"
+    """
+    Session 以 Redis hash 儲存（extra_data 為 JSON 字串欄位），可只讀寫需要的欄位
     
+    SESSION_STORAGE_FORMAT 決定寫入格式；兩種格式皆可讀取與更新活動時間，
+    認證腳本皆以單次往返處理。
+    session:{user_id}:<hash> 鍵讀取不到時，REDIS_LEGACY_KEY_FALLBACK 期間改讀舊的 session:<hash> 鍵並搬移
+    """
     def __init__(self):
         self.redis = redis_service
+        # 緩衝中的活動時間：Session 鍵 → ISO 時間（SESSION_ACTIVITY_BUFFER_ENABLED 時由背景批次寫入）
+        self._activity: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.activity_skipped = 0
+        self.activity_buffered = 0
+        self.activity_written = 0
+    
+    # ========== 編碼 ==========
+    
+    @staticmethod
+    def _encode(session_data: SessionData) -> dict:
+        """SessionData → hash 欄位（省略 None）"""
+        fields = session_data.model_dump(exclude_none=True)
+        fields["extra_data"] = json_codec.dumps(fields.get("extra_data", {}))
+        return fields
+    
+    @staticmethod
+    def _decode(fields: dict) -> Optional[SessionData]:
+        """hash 欄位 → SessionData（空 hash 表示 Session 不存在）"""
+        if not fields:
+            return None
+        extra_data = fields.get("extra_data")
+        return SessionData(**{**fields, "extra_data": json_codec.loads(extra_data) if extra_data else {}})
     
     # ========== Session 管理 ==========
     
@@ -40,107 +78,336 @@ class SessionService:
             extra_data=extra_data or {}
         )
         
-        # 儲存 Session
-        session_key = f"{self.SESSION_PREFIX}{session_hash}"
-        await self.redis.set_json(
-            session_key,
-            session_data.model_dump(),
-            expire_seconds=settings.SESSION_EXPIRE_MINUTES * 60
-        )
-        
-        # 記錄用戶的所有 Sessions
-        user_sessions_key = f"{self.USER_SESSIONS_PREFIX}{user_id}"
-        await self.redis.sadd(user_sessions_key, session_hash)
-        await self.redis.expire(
-            user_sessions_key, 
-            settings.SESSION_EXPIRE_MINUTES * 60
-        )
+        # 儲存 Session 並記錄用戶的所有 Sessions（單次往返）
+        session_key = redis_keys.session(user_id, session_hash)
+        user_sessions_key = redis_keys.user_sessions(user_id)
+        expire_seconds = settings.SESSION_EXPIRE_MINUTES * 60
+        async with self.redis.pipeline() as pipe:
+            if settings.SESSION_STORAGE_FORMAT == "hash":
+                pipe.hset(session_key, mapping=self._encode(session_data))
+                pipe.expire(session_key, expire_seconds)
+            else:
+                pipe.set(session_key, json_codec.dumps(session_data.model_dump()), ex=expire_seconds)
+            pipe.sadd(user_sessions_key, session_hash)
+            pipe.expire(user_sessions_key, expire_seconds)
         
         return session_id, session_data
     
-    async def get_session(self, session_id: str) -> Optional[SessionData]:
-        """取得 Session 資料"""
-        session_hash = hash_session_id(session_id)
-        session_key = f"{self.SESSION_PREFIX}{session_hash}"
-        
+    async def get_session(self, session_id: str, user_id: str) -> Optional[SessionData]:
+        """取得 Session 資料（user_id 來自已驗證的 Token）"""
+        return await self._read_session(redis_keys.session(user_id, hash_session_id(session_id)))
+    
+    async def _read_session(self, session_key: str) -> Optional[SessionData]:
+        try:
+            return self._decode(await self.redis.hgetall(session_key))
+        except ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+        # 舊 JSON 格式
         data = await self.redis.get_json(session_key)
-        if not data:
-            return None
+        return SessionData(**data) if data else None
+    
+    async def get_session_fields(
+        self,
+        session_id: str,
+        user_id: str,
+        *fields: str
+    ) -> Optional[dict]:
+        """
+        只讀取 Session 的指定欄位（原始字串值，extra_data 未解析）
         
-        return SessionData(**data)
+        Session 不存在時回傳 None
+        """
+        session_key = redis_keys.session(user_id, hash_session_id(session_id))
+        
+        try:
+            values = await self.redis.hmget(session_key, fields)
+        except ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            data = await self.redis.get_json(session_key)
+            return {field: data.get(field) for field in fields} if data else None
+        if all(value is None for value in values):
+            return None
+        return dict(zip(fields, values))
     
-    async def update_session_activity(self, session_id: str) -> bool:
+    async def update_session_activity(self, session_id: str, user_id: str) -> bool:
         """更新 Session 最後活動時間"""
-        session_hash = hash_session_id(session_id)
-        session_key = f"{self.SESSION_PREFIX}{session_hash}"
+        return await self._touch(redis_keys.session(user_id, hash_session_id(session_id)))
+    
+    async def _touch(self, session_key: str) -> bool:
+        # 單一腳本原子地寫入 last_activity 欄位並重設過期（Session 不存在時不寫入）
+        updated = await self.redis.run_script(
+            "touch_session",
+            [session_key],
+            [datetime.now(timezone.utc).isoformat(), settings.SESSION_EXPIRE_MINUTES * 60]
+        )
+        return bool(updated)
+    
+    # ========== 活動時間（去抖動） ==========
+    
+    async def record_activity(self, user_id: str, session_hash: str, last_activity: str) -> None:
+        """
+        記錄請求活動（每個已認證請求呼叫）
         
-        data = await self.redis.get_json(session_key)
-        if not data:
-            return False
+        last_activity 距今未超過 SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS 時略過；
+        啟用緩衝時排入下一次批次寫入，否則立即寫入
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            age = (now - datetime.fromisoformat(last_activity)).total_seconds()
+        except (TypeError, ValueError):
+            age = None
+        if age is not None and age < settings.SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS:
+            self.activity_skipped += 1
+            return
         
-        data["last_activity"] = datetime.now(timezone.utc).isoformat()
-        await self.redis.set_json(
-            session_key,
-            data,
-            expire_seconds=settings.SESSION_EXPIRE_MINUTES * 60
-        )
-        return True
+        session_key = redis_keys.session(user_id, session_hash)
+        if self._task is not None:
+            self._activity[session_key] = now.isoformat()
+            self.activity_buffered += 1
+            return
+        await self._touch(session_key)
+        self.activity_written += 1
+    
+    async def flush_activity(self) -> int:
+        """以單次 pipeline 寫入緩衝中的活動時間（失敗時保留至下次）"""
+        pending, self._activity = self._activity, {}
+        if not pending:
+            return 0
+        expire_seconds = settings.SESSION_EXPIRE_MINUTES * 60
+        try:
+            await self.redis.run_script_many(
+                "touch_session",
+                [([session_key], [timestamp, expire_seconds]) for session_key, timestamp in pending.items()]
+            )
+        except Exception:
+            for session_key, timestamp in pending.items():
+                self._activity.setdefault(session_key, timestamp)
+            raise
+        self.activity_written += len(pending)
+        return len(pending)
     
-    async def destroy_session(self, session_id: str) -> bool:
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SESSION_ACTIVITY_FLUSH_SECONDS)
+            try:
+                await self.flush_activity()
+            except Exception as e:
+                logger.warning(f"Session 活動時間批次寫入失敗: {e}")
+    
+    async def start(self) -> None:
+        """啟動活動時間批次寫入"""
+        if settings.SESSION_ACTIVITY_BUFFER_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """停止批次寫入並寫入剩餘的活動時間"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush_activity()
+        except Exception as e:
+            logger.warning(f"Session 活動時間寫入失敗: {e}")
+    
+    def stats(self) -> dict:
+        return {
+            "activity_skipped": self.activity_skipped,
+            "activity_buffered": self.activity_buffered,
+            "activity_written": self.activity_written,
+            "activity_pending": len(self._activity),
+        }
+    
+    async def destroy_session(self, session_id: str, user_id: str) -> bool:
         """銷毀 Session"""
-        session_hash = hash_session_id(session_id)
-        session_key = f"{self.SESSION_PREFIX}{session_hash}"
-        
-        # 取得 Session 資料以獲取 user_id
-        data = await self.redis.get_json(session_key)
-        if data:
-            user_id = data.get("user_id")
-            if user_id:
-                # 從用戶 Sessions 集合中移除
-                user_sessions_key = f"{self.USER_SESSIONS_PREFIX}{user_id}"
-                await self.redis.srem(user_sessions_key, session_hash)
-        
-        # 刪除 Session
-        await self.redis.delete(session_key)
+        return await self.remove_session(user_id, hash_session_id(session_id))
+    
+    async def remove_session(self, user_id: str, session_hash: str) -> bool:
+        """依 Session 雜湊值銷毀 Session（撤銷其他裝置）"""
+        # 兩個鍵位於同一個 slot，單次 pipeline 完成
+        async with self.redis.pipeline() as pipe:
+            pipe.srem(redis_keys.user_sessions(user_id), session_hash)
+            pipe.delete(redis_keys.session(user_id, session_hash))
         return True
     
     async def destroy_all_user_sessions(self, user_id: str) -> int:
         """銷毀用戶所有 Sessions (登出所有裝置)"""
-        user_sessions_key = f"{self.USER_SESSIONS_PREFIX}{user_id}"
-        session_hashes = await self.redis.smembers(user_sessions_key)
+        user_sessions_key = redis_keys.user_sessions(user_id)
+        if not settings.REDIS_LEGACY_KEY_FALLBACK:
+            session_hashes = await self.redis.smembers(user_sessions_key)
+            await self.redis.delete_many(
+                *(redis_keys.session(user_id, session_hash) for session_hash in session_hashes),
+                user_sessions_key
+            )
+            return len(session_hashes)
+        
+        # 尚未搬移的舊格式 Session 同樣失效（兩個集合以 pipeline 一次讀取）
+        legacy_sessions_key = redis_keys.legacy_user_sessions(user_id)
+        async with self.redis.pipeline() as pipe:
+            pipe.smembers(user_sessions_key)
+            pipe.smembers(legacy_sessions_key)
+            session_hashes, legacy_hashes = await pipe.execute()
+        
+        await self.redis.delete_many(
+            *(redis_keys.session(user_id, session_hash) for session_hash in session_hashes),
+            *(redis_keys.legacy_session(session_hash) for session_hash in legacy_hashes),
+            user_sessions_key,
+            legacy_sessions_key
+        )
+        return len(session_hashes | legacy_hashes)
+    
+    async def _migrate_legacy_session(self, user_id: str, session_hash: str) -> bool:
+        """
+        將舊格式鍵（session:<hash>）的 Session 搬移到新鍵（REDIS_LEGACY_KEY_FALLBACK 期間）
+        
+        保留剩餘的有效期；Session 不屬於此用戶時不搬移
         
-        count = 0
-        for session_hash in session_hashes:
-            session_key = f"{self.SESSION_PREFIX}{session_hash}"
-            await self.redis.delete(session_key)
-            count += 1
+        Returns:
+            是否已搬移
+        """
+        if not settings.REDIS_LEGACY_KEY_FALLBACK:
+            return False
+        legacy_key = redis_keys.legacy_session(session_hash)
+        raw = await self.redis.get(legacy_key)
+        if not raw or json_codec.loads(raw).get("user_id") != user_id:
+            return False
+        ttl = await self.redis.ttl(legacy_key)
+        expire_seconds = ttl if ttl > 0 else settings.SESSION_EXPIRE_MINUTES * 60
         
-        await self.redis.delete(user_sessions_key)
-        return count
+        # 新鍵在同一個 slot，單次往返寫入；舊鍵在其他 slot，另外刪除
+        user_sessions_key = redis_keys.user_sessions(user_id)
+        async with self.redis.pipeline() as pipe:
+            pipe.set(redis_keys.session(user_id, session_hash), raw, ex=expire_seconds)
+            pipe.sadd(user_sessions_key, session_hash)
+            pipe.expire(user_sessions_key, settings.SESSION_EXPIRE_MINUTES * 60)
+        await self.redis.delete(legacy_key)
+        await self.redis.srem(redis_keys.legacy_user_sessions(user_id), session_hash)
+        logger.info(f"已搬移用戶 {user_id} 的舊格式 Session")
+        return True
     
     async def get_user_sessions(self, user_id: str) -> List[SessionData]:
         """取得用戶所有活躍 Sessions"""
-        user_sessions_key = f"{self.USER_SESSIONS_PREFIX}{user_id}"
+        user_sessions_key = redis_keys.user_sessions(user_id)
         session_hashes = await self.redis.smembers(user_sessions_key)
+        session_keys = [redis_keys.session(user_id, session_hash) for session_hash in session_hashes]
         
-        sessions = []
-        for session_hash in session_hashes:
-            session_key = f"{self.SESSION_PREFIX}{session_hash}"
-            data = await self.redis.get_json(session_key)
-            if data:
-                sessions.append(SessionData(**data))
+        async with self.redis.pipeline() as pipe:
+            for session_key in session_keys:
+                pipe.hgetall(session_key)
+            results = await pipe.execute(raise_on_error=False)
         
+        sessions: List[SessionData] = []
+        legacy_keys: List[str] = []
+        for session_key, result in zip(session_keys, results):
+            if isinstance(result, ResponseError):
+                legacy_keys.append(session_key)
+            elif result:
+                sessions.append(self._decode(result))
+        # 舊 JSON 格式
+        records = await self.redis.mget_json(legacy_keys)
+        sessions.extend(SessionData(**data) for data in records if data)
         return sessions
     
+    # ========== 請求認證 ==========
+    
+    async def authenticate(
+        self,
+        user_id: str,
+        token_hash: str,
+        session_hash: str,
+        check_blacklist: bool = True
+    ) -> Tuple[SessionData, Optional[str], Optional[str]]:
+        """
+        單次往返完成請求認證（authenticate 腳本）
+        
+        檢查 Token 撤銷、取得 Session、確認屬於此用戶、更新活動時間（去抖動）並取得權限快取；
+        中間件已檢查黑名單時以 check_blacklist=False 略過
+        
+        Returns:
+            (Session, 權限等級快取, 員工類型快取)；快取未命中為 None
+        
+        Raises:
+            InvalidTokenException: Token 已撤銷或 Session 不屬於此用戶
+            SessionExpiredException: Session 不存在
+        """
+        session_key = redis_keys.session(user_id, session_hash)
+        now = datetime.now(timezone.utc)
+        # 啟用緩衝時腳本不寫入，由 record_activity 排入批次
+        threshold = "" if self._task is not None else (
+            now - timedelta(seconds=settings.SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS)
+        ).isoformat()
+        
+        keys = [
+            redis_keys.blacklist(user_id, token_hash),
+            session_key,
+            redis_keys.permission_level(user_id),
+            redis_keys.employee_type(user_id),
+        ]
+        if check_blacklist and settings.REDIS_LEGACY_KEY_FALLBACK:
+            # 舊格式黑名單鍵不在同一個 slot：叢集模式另外查詢，單一節點由腳本一併檢查
+            legacy_key = redis_keys.legacy_blacklist(token_hash)
+            if not self.redis.cluster:
+                keys.append(legacy_key)
+            elif await self.redis.exists(legacy_key):
+                raise InvalidTokenException()
+        
+        result = await self.redis.run_script(
+            "authenticate",
+            keys,
+            [
+                user_id, now.isoformat(), threshold, settings.SESSION_EXPIRE_MINUTES * 60,
+                "1" if check_blacklist else "0"
+            ],
+            written_keys=[session_key]
+        )
+        status = result[0]
+        if status in (-1, -2):
+            raise InvalidTokenException()
+        if status == 0 and await self._migrate_legacy_session(user_id, session_hash):
+            # 黑名單已由本次腳本檢查
+            return await self.authenticate(user_id, token_hash, session_hash, check_blacklist=False)
+        if status not in (1, 2):
+            raise SessionExpiredException()
+        
+        _, touched, cached_level, cached_type, *fields = result
+        if status == 1:
+            session_data = self._decode(dict(zip(fields[::2], fields[1::2])))
+        else:
+            # JSON 格式：腳本以字串比對確認 user_id，解析後再確認一次
+            session_data = SessionData(**json_codec.loads(fields[0]))
+            if session_data.user_id != user_id:
+                raise InvalidTokenException()
+        if touched:
+            self.activity_written += 1
+        elif self._task is not None:
+            await self.record_activity(user_id, session_hash, session_data.last_activity)
+        else:
+            self.activity_skipped += 1
+        return session_data, cached_level, cached_type
+    
     # ========== Token 黑名單 ==========
     
-    async def blacklist_token(self, token: str, expire_seconds: int) -> bool:
+    async def blacklist_token(self, token: str, user_id: str, expire_seconds: int) -> bool:
         """將 Token 加入黑名單"""
-        key = f"{self.BLACKLIST_PREFIX}{hash_session_id(token)}"
+        key = redis_keys.blacklist(user_id, hash_session_id(token))
         return await self.redis.set(key, "1", expire_seconds=expire_seconds)
     
-    async def is_token_blacklisted(self, token: str) -> bool:
+    async def is_token_blacklisted(self, token: str, user_id: str) -> bool:
         """檢查 Token 是否在黑名單中"""
-        key = f"{self.BLACKLIST_PREFIX}{hash_session_id(token)}"
-        return await self.redis.exists(key)
-session_service = SessionService()
\ No newline at end of file
+        return await self.is_blacklisted(user_id, hash_session_id(token))
+    
+    async def is_blacklisted(self, user_id: str, token_hash: str) -> bool:
+        """依 Token 雜湊值檢查黑名單（鍵以 {user_id} hash tag 與 Session 落在同一個 slot）"""
+        keys = [redis_keys.blacklist(user_id, token_hash)]
+        if settings.REDIS_LEGACY_KEY_FALLBACK:
+            # 相容期間同時檢查舊格式的鍵（單一節點仍為一次往返）
+            keys.append(redis_keys.legacy_blacklist(token_hash))
+        return await self.redis.client.exists(*keys) > 0
+
+# 單例
+session_service = SessionService()
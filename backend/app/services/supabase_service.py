@@ -1,33 +1,154 @@
+import asyncio
 import httpx
-from typing import Optional, Any
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional, Any, Literal, Iterator, AsyncIterator, Awaitable
+from urllib.parse import quote
 from app.config import settings
+from app.core import json_codec
+from app.core.singleflight import SingleFlight
+from app.core.replica_router import ReplicaRouter
+from app.core.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, LatencyHistogram,
+    UpstreamUnavailableError, backoff_delay, remaining_time
+)
+from app.services.http_client_service import http_client_service, Upstream
+from app.services.query_cache_service import query_cache_service
+from app.services.redis_service import redis_service
+
+# PostgREST 計數模式（Prefer: count=...）
+CountMode = Literal["exact", "planned", "estimated"]
+
+# RPC 回傳形式：rows（列表）、single（單筆物件或 None）、scalar（純量值）
+RpcReturns = Literal["rows", "single", "scalar"]
+
+logger = logging.getLogger(__name__)
+
+# 可安全重試的 HTTP 方法
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+
+# 視為上游暫時故障、可重試的狀態碼
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+# 已帶操作符的過濾值前綴
+FILTER_OPERATORS = ('eq.', 'gt.', 'lt.', 'gte.', 'lte.', 'neq.', 'like.', 'ilike.', 'is.', 'in.')
 
 class SupabaseAuthResponse:
-    """Auth 回應包裝"""
+    """Auth 回應包裝（user / session 於首次存取時才建立）"""
+    __slots__ = ("_data",)
+
     def __init__(self, data: dict):
         self._data = data
-        self.user = SupabaseUser(data.get("user")) if data.get("user") else None
-        self.session = SupabaseSession(data.get("session")) if data.get("session") else None
-        self.error = data.get("error")
+
+    @property
+    def user(self) -> Optional["SupabaseUser"]:
+        data = self._data.get("user")
+        return SupabaseUser(data) if data else None
+
+    @property
+    def session(self) -> Optional["SupabaseSession"]:
+        data = self._data.get("session")
+        return SupabaseSession(data) if data else None
+
+    @property
+    def error(self) -> Any:
+        return self._data.get("error")
 
 class SupabaseUser:
-    """用戶資料包裝"""
+    """用戶資料包裝（唯讀，欄位直接讀取原始 dict，不複製）"""
+    __slots__ = ("_data",)
+
     def __init__(self, data: dict):
         self._data = data or {}
-        self.id = self._data.get("id")
-        self.email = self._data.get("email")
-        self.email_confirmed_at = self._data.get("email_confirmed_at")
-        self.created_at = self._data.get("created_at")
-        self.user_metadata = self._data.get("user_metadata", {})
+
+    @property
+    def id(self) -> Optional[str]:
+        return self._data.get("id")
+
+    @property
+    def email(self) -> Optional[str]:
+        return self._data.get("email")
+
+    @property
+    def email_confirmed_at(self) -> Optional[str]:
+        return self._data.get("email_confirmed_at")
+
+    @property
+    def created_at(self) -> Optional[str]:
+        return self._data.get("created_at")
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        return self._data.get("updated_at")
+
+    @property
+    def user_metadata(self) -> dict:
+        return self._data.get("user_metadata", {})
+
+    def to_dict(self) -> dict:
+        """原始用戶資料（複本）"""
+        return dict(self._data)
 
 class SupabaseSession:
-    """Session 資料包裝"""
+    """Session 資料包裝（唯讀，欄位直接讀取原始 dict，不複製）"""
+    __slots__ = ("_data",)
+
     def __init__(self, data: dict):
         self._data = data or {}
-        self.access_token = self._data.get("access_token")
-        self.refresh_token = self._data.get("refresh_token")
-        self.expires_in = self._data.get("expires_in")
-        self.token_type = self._data.get("token_type")
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self._data.get("access_token")
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        return self._data.get("refresh_token")
+
+    @property
+    def expires_in(self) -> Optional[int]:
+        return self._data.get("expires_in")
+
+    @property
+    def token_type(self) -> Optional[str]:
+        return self._data.get("token_type")
+
+def _json(response: httpx.Response) -> Any:
+    """以 orjson（若已安裝）直接解析回應的原始 bytes"""
+    return json_codec.loads(response.content)
+
+@dataclass
+class BulkChunkResult:
+    """批次寫入單一區塊的結果"""
+    index: int
+    row_count: int
+    rows: list = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+@dataclass
+class BulkWriteResult:
+    """批次寫入結果（依區塊記錄成功資料與錯誤）"""
+    chunks: list = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(chunk.ok for chunk in self.chunks)
+
+    @property
+    def rows(self) -> list[dict]:
+        """所有成功區塊回傳的資料"""
+        return [row for chunk in self.chunks if chunk.ok for row in chunk.rows]
+
+    @property
+    def errors(self) -> list[BulkChunkResult]:
+        """失敗的區塊"""
+        return [chunk for chunk in self.chunks if not chunk.ok]
 
 class SupabaseService:
     """Supabase 服務 - 使用 httpx 直接呼叫 API"""
@@ -36,13 +157,236 @@ class SupabaseService:
         self.url = settings.SUPABASE_URL
         self.anon_key = settings.SUPABASE_ANON_KEY
         self.service_key = settings.SUPABASE_SERVICE_ROLE_KEY
-        self._client: Optional[httpx.AsyncClient] = None
+        self._singleflight = SingleFlight()
+        self._breakers = {
+            upstream: CircuitBreaker(
+                upstream,
+                settings.SUPABASE_BREAKER_FAILURE_THRESHOLD,
+                settings.SUPABASE_BREAKER_RESET_TIMEOUT
+            )
+            for upstream in (Upstream.POSTGREST, Upstream.GOTRUE)
+        }
+        self._latency: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._replicas = ReplicaRouter(
+            settings.SUPABASE_READ_URLS,
+            settings.SUPABASE_READ_STICKY_SECONDS,
+            settings.SUPABASE_READ_REPLICA_DOWN_SECONDS,
+            redis_service
+        )
+    
+    @staticmethod
+    def _timeout(client: httpx.AsyncClient, remaining: Optional[float]) -> Any:
+        """依剩餘請求期限縮短單次請求逾時"""
+        if remaining is None:
+            return httpx.USE_CLIENT_DEFAULT
+        timeout = client.timeout
+        return httpx.Timeout(
+            min(timeout.read or remaining, remaining),
+            connect=min(timeout.connect or remaining, remaining),
+        )
+    
+    async def _request(
+        self,
+        upstream: str,
+        method: str,
+        path: str,
+        endpoint: Optional[str] = None,
+        *,
+        headers: dict,
+        params: Optional[dict] = None,
+        json: Any = None,
+        idempotent: Optional[bool] = None,
+        write: Optional[bool] = None,
+        base_url: Optional[str] = None
+    ) -> httpx.Response:
+        """
+        送出請求（所有 Supabase 呼叫共用）
+        
+        - 斷路器開啟時直接失敗，不等待逾時
+        - 冪等請求遇到連線錯誤或 502/503/504 時，以抖動退避重試
+        - 單次逾時不超過請求剩餘期限（見 app.core.resilience.deadline_scope）
+        - 依端點記錄延遲分佈
+        
+        Args:
+            path: URL 路徑（可含查詢字串），如 /rest/v1/courses?select=*
+            endpoint: 統計用的端點名稱（預設為不含查詢字串的路徑）
+            idempotent: 是否可重試（預設依 HTTP 方法判斷）
+            write: 是否會寫入資料庫（預設 PostgREST 的 GET/HEAD 以外皆是）；
+                寫入後同一用戶的讀取走主庫
+            base_url: 唯讀副本 URL；副本請求只送一次、不經斷路器，失敗由呼叫端改走主庫
+        
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+            DeadlineExceededError: 已超過請求期限
+            httpx.TransportError: 重試用盡仍無法連線
+        """
+        breaker = self._breakers[upstream] if base_url is None else None
+        client = http_client_service.get(upstream)
+        histogram = self._latency[f"{method} {endpoint or path.split('?', 1)[0]}"]
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + (settings.SUPABASE_RETRY_ATTEMPTS if idempotent and breaker else 0)
+        
+        # 寫入後的短時間內，同一用戶的讀取固定走主庫
+        if write is None:
+            write = upstream == Upstream.POSTGREST and method not in ("GET", "HEAD")
+        if write:
+            await self._replicas.record_write()
+        
+        attempt = 0
+        while True:
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceededError(upstream)
+            if breaker and not breaker.allow():
+                raise CircuitOpenError(upstream)
+            
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method,
+                    f"{base_url or self.url}{path}",
+                    headers=headers,
+                    params=params,
+                    json=json,
+                    timeout=self._timeout(client, remaining)
+                )
+            except httpx.TransportError as e:
+                histogram.observe((time.perf_counter() - start) * 1000, error=True)
+                if breaker:
+                    breaker.record_failure()
+                if not await self._wait_retry(upstream, attempt, attempts, e):
+                    if isinstance(e, httpx.TimeoutException) and remaining is not None \
+                            and remaining_time() <= 0:
+                        raise DeadlineExceededError(upstream) from e
+                    raise
+                attempt += 1
+                continue
+            
+            failed = response.status_code >= 500
+            histogram.observe((time.perf_counter() - start) * 1000, error=failed)
+            if breaker and failed:
+                breaker.record_failure()
+            elif breaker:
+                breaker.record_success()
+            
+            if response.status_code in RETRY_STATUS_CODES and await self._wait_retry(
+                upstream, attempt, attempts, f"HTTP {response.status_code}"
+            ):
+                attempt += 1
+                continue
+            return response
+    
+    async def _wait_retry(
+        self,
+        upstream: str,
+        attempt: int,
+        attempts: int,
+        reason: Any
+    ) -> bool:
+        """還有重試次數與剩餘期限時等待退避並返回 True"""
+        if attempt + 1 >= attempts:
+            return False
+        delay = backoff_delay(
+            attempt,
+            settings.SUPABASE_RETRY_BACKOFF_BASE,
+            settings.SUPABASE_RETRY_BACKOFF_MAX
+        )
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return False
+        logger.debug(f"{upstream} 請求失敗（{reason}），{delay:.2f} 秒後重試")
+        await asyncio.sleep(delay)
+        return True
+    
+    async def _get(
+        self,
+        upstream: str,
+        path: str,
+        headers: dict,
+        params: Optional[dict] = None,
+        endpoint: Optional[str] = None,
+        base_url: Optional[str] = None
+    ) -> httpx.Response:
+        """
+        GET 請求
+        
+        同時間內 URL、金鑰與分頁/計數標頭都相同的請求只會送出一次，
+        其餘呼叫端共用同一個回應。
+        """
+        def send() -> Awaitable[httpx.Response]:
+            return self._request(
+                upstream, "GET", path, endpoint,
+                headers=headers, params=params, base_url=base_url
+            )
+        
+        if not settings.SUPABASE_COALESCE_READS:
+            return await send()
+        
+        key = (
+            upstream,
+            base_url,
+            path,
+            tuple(sorted(params.items())) if params else None,
+            headers.get("Authorization"),
+            headers.get("Range"),
+            headers.get("Prefer"),
+        )
+        return await self._singleflight.do(key, send)
+    
+    async def _read(
+        self,
+        path: str,
+        headers: dict,
+        params: Optional[dict] = None,
+        primary: bool = False
+    ) -> httpx.Response:
+        """
+        PostgREST 讀取（設定 SUPABASE_READ_URLS 時輪詢唯讀副本）
+        
+        副本連線失敗或回應 5xx 時，暫停使用該副本並改走主庫。
+        
+        Args:
+            primary: 強制走主庫（需要讀到剛寫入的資料時使用）
+        """
+        replica = await self._replicas.pick(primary)
+        if replica is not None:
+            try:
+                response = await self._get(
+                    Upstream.POSTGREST, path, headers, params, base_url=replica
+                )
+                if response.status_code < 500:
+                    self._replicas.mark_up(replica)
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (httpx.TransportError, UpstreamUnavailableError) as e:
+                reason = str(e) or type(e).__name__
+            logger.warning(f"唯讀副本 {replica} 無法使用（{reason}），改走主庫")
+            self._replicas.mark_down(replica)
+        return await self._get(Upstream.POSTGREST, path, headers, params)
+    
+    @property
+    def replica_stats(self) -> dict:
+        """唯讀副本狀態與讀取分佈"""
+        return self._replicas.stats()
+    
+    @property
+    def coalesce_stats(self) -> dict:
+        """讀取請求合併統計（issued：實際送出、coalesced：合併等待）"""
+        return self._singleflight.stats()
+    
+    def reset_breakers(self) -> None:
+        """重置所有上游的斷路器"""
+        for breaker in self._breakers.values():
+            breaker.reset()
     
     @property
-    def client(self) -> httpx.AsyncClient:
-        if not self._client:
-            self._client = httpx.AsyncClient(timeout=30.0)
-        return self._client
+    def resilience_stats(self) -> dict:
+        """斷路器狀態與各端點延遲分佈"""
+        return {
+            "breakers": {name: b.stats() for name, b in self._breakers.items()},
+            "latency": {name: h.snapshot() for name, h in sorted(self._latency.items())},
+        }
     
     def _headers(self, use_service_key: bool = False) -> dict:
         """取得請求標頭"""
@@ -77,13 +421,13 @@ class SupabaseService:
         if metadata:
             payload["data"] = metadata
         
-        response = await self.client.post(
-            f"{self.url}/auth/v1/signup",
+        response = await self._request(
+            Upstream.GOTRUE, "POST", "/auth/v1/signup",
             headers=self._headers(),
             json=payload
         )
         
-        data = response.json()
+        data = _json(response)
         
         if response.status_code >= 400:
             raise Exception(data.get("msg") or data.get("message") or "註冊失敗")
@@ -96,8 +440,8 @@ class SupabaseService:
         password: str
     ) -> SupabaseAuthResponse:
         """密碼登入"""
-        response = await self.client.post(
-            f"{self.url}/auth/v1/token?grant_type=password",
+        response = await self._request(
+            Upstream.GOTRUE, "POST", "/auth/v1/token?grant_type=password",
             headers=self._headers(),
             json={
                 "email": email,
@@ -105,7 +449,7 @@ class SupabaseService:
             }
         )
         
-        data = response.json()
+        data = _json(response)
         
         if response.status_code >= 400:
             error_msg = data.get("error_description") or data.get("msg") or "登入失敗"
@@ -124,33 +468,34 @@ class SupabaseService:
     
     async def sign_out(self, access_token: str) -> bool:
         """登出"""
-        response = await self.client.post(
-            f"{self.url}/auth/v1/logout",
+        response = await self._request(
+            Upstream.GOTRUE, "POST", "/auth/v1/logout",
             headers=self._auth_headers(access_token)
         )
         return response.status_code < 400
     
     async def get_user(self, access_token: str) -> Optional[SupabaseUser]:
         """取得當前用戶"""
-        response = await self.client.get(
-            f"{self.url}/auth/v1/user",
+        response = await self._get(
+            Upstream.GOTRUE,
+            "/auth/v1/user",
             headers=self._auth_headers(access_token)
         )
         
         if response.status_code >= 400:
             return None
         
-        return SupabaseUser(response.json())
+        return SupabaseUser(_json(response))
     
     async def refresh_session(self, refresh_token: str) -> SupabaseAuthResponse:
         """刷新 Session"""
-        response = await self.client.post(
-            f"{self.url}/auth/v1/token?grant_type=refresh_token",
+        response = await self._request(
+            Upstream.GOTRUE, "POST", "/auth/v1/token?grant_type=refresh_token",
             headers=self._headers(),
             json={"refresh_token": refresh_token}
         )
         
-        data = response.json()
+        data = _json(response)
         
         if response.status_code >= 400:
             raise Exception(data.get("error_description") or "刷新失敗")
@@ -174,8 +519,8 @@ class SupabaseService:
         if redirect_url:
             payload["redirect_to"] = redirect_url
         
-        response = await self.client.post(
-            f"{self.url}/auth/v1/recover",
+        response = await self._request(
+            Upstream.GOTRUE, "POST", "/auth/v1/recover",
             headers=self._headers(),
             json=payload
         )
@@ -185,39 +530,56 @@ class SupabaseService:
     
     async def admin_get_user(self, user_id: str) -> Optional[SupabaseUser]:
         """管理員取得用戶"""
-        response = await self.client.get(
-            f"{self.url}/auth/v1/admin/users/{user_id}",
-            headers=self._headers(use_service_key=True)
+        response = await self._get(
+            Upstream.GOTRUE,
+            f"/auth/v1/admin/users/{user_id}",
+            headers=self._headers(use_service_key=True),
+            endpoint="/auth/v1/admin/users/{id}"
         )
         
         if response.status_code >= 400:
             return None
         
-        return SupabaseUser(response.json())
+        return SupabaseUser(_json(response))
     
     async def admin_list_users(
         self, 
         page: int = 1, 
-        per_page: int = 50
+        per_page: int = 50,
+        sort: Optional[str] = None,
+        raise_errors: bool = False
     ) -> list[SupabaseUser]:
-        """管理員列出用戶"""
-        response = await self.client.get(
-            f"{self.url}/auth/v1/admin/users",
+        """
+        管理員列出用戶
+        
+        Args:
+            sort: 排序，如 "created_at desc"（未指定時依 GoTrue 預設排序）
+            raise_errors: 查詢失敗時拋出例外（預設回傳空列表）
+        """
+        params = {"page": page, "per_page": per_page}
+        if sort:
+            params["sort"] = sort
+        response = await self._get(
+            Upstream.GOTRUE,
+            "/auth/v1/admin/users",
             headers=self._headers(use_service_key=True),
-            params={"page": page, "per_page": per_page}
+            params=params
         )
         
         if response.status_code >= 400:
+            if raise_errors:
+                raise Exception(f"列出用戶失敗（HTTP {response.status_code}）")
             return []
         
-        data = response.json()
+        data = _json(response)
         users = data.get("users", []) if isinstance(data, dict) else data
         return [SupabaseUser(u) for u in users]
     
     async def admin_delete_user(self, user_id: str) -> bool:
         """管理員刪除用戶"""
-        response = await self.client.delete(
-            f"{self.url}/auth/v1/admin/users/{user_id}",
+        response = await self._request(
+            Upstream.GOTRUE, "DELETE", f"/auth/v1/admin/users/{user_id}",
+            "/auth/v1/admin/users/{id}",
             headers=self._headers(use_service_key=True)
         )
         return response.status_code < 400
@@ -228,8 +590,9 @@ class SupabaseService:
         attributes: dict
     ) -> Optional[SupabaseUser]:
         """管理員更新用戶"""
-        response = await self.client.put(
-            f"{self.url}/auth/v1/admin/users/{user_id}",
+        response = await self._request(
+            Upstream.GOTRUE, "PUT", f"/auth/v1/admin/users/{user_id}",
+            "/auth/v1/admin/users/{id}",
             headers=self._headers(use_service_key=True),
             json=attributes
         )
@@ -237,38 +600,162 @@ class SupabaseService:
         if response.status_code >= 400:
             return None
         
-        return SupabaseUser(response.json())
+        return SupabaseUser(_json(response))
     
     # ========== Database API (PostgREST) ==========
     
-    async def table_select(
+    def _filter_params(self, filters: Optional[dict]) -> list[str]:
+        """將過濾條件轉為 PostgREST 查詢參數"""
+        params = []
+        for key, value in (filters or {}).items():
+            # 如果 value 已經包含操作符（如 eq., gt., lt.），直接使用
+            # 否則預設使用 eq.
+            if isinstance(value, str) and value.startswith(FILTER_OPERATORS):
+                params.append(f"{key}={value}")
+            else:
+                params.append(f"{key}=eq.{value}")
+        return params
+    
+    @staticmethod
+    def _parse_content_range(content_range: Optional[str]) -> Optional[int]:
+        """從 Content-Range（如 0-19/342、*/342）取得總筆數"""
+        if not content_range or "/" not in content_range:
+            return None
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    
+    async def _select(
         self,
         table: str,
-        select: str = "*",
-        filters: dict = None,
-        use_service_key: bool = False
-    ) -> list[dict]:
-        """查詢表格"""
-        url = f"{self.url}/rest/v1/{table}?select={select}"
+        select: str,
+        filters: Optional[dict],
+        order: Optional[str],
+        limit: Optional[int],
+        offset: Optional[int],
+        count: Optional[CountMode],
+        use_service_key: bool,
+        extra_params: Optional[list[str]] = None,
+        raise_errors: bool = False,
+        cache_ttl: Optional[int] = None,
+        primary: bool = False
+    ) -> tuple[list[dict], Optional[int]]:
+        """執行查詢，回傳 (資料, 總筆數)"""
+        if limit is not None and limit < 1:
+            # Range 標頭無法表示 0 筆（0--1），PostgREST 會拒絕
+            raise ValueError(f"limit 需 >= 1: {limit}")
+        filter_params = [*self._filter_params(filters), *(extra_params or [])]
+        params = [f"select={select}", *filter_params]
+        if order:
+            params.append(f"order={order}")
+        path = f"/rest/v1/{table}?" + "&".join(params)
         
         headers = self._headers(use_service_key)
         
-        # 添加過濾條件
-        if filters:
-            for key, value in filters.items():
-                # 如果 value 已經包含操作符（如 eq., gt., lt.），直接使用
-                # 否則預設使用 eq.
-                if isinstance(value, str) and any(value.startswith(op) for op in ['eq.', 'gt.', 'lt.', 'gte.', 'lte.', 'neq.', 'like.', 'ilike.', 'is.', 'in.']):
-                    url += f"&{key}={value}"
-                else:
-                    url += f"&{key}=eq.{value}"
+        # 分頁使用 Range 標頭（0 起算、含結尾）
+        if limit is not None or offset:
+            start = offset or 0
+            end = str(start + limit - 1) if limit is not None else ""
+            headers["Range-Unit"] = "items"
+            headers["Range"] = f"{start}-{end}"
+        
+        if count:
+            headers["Prefer"] = f"count={count}"
+        
+        # 讀取快取（primary=True 需看到自己的寫入，不讀取快取，查詢結果仍寫入快取）
+        cache_key = None
+        if cache_ttl:
+            cache_query = dict(
+                order=order,
+                range=headers.get("Range"),
+                count=count,
+                service=use_service_key,
+            )
+            if primary:
+                cache_key = await query_cache_service.key(table, select, filter_params, **cache_query)
+            else:
+                cache_key, cached = await query_cache_service.get(table, select, filter_params, **cache_query)
+                if cached is not None:
+                    return cached["rows"], cached["total"]
+        
+        # 快取的資料必須來自主庫：副本延遲時可能把舊資料寫進新版本的快取
+        response = await self._read(path, headers, primary=primary or cache_key is not None)
+        total = self._parse_content_range(response.headers.get("content-range"))
         
-        response = await self.client.get(url, headers=headers)
+        # 超出範圍的頁碼：沒有資料，但仍可取得總筆數
+        if response.status_code == 416:
+            return [], total
         
         if response.status_code >= 400:
-            return []
+            if raise_errors:
+                try:
+                    error = _json(response).get("message")
+                except ValueError:
+                    error = None
+                raise Exception(error or f"查詢失敗（HTTP {response.status_code}）")
+            return [], None
         
-        return response.json()
+        rows = _json(response)
+        if cache_key:
+            await query_cache_service.set(
+                table, cache_key, {"rows": rows, "total": total}, cache_ttl
+            )
+        return rows, total
+    
+    async def table_select(
+        self,
+        table: str,
+        select: str = "*",
+        filters: dict = None,
+        use_service_key: bool = False,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        cache: bool = True,
+        primary: bool = False
+    ) -> list[dict]:
+        """
+        查詢表格
+        
+        Args:
+            order: 排序，如 "created_at.desc"、"name.asc,id.asc"
+            limit: 最多回傳筆數（需 >= 1）
+            offset: 略過的筆數
+            cache: 表格有設定快取時是否使用（False 則直接查詢 PostgREST）
+            primary: 強制讀取主庫（未設定時可能由唯讀副本回應）
+        """
+        rows, _ = await self._select(
+            table, select, filters, order, limit, offset, None, use_service_key,
+            cache_ttl=query_cache_service.ttl_for(table) if cache else None,
+            primary=primary
+        )
+        return rows
+    
+    async def table_select_page(
+        self,
+        table: str,
+        select: str = "*",
+        filters: dict = None,
+        use_service_key: bool = False,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        count: CountMode = "exact",
+        primary: bool = False
+    ) -> tuple[list[dict], Optional[int]]:
+        """
+        分頁查詢表格，並由 Content-Range 取得總筆數
+        
+        Args:
+            count: exact（精確）、planned（查詢計畫估計）、estimated（小表精確、大表估計）
+            primary: 強制讀取主庫
+        
+        Returns:
+            (當頁資料, 總筆數)，查詢失敗時總筆數為 None
+        """
+        return await self._select(
+            table, select, filters, order, limit, offset, count, use_service_key,
+            primary=primary
+        )
     
     async def table_insert(
         self,
@@ -280,19 +767,307 @@ class SupabaseService:
         headers = self._headers(use_service_key)
         headers["Prefer"] = "return=representation"
         
-        response = await self.client.post(
-            f"{self.url}/rest/v1/{table}",
+        response = await self._request(
+            Upstream.POSTGREST, "POST", f"/rest/v1/{table}",
             headers=headers,
             json=data
         )
         
         if response.status_code >= 400:
-            error = response.json()
+            error = _json(response)
             raise Exception(error.get("message") or "插入失敗")
         
-        result = response.json()
+        await query_cache_service.invalidate(table)
+        result = _json(response)
         return result[0] if isinstance(result, list) and result else result
     
+    async def iter_rows(
+        self,
+        table: str,
+        select: str = "*",
+        filters: dict = None,
+        key: str = "id",
+        page_size: int = 1000,
+        use_service_key: bool = False,
+        prefetch: bool = True,
+        primary: bool = False
+    ) -> AsyncIterator[dict]:
+        """
+        以 keyset 分頁逐筆走訪整張表（記憶體用量與表大小無關）
+        
+        每頁以 `key=gt.<上一頁最後一筆>` 並依 key 遞增排序查詢，
+        不使用 offset，因此深層分頁不會變慢。
+        
+        Args:
+            key: 唯一且可排序的欄位（預設 id）
+            page_size: 每頁筆數
+            prefetch: 是否在呼叫端處理當頁時預先抓取下一頁
+            primary: 強制讀取主庫
+        
+        Raises:
+            Exception: 任一頁查詢失敗（避免默默回傳不完整的結果）
+        
+        Example:
+            async for row in supabase_service.iter_rows("bookings", use_service_key=True):
+                ...
+        """
+        # 需要 key 欄位才能計算下一頁起點
+        if select != "*" and key not in [c.strip() for c in select.split(",")]:
+            select = f"{select},{key}"
+        
+        def fetch(after: Any) -> Awaitable[tuple[list[dict], Optional[int]]]:
+            extra = [f"{key}=gt.{quote(str(after), safe='')}"] if after is not None else None
+            return self._select(
+                table, select, filters, f"{key}.asc", page_size, None, None,
+                use_service_key, extra_params=extra, raise_errors=True,
+                primary=primary
+            )
+        
+        pending: Optional[asyncio.Task] = None
+        try:
+            rows, _ = await fetch(None)
+            while rows:
+                has_more = len(rows) >= page_size
+                if has_more and prefetch:
+                    pending = asyncio.create_task(fetch(rows[-1][key]))
+                
+                for row in rows:
+                    yield row
+                
+                if not has_more:
+                    break
+                
+                if pending is not None:
+                    rows, _ = await pending
+                    pending = None
+                else:
+                    rows, _ = await fetch(rows[-1][key])
+        finally:
+            # 呼叫端提前結束走訪或處理失敗時，取消並等待尚未使用的預取（不留下背景任務與未取得的例外）
+            if pending is not None:
+                pending.cancel()
+                try:
+                    await pending
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.debug(f"已捨棄的預取查詢失敗 {table}: {e}")
+    
+    @staticmethod
+    def _in_value(value: Any) -> str:
+        """in.(...) 列表中的單一值（以雙引號包住，跳脫 \\ 與 "）"""
+        text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return quote(f'"{text}"', safe='')
+    
+    @classmethod
+    def _chunk_in_values(
+        cls,
+        values: list,
+        max_ids: int,
+        max_chars: int
+    ) -> Iterator[list[str]]:
+        """依筆數與編碼後長度上限切分 in.(...) 的值"""
+        chunk: list[str] = []
+        chunk_chars = 0
+        for value in values:
+            encoded = cls._in_value(value)
+            if chunk and (len(chunk) >= max_ids or chunk_chars + len(encoded) + 1 > max_chars):
+                yield chunk
+                chunk, chunk_chars = [], 0
+            chunk.append(encoded)
+            chunk_chars += len(encoded) + 1
+        if chunk:
+            yield chunk
+    
+    async def table_select_in(
+        self,
+        table: str,
+        values: list,
+        key: str = "id",
+        select: str = "*",
+        filters: dict = None,
+        use_service_key: bool = False,
+        primary: bool = False
+    ) -> list[dict]:
+        """
+        以 `key=in.(...)` 批次查詢多筆資料
+        
+        值列表會依 SUPABASE_IN_FILTER_MAX_IDS / SUPABASE_IN_FILTER_MAX_CHARS
+        切成多個請求並同時送出，避免 URL 超過長度限制。
+        
+        Args:
+            values: 要查詢的 key 值（重複值只查詢一次）
+            key: 比對的欄位（預設 id）
+            primary: 強制讀取主庫
+        
+        Returns:
+            所有批次的資料（順序不保證與 values 相同）
+        
+        Raises:
+            Exception: 任一批次查詢失敗
+        """
+        unique = list(dict.fromkeys(str(v) for v in values if v is not None))
+        if not unique:
+            return []
+        
+        chunks = self._chunk_in_values(
+            unique,
+            settings.SUPABASE_IN_FILTER_MAX_IDS,
+            settings.SUPABASE_IN_FILTER_MAX_CHARS
+        )
+        results = await asyncio.gather(*[
+            self._select(
+                table, select, filters, None, None, None, None, use_service_key,
+                extra_params=[f"{key}=in.({','.join(chunk)})"], raise_errors=True,
+                primary=primary
+            )
+            for chunk in chunks
+        ])
+        return [row for rows, _ in results for row in rows]
+    
+    @staticmethod
+    def _chunk_rows(
+        rows: list[dict],
+        max_rows: int,
+        max_bytes: int
+    ) -> Iterator[list[dict]]:
+        """依筆數與 JSON 大小上限切分資料"""
+        chunk: list[dict] = []
+        chunk_bytes = 2  # "[]"
+        for row in rows:
+            row_bytes = len(json.dumps(row, default=str).encode()) + 1
+            if chunk and (len(chunk) >= max_rows or chunk_bytes + row_bytes > max_bytes):
+                yield chunk
+                chunk, chunk_bytes = [], 2
+            chunk.append(row)
+            chunk_bytes += row_bytes
+        if chunk:
+            yield chunk
+    
+    async def _bulk_write(
+        self,
+        table: str,
+        rows: list[dict],
+        prefer: list[str],
+        on_conflict: Optional[str],
+        chunk_size: Optional[int],
+        use_service_key: bool
+    ) -> BulkWriteResult:
+        """將資料切塊後以 JSON 陣列逐塊寫入"""
+        result = BulkWriteResult()
+        chunks = self._chunk_rows(
+            rows,
+            chunk_size or settings.SUPABASE_BULK_CHUNK_ROWS,
+            settings.SUPABASE_BULK_CHUNK_BYTES
+        )
+        
+        base_headers = self._headers(use_service_key)
+        
+        for index, chunk in enumerate(chunks):
+            params = []
+            chunk_prefer = prefer
+            if on_conflict:
+                params.append(f"on_conflict={on_conflict}")
+            # PostgREST 要求陣列中每筆的欄位一致，不一致時以 columns 指定欄位；
+            # 缺少的欄位預設寫入 NULL，需加上 missing=default 改用欄位 DEFAULT
+            columns = {key for row in chunk for key in row}
+            if any(len(row) != len(columns) for row in chunk):
+                params.append(f"columns={','.join(sorted(columns))}")
+                chunk_prefer = [*prefer, "missing=default"]
+            headers = {**base_headers, "Prefer": ",".join(chunk_prefer)}
+            
+            path = f"/rest/v1/{table}"
+            if params:
+                path += "?" + "&".join(params)
+            
+            try:
+                # merge/ignore-duplicates 的 upsert 重送結果相同，可重試
+                response = await self._request(
+                    Upstream.POSTGREST, "POST", path,
+                    headers=headers,
+                    json=chunk,
+                    idempotent=any(p.startswith("resolution=") for p in prefer)
+                )
+            except (httpx.HTTPError, UpstreamUnavailableError) as e:
+                result.chunks.append(
+                    BulkChunkResult(index=index, row_count=len(chunk), error=str(e))
+                )
+                continue
+            
+            if response.status_code >= 400:
+                try:
+                    error = _json(response).get("message")
+                except ValueError:
+                    error = None
+                result.chunks.append(BulkChunkResult(
+                    index=index,
+                    row_count=len(chunk),
+                    error=error or f"批次寫入失敗（HTTP {response.status_code}）"
+                ))
+                continue
+            
+            returned = _json(response) if response.content else []
+            result.chunks.append(
+                BulkChunkResult(index=index, row_count=len(chunk), rows=returned)
+            )
+        
+        if any(chunk.ok for chunk in result.chunks):
+            await query_cache_service.invalidate(table)
+        return result
+    
+    async def table_insert_many(
+        self,
+        table: str,
+        rows: list[dict],
+        use_service_key: bool = False,
+        returning: bool = True,
+        chunk_size: Optional[int] = None
+    ) -> BulkWriteResult:
+        """
+        批次插入資料
+        
+        Args:
+            rows: 要插入的資料列表
+            returning: 是否回傳寫入後的資料（False 時使用 return=minimal）
+            chunk_size: 每批最多筆數（預設 SUPABASE_BULK_CHUNK_ROWS）
+        
+        Returns:
+            BulkWriteResult，各區塊的成功資料與錯誤分開記錄
+        """
+        prefer = ["return=representation" if returning else "return=minimal"]
+        return await self._bulk_write(
+            table, rows, prefer, None, chunk_size, use_service_key
+        )
+    
+    async def table_upsert(
+        self,
+        table: str,
+        rows: list[dict],
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        use_service_key: bool = False,
+        returning: bool = True,
+        chunk_size: Optional[int] = None
+    ) -> BulkWriteResult:
+        """
+        批次 Upsert 資料
+        
+        Args:
+            on_conflict: 衝突判斷欄位（如 "line_user_id,channel_type"），預設為主鍵
+            ignore_duplicates: True 時略過重複資料，否則合併更新
+        
+        Returns:
+            BulkWriteResult，各區塊的成功資料與錯誤分開記錄
+        """
+        resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+        prefer = [
+            f"resolution={resolution}",
+            "return=representation" if returning else "return=minimal",
+        ]
+        return await self._bulk_write(
+            table, rows, prefer, on_conflict, chunk_size, use_service_key
+        )
+    
     async def table_update(
         self,
         table: str,
@@ -301,28 +1076,21 @@ class SupabaseService:
         use_service_key: bool = False
     ) -> Optional[dict]:
         """更新資料"""
-        url = f"{self.url}/rest/v1/{table}?"
-
         # 添加過濾條件（與 table_select 一致的處理方式）
-        filter_parts = []
-        for key, value in filters.items():
-            # 如果 value 已經包含操作符（如 eq., gt., lt.），直接使用
-            # 否則預設使用 eq.
-            if isinstance(value, str) and any(value.startswith(op) for op in ['eq.', 'gt.', 'lt.', 'gte.', 'lte.', 'neq.', 'like.', 'ilike.', 'is.', 'in.']):
-                filter_parts.append(f"{key}={value}")
-            else:
-                filter_parts.append(f"{key}=eq.{value}")
-        url += "&".join(filter_parts)
+        path = f"/rest/v1/{table}?" + "&".join(self._filter_params(filters))
 
         headers = self._headers(use_service_key)
         headers["Prefer"] = "return=representation"
 
-        response = await self.client.patch(url, headers=headers, json=data)
+        response = await self._request(
+            Upstream.POSTGREST, "PATCH", path, headers=headers, json=data
+        )
 
         if response.status_code >= 400:
             return None
 
-        result = response.json()
+        await query_cache_service.invalidate(table)
+        result = _json(response)
         return result[0] if isinstance(result, list) and result else result
     
     async def table_delete(
@@ -332,24 +1100,82 @@ class SupabaseService:
         use_service_key: bool = False
     ) -> bool:
         """刪除資料"""
-        url = f"{self.url}/rest/v1/{table}"
+        path = f"/rest/v1/{table}"
         
         filter_parts = [f"{k}=eq.{v}" for k, v in filters.items()]
-        url += "?" + "&".join(filter_parts)
+        path += "?" + "&".join(filter_parts)
         
-        response = await self.client.delete(
-            url, 
+        response = await self._request(
+            Upstream.POSTGREST, "DELETE", path,
             headers=self._headers(use_service_key)
         )
-        return response.status_code < 400
-    
-    # ========== 清理 ==========
+        if response.status_code >= 400:
+            return False
+        
+        await query_cache_service.invalidate(table)
+        return True
+
+    # ========== RPC (PostgREST) ==========
     
-    async def close(self):
-        """關閉連線"""
-        if self._client:
-            await self._client.aclose()
-            self._client = None
+    async def rpc(
+        self,
+        fn: str,
+        params: Optional[dict] = None,
+        use_service_key: bool = False,
+        returns: RpcReturns = "rows",
+        read_only: bool = False,
+        primary: bool = False
+    ) -> Any:
+        """
+        呼叫資料庫函數（POST /rest/v1/rpc/<fn>）
+        
+        Args:
+            fn: 函數名稱
+            params: 函數參數（鍵為參數名稱，如 p_user_id）
+            returns: rows 回傳列表；single 回傳第一筆或 None；scalar 回傳純量值
+            read_only: STABLE/IMMUTABLE 函數可改用 GET，並與相同的同時請求合併
+                （可由唯讀副本回應，且不視為寫入；其餘函數一律走主庫，並使同一用戶之後的讀取走主庫）
+            primary: read_only 時強制走主庫
+        
+        Raises:
+            Exception: 如果呼叫失敗
+        """
+        path = f"/rest/v1/rpc/{fn}"
+        headers = self._headers(use_service_key)
+        
+        if read_only:
+            query = {k: v for k, v in (params or {}).items() if v is not None}
+            response = await self._read(path, headers, params=query, primary=primary)
+        else:
+            response = await self._request(
+                Upstream.POSTGREST, "POST", path, headers=headers, json=params or {}
+            )
+        
+        if response.status_code >= 400:
+            try:
+                error = _json(response).get("message")
+            except ValueError:
+                error = None
+            raise Exception(error or f"RPC {fn} 呼叫失敗（HTTP {response.status_code}）")
+        
+        data = _json(response) if response.content else None
+        
+        if returns == "scalar":
+            # 純量函數直接回傳值；SETOF 純量取第一筆
+            if isinstance(data, list):
+                data = data[0] if data else None
+            if isinstance(data, dict) and len(data) == 1:
+                data = next(iter(data.values()))
+            return data
+        
+        if returns == "single":
+            if isinstance(data, list):
+                return data[0] if data else None
+            return data
+        
+        if data is None:
+            return []
+        return data if isinstance(data, list) else [data]
 
 # 單例
 supabase_service = SupabaseService()
\ No newline at end of file
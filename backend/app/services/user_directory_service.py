@@ -0,0 +1,349 @@
+"""
+用戶目錄服務 - 在 Redis 維護 auth.users 的索引鏡像（id ↔ email ↔ metadata）
+
+- 啟動時分頁讀取 GoTrue Admin API 建立完整鏡像，之後定期全量重建（上次全量同步時間記錄於 Redis，
+  多個實例共用）
+- 多個實例時以 Redis 鎖確保同時只有一個實例同步，同步期間持續延長鎖
+- 定期增量更新：以資料庫函數 list_users_updated_after 依 updated_at 讀取上次同步後新增或變更的用戶
+  （GoTrue Admin API 只能依建立時間排序，較早建立的用戶之後更新時無法察覺）
+- 註冊、更新、刪除時同步寫入（write-through）
+- 依 id 或 email 查詢只需一次 Redis 讀取，未命中時才回到 GoTrue / 資料庫函數
+"""
+import asyncio
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Set
+
+from app.config import settings
+from app.core import json_codec
+from app.services.redis_service import redis_service
+from app.services.supabase_service import supabase_service, SupabaseUser
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """GoTrue 與 PostgREST 的時間格式不同（Z / +00:00、小數位數），比較前先解析"""
+    return datetime.fromisoformat(value) if value else None
+
+
+class UserDirectoryService:
+    """auth.users 的 Redis 鏡像"""
+
+    USER_PREFIX = "user_dir:user:"
+    EMAIL_INDEX = "user_dir:email"
+    IDS_KEY = "user_dir:ids"
+    META_KEY = "user_dir:meta"
+    LOCK_KEY = "user_dir:lock"
+
+    # 增量更新自上次游標往前重疊的秒數（涵蓋 updated_at 較早但較晚提交的交易）
+    REFRESH_OVERLAP_SECONDS = 60
+
+    # 鏡像保存的欄位
+    FIELDS = ("id", "email", "email_confirmed_at", "created_at", "updated_at", "user_metadata")
+
+    def __init__(self):
+        self.redis = redis_service
+        self.supabase = supabase_service
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ========== 寫入 ==========
+
+    def _record(self, user: SupabaseUser) -> dict:
+        data = user.to_dict()
+        return {field: data.get(field) for field in self.FIELDS}
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return email.strip().lower()
+
+    async def put_many(self, users: Iterable[SupabaseUser]) -> int:
+        """寫入多位用戶（單次 pipeline）"""
+        count = 0
+        async with self.redis.pipeline() as pipe:
+            for user in users:
+                if not user.id:
+                    continue
+                pipe.set(f"{self.USER_PREFIX}{user.id}", json_codec.dumps(self._record(user)))
+                pipe.sadd(self.IDS_KEY, user.id)
+                if user.email:
+                    pipe.hset(self.EMAIL_INDEX, self._email_key(user.email), user.id)
+                count += 1
+        return count
+
+    async def put(self, user: Optional[SupabaseUser]) -> None:
+        """寫入單一用戶（註冊、更新後呼叫）；email 變更時移除舊索引"""
+        if not user or not user.id:
+            return
+        try:
+            previous = await self._get_record(user.id)
+            old_email = (previous or {}).get("email")
+            if old_email and old_email != user.email:
+                await self.redis.hdel(self.EMAIL_INDEX, self._email_key(old_email))
+            await self.put_many([user])
+        except Exception as e:
+            logger.warning(f"用戶目錄寫入失敗 {user.id}: {e}")
+
+    async def remove(self, user_id: str) -> None:
+        """移除用戶"""
+        try:
+            record = await self._get_record(user_id)
+            async with self.redis.pipeline() as pipe:
+                pipe.delete(f"{self.USER_PREFIX}{user_id}")
+                pipe.srem(self.IDS_KEY, user_id)
+                if record and record.get("email"):
+                    pipe.hdel(self.EMAIL_INDEX, self._email_key(record["email"]))
+        except Exception as e:
+            logger.warning(f"用戶目錄移除失敗 {user_id}: {e}")
+
+    async def _remove_many(self, user_ids: Set[str]) -> None:
+        """移除多位用戶（全量同步後清除已刪除的用戶）"""
+        user_ids = list(user_ids)
+        records = await self.redis.mget_json(
+            [f"{self.USER_PREFIX}{user_id}" for user_id in user_ids]
+        )
+        async with self.redis.pipeline() as pipe:
+            for user_id, record in zip(user_ids, records):
+                pipe.delete(f"{self.USER_PREFIX}{user_id}")
+                pipe.srem(self.IDS_KEY, user_id)
+                if record and record.get("email"):
+                    pipe.hdel(self.EMAIL_INDEX, self._email_key(record["email"]))
+
+    # ========== 查詢 ==========
+
+    async def _get_record(self, user_id: str) -> Optional[dict]:
+        raw = await self.redis.get(f"{self.USER_PREFIX}{user_id}")
+        return json_codec.loads(raw) if raw else None
+
+    async def get_by_id(self, user_id: str) -> Optional[SupabaseUser]:
+        """
+        依 id 取得用戶
+
+        鏡像未命中時改查 GoTrue 並寫回鏡像
+        """
+        try:
+            record = await self._get_record(user_id)
+        except Exception as e:
+            logger.debug(f"用戶目錄讀取失敗 {user_id}: {e}")
+            record = None
+
+        if record is not None:
+            self.hits += 1
+            return SupabaseUser(record)
+
+        self.misses += 1
+        user = await self.supabase.admin_get_user(user_id)
+        if user:
+            await self.put(user)
+        return user
+
+    async def get_by_email(self, email: str) -> Optional[SupabaseUser]:
+        """
+        依 email 取得用戶（不分大小寫）
+
+        鏡像未命中時改以資料庫函數查詢 auth.users（涵蓋尚未同步的新用戶）
+        """
+        try:
+            user_id = await self.redis.hget(self.EMAIL_INDEX, self._email_key(email))
+        except Exception as e:
+            logger.debug(f"用戶目錄讀取失敗 {email}: {e}")
+            user_id = None
+
+        if user_id is None:
+            user_id = await self.supabase.rpc(
+                "find_user_by_line_email",
+                {"p_email": email},
+                use_service_key=True,
+                returns="scalar",
+                read_only=True
+            )
+            if not user_id:
+                self.misses += 1
+                return None
+
+        return await self.get_by_id(user_id)
+
+    async def update_user(self, user_id: str, attributes: dict) -> Optional[SupabaseUser]:
+        """管理員更新用戶並同步寫入鏡像"""
+        user = await self.supabase.admin_update_user(user_id, attributes)
+        if user:
+            await self.put(user)
+        return user
+
+    async def delete_user(self, user_id: str) -> bool:
+        """管理員刪除用戶並從鏡像移除"""
+        deleted = await self.supabase.admin_delete_user(user_id)
+        if deleted:
+            await self.remove(user_id)
+        return deleted
+
+    # ========== 同步 ==========
+
+    async def full_sync(self) -> int:
+        """
+        分頁讀取所有用戶重建鏡像，並移除已不存在的用戶
+
+        Returns:
+            同步的用戶數
+
+        Raises:
+            Exception: 任一頁讀取失敗（不移除任何用戶，避免誤刪）
+        """
+        per_page = settings.USER_DIRECTORY_PAGE_SIZE
+        seen: Set[str] = set()
+        latest: Optional[datetime] = None
+        page = 1
+        while True:
+            users = await self.supabase.admin_list_users(
+                page=page, per_page=per_page, raise_errors=True
+            )
+            await self.put_many(users)
+            seen.update(user.id for user in users if user.id)
+            for user in users:
+                updated_at = _parse_time(user.updated_at)
+                if updated_at and (latest is None or updated_at > latest):
+                    latest = updated_at
+            if len(users) < per_page:
+                break
+            page += 1
+
+        stale = await self.redis.smembers(self.IDS_KEY) - seen
+        if stale:
+            await self._remove_many(stale)
+
+        now = str(time.time())
+        meta = {"synced_at": now, "refreshed_at": now, "count": len(seen)}
+        if latest is not None:
+            meta["updated_cursor"] = latest.isoformat()
+        await self.redis.hset_many(self.META_KEY, meta)
+        logger.info(f"用戶目錄全量同步完成：{len(seen)} 位用戶，移除 {len(stale)} 位")
+        return len(seen)
+
+    async def refresh(self) -> int:
+        """
+        增量更新：依 (updated_at, id) 分頁讀取游標之後新增或變更的用戶（含較早建立的用戶）
+
+        已刪除的用戶由全量同步移除。
+
+        Returns:
+            新增或變更的用戶數
+        """
+        per_page = settings.USER_DIRECTORY_PAGE_SIZE
+        cursor = _parse_time(await self.redis.hget(self.META_KEY, "updated_cursor"))
+        after_time = cursor - timedelta(seconds=self.REFRESH_OVERLAP_SECONDS) if cursor else EPOCH
+        after_id: Optional[str] = None
+        latest = cursor
+        changed = 0
+        while True:
+            rows = await self.supabase.rpc(
+                "list_users_updated_after",
+                {"p_updated_at": after_time.isoformat(), "p_id": after_id, "p_limit": per_page},
+                use_service_key=True,
+                read_only=True,
+                primary=True
+            )
+            users = [SupabaseUser(row) for row in rows]
+            if not users:
+                break
+            records = await self.redis.mget_json(
+                [f"{self.USER_PREFIX}{user.id}" for user in users]
+            )
+            updated = [
+                user for user, record in zip(users, records)
+                if record is None or _parse_time(record.get("updated_at")) != _parse_time(user.updated_at)
+            ]
+            for user in updated:
+                await self.put(user)
+            changed += len(updated)
+
+            after_time, after_id = _parse_time(users[-1].updated_at), users[-1].id
+            if latest is None or after_time > latest:
+                latest = after_time
+            if len(users) < per_page:
+                break
+
+        meta = {"refreshed_at": str(time.time())}
+        if latest is not None:
+            meta["updated_cursor"] = latest.isoformat()
+        await self.redis.hset_many(self.META_KEY, meta)
+        return changed
+
+    async def _full_sync_due(self) -> bool:
+        """距離上次全量同步（任一實例）已超過 USER_DIRECTORY_FULL_SYNC_SECONDS"""
+        synced_at = await self.redis.hget(self.META_KEY, "synced_at")
+        return synced_at is None or time.time() - float(synced_at) >= settings.USER_DIRECTORY_FULL_SYNC_SECONDS
+
+    async def _renew_lock(self, token: str, ttl: int) -> None:
+        """同步期間定期延長鎖，避免同步時間超過 TTL 時其他實例同時同步"""
+        while True:
+            await asyncio.sleep(max(ttl / 3, 1))
+            if not await self.redis.run_script("renew_lock", [self.LOCK_KEY], [token, ttl]):
+                logger.warning("用戶目錄同步鎖已失效")
+                return
+
+    async def sync_once(self) -> bool:
+        """
+        取得鎖後執行一次全量或增量同步
+
+        鎖於同步完成後保留至過期，作為各實例之間的同步間隔
+
+        Returns:
+            是否執行同步（其他實例持有鎖時為 False）
+        """
+        token = secrets.token_hex(16)
+        ttl = settings.USER_DIRECTORY_REFRESH_SECONDS
+        if not await self.redis.set(self.LOCK_KEY, token, expire_seconds=ttl, nx=True):
+            return False
+        renewer = asyncio.create_task(self._renew_lock(token, ttl))
+        try:
+            if await self._full_sync_due():
+                await self.full_sync()
+            else:
+                await self.refresh()
+        finally:
+            renewer.cancel()
+        return True
+
+    async def _run(self) -> None:
+        """背景同步：首次及定期全量同步，其餘時間增量更新"""
+        while True:
+            try:
+                await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"用戶目錄同步失敗: {e}")
+            await asyncio.sleep(settings.USER_DIRECTORY_REFRESH_SECONDS)
+
+    async def start(self) -> None:
+        """啟動背景同步"""
+        if settings.USER_DIRECTORY_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止背景同步"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def stats(self) -> dict:
+        """取得鏡像狀態"""
+        try:
+            meta = await self.redis.hgetall(self.META_KEY)
+        except Exception:
+            meta = {}
+        return {"hits": self.hits, "misses": self.misses, **meta}
+
+
+# 單例
+user_directory_service = UserDirectoryService()
@@ -0,0 +1,85 @@
+"""
+熱門查詢效能比較：asyncpg 直連（Supavisor）vs PostgREST（Kong）
+
+前置條件：
+    # 於專案根目錄啟動資料庫、Supavisor 與 API 閘道
+    docker compose up -d db supavisor kong rest
+
+使用方式（於 backend/ 目錄執行）：
+    DATABASE_ENABLED=true \\
+    DATABASE_URL=postgresql://postgres.<tenant>:<password>@localhost:5432/postgres \\
+    python -m benchmarks.db_fast_path --user-id <uuid> -n 500 -c 20
+
+輸出每個查詢在兩條路徑上的 p50 / p95 延遲（毫秒）與每秒查詢數。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date
+from typing import Awaitable, Callable, List
+
+from app.services.database_service import DatabaseService
+from app.services.http_client_service import http_client_service
+
+
+async def measure(
+    fn: Callable[[], Awaitable], iterations: int, concurrency: int
+) -> tuple[List[float], float]:
+    """以指定並行數執行 fn，回傳 (各次延遲毫秒, 總耗時秒)"""
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await fn()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await fn()  # 預熱（建立連線、prepared statement）
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(iterations)])
+    return latencies, time.perf_counter() - start
+
+
+def report(name: str, path: str, latencies: List[float], elapsed: float) -> None:
+    p50 = statistics.median(latencies)
+    p95 = statistics.quantiles(latencies, n=20)[18]
+    print(f"{name:<28} {path:<10} p50={p50:7.2f}ms  p95={p95:7.2f}ms  {len(latencies) / elapsed:8.0f} q/s")
+
+
+async def main(args: argparse.Namespace) -> None:
+    direct = DatabaseService()
+    await direct.connect()
+    if not direct.available:
+        raise SystemExit("請設定 DATABASE_ENABLED=true 與 DATABASE_URL")
+    # 未建立連線池的實例會走 PostgREST
+    postgrest = DatabaseService()
+
+    slot_date = date.fromisoformat(args.slot_date)
+    queries = {
+        "user_employee_subtype": lambda s: s.get_employee_subtype(args.user_id),
+        "line_binding_by_user": lambda s: s.get_binding_by_user(args.user_id),
+        "notification_history_page": lambda s: s.get_notification_history(limit=20),
+        "available_slots_by_date": lambda s: s.search_available_slots(slot_date),
+    }
+
+    try:
+        for name, query in queries.items():
+            for path, service in (("asyncpg", direct), ("postgrest", postgrest)):
+                latencies, elapsed = await measure(
+                    lambda: query(service), args.iterations, args.concurrency
+                )
+                report(name, path, latencies, elapsed)
+    finally:
+        await direct.disconnect()
+        await http_client_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user-id", required=True, help="測試用的 user_profiles.id")
+    parser.add_argument("--slot-date", default=date.today().isoformat(), help="時段查詢日期")
+    parser.add_argument("-n", "--iterations", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,147 @@
+"""
+回應解析與資料物件的記憶體配置比較：舊版（json + 複製欄位）vs 新版（orjson + __slots__）
+
+不需外部服務，直接以合成的 GoTrue / line_user_bindings 回應測量。
+
+使用方式（於 backend/ 目錄執行）：
+    python -m benchmarks.record_allocations -n 10000
+
+輸出每種資料在兩種實作下，解析並建立 n 筆物件的配置區塊數、保留記憶體與耗時。
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from app.core import json_codec
+from app.services.line_binding_service import LineBinding
+from app.services.supabase_service import SupabaseUser
+
+
+# ========== 舊版實作（對照組） ==========
+
+class LegacySupabaseUser:
+    def __init__(self, data: dict):
+        self._data = data or {}
+        self.id = self._data.get("id")
+        self.email = self._data.get("email")
+        self.email_confirmed_at = self._data.get("email_confirmed_at")
+        self.created_at = self._data.get("created_at")
+        self.user_metadata = self._data.get("user_metadata", {})
+
+
+@dataclass
+class LegacyLineBinding:
+    id: str
+    user_id: Optional[str]
+    line_user_id: str
+    line_display_name: Optional[str]
+    line_picture_url: Optional[str]
+    line_email: Optional[str]
+    binding_status: str
+    channel_type: str
+    notify_booking_confirmation: bool
+    notify_booking_reminder: bool
+    notify_status_update: bool
+    bound_at: datetime
+    created_at: datetime
+
+
+def legacy_binding(data: dict) -> LegacyLineBinding:
+    return LegacyLineBinding(
+        id=data["id"],
+        user_id=data["user_id"],
+        line_user_id=data["line_user_id"],
+        line_display_name=data.get("line_display_name"),
+        line_picture_url=data.get("line_picture_url"),
+        line_email=data.get("line_email"),
+        binding_status=data.get("binding_status", "active"),
+        channel_type=data.get("channel_type", "student"),
+        notify_booking_confirmation=data.get("notify_booking_confirmation", True),
+        notify_booking_reminder=data.get("notify_booking_reminder", True),
+        notify_status_update=data.get("notify_status_update", True),
+        bound_at=data.get("bound_at", data.get("created_at")),
+        created_at=data.get("created_at"),
+    )
+
+
+# ========== 合成回應 ==========
+
+def users_payload(n: int) -> bytes:
+    return json.dumps({"users": [{
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "email": f"user{i}@example.com",
+        "email_confirmed_at": "2026-01-01T00:00:00Z",
+        "created_at": "2026-01-01T00:00:00Z",
+        "updated_at": "2026-01-02T00:00:00Z",
+        "user_metadata": {"name": f"User {i}", "role": "student"},
+    } for i in range(n)]}).encode()
+
+
+def bindings_payload(n: int) -> bytes:
+    return json.dumps([{
+        "id": f"b{i}",
+        "user_id": f"u{i}",
+        "line_user_id": f"U{i:032x}",
+        "line_display_name": f"Line {i}",
+        "line_picture_url": None,
+        "line_email": None,
+        "binding_status": "active",
+        "channel_type": "student",
+        "notify_booking_confirmation": True,
+        "notify_booking_reminder": True,
+        "notify_status_update": True,
+        "bound_at": "2026-01-01T00:00:00Z",
+        "created_at": "2026-01-01T00:00:00Z",
+    } for i in range(n)]).encode()
+
+
+def measure(name: str, impl: str, build: Callable[[], list]) -> None:
+    """建立物件並保留結果，回報配置區塊數、保留記憶體與耗時"""
+    build()  # 預熱
+    # 耗時另外測量（tracemalloc 追蹤本身會拖慢配置）
+    start = time.perf_counter()
+    build()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    retained = sum(stat.size_diff for stat in stats)
+    print(
+        f"{name:<10} {impl:<8} rows={len(result):<7} blocks={blocks:>9,} "
+        f"retained={retained / 1024:9.0f}KiB peak={peak / 1024:9.0f}KiB {elapsed:8.1f}ms"
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    users = users_payload(args.rows)
+    bindings = bindings_payload(args.rows)
+
+    measure("users", "legacy", lambda: [
+        LegacySupabaseUser(u) for u in json.loads(users.decode())["users"]
+    ])
+    measure("users", "current", lambda: [
+        SupabaseUser(u) for u in json_codec.loads(users)["users"]
+    ])
+    measure("bindings", "legacy", lambda: [
+        legacy_binding(row) for row in json.loads(bindings.decode())
+    ])
+    measure("bindings", "current", lambda: [
+        LineBinding.from_row(row) for row in json_codec.loads(bindings)
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--rows", type=int, default=10_000)
+    main(parser.parse_args())
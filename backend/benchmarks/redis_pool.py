@@ -0,0 +1,86 @@
+"""
+Redis 連線池大小與吞吐量：模擬已登入請求的 Redis 存取，比較不同 max_connections
+
+前置條件：
+    # 於專案根目錄啟動 Redis
+    docker compose up -d redis
+
+使用方式（於 backend/ 目錄執行）：
+    REDIS_URL=redis://localhost:6379/0 \\
+    python -m benchmarks.redis_pool --sizes 5 10 20 50 100 -n 5000 -c 200
+
+每個模擬請求依序執行與已認證請求相同的存取：
+速率限制計數、中間件黑名單檢查、get_current_user 的認證腳本（略過黑名單，取得 Session、活動時間與權限快取）。
+輸出每種連線池大小的每秒請求數、p95 延遲與連線等待統計。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from app.config import settings
+from app.core.security import hash_session_id
+from app.services import redis_keys
+from app.services.redis_service import RedisService
+from app.services.session_service import SessionService
+
+
+async def run(size: int, args: argparse.Namespace) -> None:
+    settings.REDIS_MAX_CONNECTIONS = size
+    settings.REDIS_POOL_TIMEOUT = None
+    redis_service = RedisService()
+    await redis_service.connect()
+    sessions = SessionService()
+    sessions.redis = redis_service
+
+    session_id, _ = await sessions.create_session(user_id="bench-user", user_role="employee")
+    permission_keys = [redis_keys.permission_level("bench-user"), redis_keys.employee_type("bench-user")]
+    await redis_service.mset(dict(zip(permission_keys, ["30", "full_time"])), expire_seconds=300)
+
+    token_hash, session_hash = hash_session_id("bench-token"), hash_session_id(session_id)
+
+    async def request() -> None:
+        await redis_service.incr_with_expire("rate_limit:bench", 60)
+        await sessions.is_blacklisted("bench-user", token_hash)
+        await sessions.authenticate("bench-user", token_hash, session_hash, check_blacklist=False)
+
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*[one() for _ in range(50)])  # 預熱（建立連線）
+    latencies.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - start
+
+    pool = redis_service.stats()["pool"]
+    wait = pool["wait_ms"]
+    print(
+        f"pool={size:<4} {args.requests / elapsed:8.0f} req/s  "
+        f"p95={statistics.quantiles(latencies, n=20)[18]:7.2f}ms  "
+        f"peak_in_use={pool['peak_in_use']:<4} exhausted={pool['exhausted']:<7} "
+        f"avg_wait={wait['sum_ms'] / max(wait['count'], 1):6.3f}ms"
+    )
+
+    await sessions.destroy_all_user_sessions("bench-user")
+    await redis_service.disconnect()
+
+
+async def main(args: argparse.Namespace) -> None:
+    for size in args.sizes:
+        await run(size, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 50, 100])
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Session 儲存格式比較：JSON 字串 vs Redis hash，每個請求的 Redis 傳輸量與延遲
+
+前置條件：
+    # 於專案根目錄啟動 Redis
+    docker compose up -d redis
+
+使用方式（於 backend/ 目錄執行）：
+    REDIS_URL=redis://localhost:6379/0 \\
+    python -m benchmarks.session_storage -n 5000 --extra-bytes 0 512 4096
+
+每個模擬請求執行與 get_current_user 相同的 Session 存取（讀取 Session、更新活動時間）：
+- json：GET 整份 JSON + 更新腳本替換 last_activity 後 SET 整份文件
+- hash：HGETALL + 更新腳本只 HSET last_activity
+- hash-fields：HMGET 只讀 user_id / user_role + 更新腳本只 HSET last_activity
+傳輸量取自伺服器 INFO stats（total_net_input_bytes / total_net_output_bytes）。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from app.config import settings
+from app.services.redis_service import RedisService
+from app.services.session_service import SessionService
+
+USER_ID = "bench-user"
+
+
+async def net_bytes(redis_service: RedisService) -> tuple[int, int]:
+    """伺服器累計接收、送出位元組數"""
+    info = await redis_service.client.info("stats")
+    return info["total_net_input_bytes"], info["total_net_output_bytes"]
+
+
+async def run(
+    name: str,
+    sessions: SessionService,
+    redis_service: RedisService,
+    request: Callable[[], Awaitable],
+    iterations: int
+) -> None:
+    for _ in range(100):  # 預熱
+        await request()
+
+    # INFO 本身的傳輸量（扣除用）
+    first = await net_bytes(redis_service)
+    second = await net_bytes(redis_service)
+    info_in, info_out = second[0] - first[0], second[1] - first[1]
+
+    latencies: List[float] = []
+    before = await net_bytes(redis_service)
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await request()
+        latencies.append((time.perf_counter() - start) * 1000)
+    after = await net_bytes(redis_service)
+
+    sent = (after[0] - before[0] - info_in) / iterations
+    received = (after[1] - before[1] - info_out) / iterations
+    print(
+        f"  {name:<12} sent={sent:7.0f}B  received={received:7.0f}B  "
+        f"p50={statistics.median(latencies):6.3f}ms  "
+        f"p95={statistics.quantiles(latencies, n=20)[18]:6.3f}ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    redis_service = RedisService()
+    await redis_service.connect()
+    sessions = SessionService()
+    sessions.redis = redis_service
+
+    for extra_bytes in args.extra_bytes:
+        print(f"extra_data ≈ {extra_bytes} bytes")
+        extra_data = {"email": "bench@example.com", "padding": "x" * extra_bytes}
+
+        for storage_format in ("json", "hash"):
+            settings.SESSION_STORAGE_FORMAT = storage_format
+            session_id, _ = await sessions.create_session(
+                user_id=USER_ID,
+                user_role="student",
+                user_agent="Mozilla/5.0 (bench)",
+                ip_address="127.0.0.1",
+                extra_data=extra_data
+            )
+
+            async def full_read() -> None:
+                await sessions.get_session(session_id, USER_ID)
+                await sessions.update_session_activity(session_id, USER_ID)
+
+            async def field_read() -> None:
+                await sessions.get_session_fields(session_id, USER_ID, "user_id", "user_role")
+                await sessions.update_session_activity(session_id, USER_ID)
+
+            await run(storage_format, sessions, redis_service, full_read, args.requests)
+            if storage_format == "hash":
+                await run("hash-fields", sessions, redis_service, field_read, args.requests)
+
+        await sessions.destroy_all_user_sessions(USER_ID)
+
+    await redis_service.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("--extra-bytes", type=int, nargs="+", default=[0, 512, 4096])
+    asyncio.run(main(parser.parse_args()))
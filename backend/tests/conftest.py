@@ -9,10 +9,10 @@ from httpx import AsyncClient, ASGITransport
 from fastapi import FastAPI
 
 from app.main import app
-from app.config import Settings, get_settings
+from app.config import Settings, get_settings, settings
 from app.services.redis_service import RedisService, redis_service
 from app.services.session_service import SessionService, session_service
-from app.services.supabase_service import SupabaseService
+from app.services.supabase_service import SupabaseService, supabase_service
 from app.core.security import create_token, TokenType
 
 # ============================================
@@ -81,6 +81,25 @@ async def mock_redis_service(fake_redis) -> AsyncGenerator:
     
     redis_service._client = original_client
 
+@pytest.fixture
+def redis_round_trips(monkeypatch) -> list:
+    """記錄送往 Fake Redis 的往返次數（pipeline / 交易整批只算一次，不含連線握手）"""
+    trips = []
+    send = fakeredis.aioredis.FakeConnection.send_packed_command
+
+    async def counting_send(self, command, *args, **kwargs):
+        if b"SETINFO" not in b"".join(command):
+            trips.append(command)
+        return await send(self, command, *args, **kwargs)
+
+    monkeypatch.setattr(fakeredis.aioredis.FakeConnection, "send_packed_command", counting_send)
+    return trips
+
+@pytest.fixture
+def hash_session_storage(monkeypatch):
+    """以 hash 格式寫入 Session（滾動升級完成後的設定）"""
+    monkeypatch.setattr(settings, "SESSION_STORAGE_FORMAT", "hash")
+
 @pytest.fixture
 async def mock_session_service(mock_redis_service) -> SessionService:
     """Mock Session Service"""
@@ -92,6 +111,11 @@ async def mock_session_service(mock_redis_service) -> SessionService:
 # Mock Supabase Fixture
 # ============================================
 
+@pytest.fixture(autouse=True)
+def reset_supabase_breakers():
+    """重置共用 SupabaseService 的斷路器，避免前一個測試的連線失敗影響後續測試"""
+    supabase_service.reset_breakers()
+
 @pytest.fixture
 def mock_supabase_user():
     """模擬 Supabase 用戶"""
@@ -26,4 +26,3 @@ class TestHealthAPI:
         assert "checks" in data
         assert "redis" in data["checks"]
         assert "supabase" in data["checks"]
-
@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import Mock
+from httpx import AsyncClient
+
+from app.main import app
+from app.core.dependencies import require_admin
+
+@pytest.mark.asyncio
+class TestMetricsAPI:
+    """監控指標 API 測試"""
+    
+    async def test_metrics_for_admin(self, client: AsyncClient):
+        """測試管理員取得上游呼叫指標"""
+        app.dependency_overrides[require_admin] = lambda: Mock(role="admin")
+        response = await client.get("/api/v1/metrics/")
+        
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert set(data["supabase"]["breakers"]) == {"postgrest", "gotrue"}
+        assert "latency" in data["supabase"]
+        assert "coalesce" in data
+        assert "query_cache" in data
+    
+    async def test_metrics_requires_login(self, client: AsyncClient):
+        """測試未登入無法取得指標"""
+        response = await client.get("/api/v1/metrics/")
+        
+        assert response.status_code == 401
+    
+    async def test_metrics_forbidden_for_non_admin(self, authenticated_client):
+        """測試非管理員無法取得指標"""
+        client, headers = authenticated_client
+        response = await client.get("/api/v1/metrics/", headers=headers)
+        
+        assert response.status_code == 403
+    
+    async def test_not_under_health_prefix(self, client: AsyncClient):
+        """測試指標不在公開的健康檢查路徑下"""
+        response = await client.get("/api/v1/health/metrics")
+        
+        assert response.status_code == 404
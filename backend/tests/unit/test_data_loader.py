@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+import respx
+from httpx import Response
+
+from app.services.data_loader import DataLoader
+from app.services.supabase_service import SupabaseService
+
+
+@pytest.fixture
+def loader() -> DataLoader:
+    return DataLoader(supabase=SupabaseService())
+
+
+def _echo_ids(request):
+    """依 id=in.(...) 回傳資料，略過 missing"""
+    ids = [v.strip('"') for v in request.url.params["id"][4:-1].split(",")]
+    return Response(200, json=[{"id": i, "name": f"user {i}"} for i in ids if i != "missing"])
+
+
+@pytest.mark.asyncio
+class TestDataLoader:
+    """請求範圍批次查詢測試"""
+
+    @respx.mock
+    async def test_same_tick_loads_are_batched(self, loader):
+        """測試同一 tick 內的 load() 合併為一次查詢"""
+        route = respx.get(f"{loader.supabase.url}/rest/v1/user_profiles").mock(
+            side_effect=_echo_ids
+        )
+
+        a, b, missing = await asyncio.gather(
+            loader.load("user_profiles", "a"),
+            loader.load("user_profiles", "b"),
+            loader.load("user_profiles", "missing"),
+        )
+
+        assert route.call_count == 1
+        assert route.calls.last.request.url.params["id"] == 'in.("a","b","missing")'
+        assert a["name"] == "user a"
+        assert b["name"] == "user b"
+        assert missing is None
+        assert loader.batches == 1
+
+    @respx.mock
+    async def test_results_cached_per_request(self, loader):
+        """測試相同 id 在請求期間只查詢一次"""
+        route = respx.get(f"{loader.supabase.url}/rest/v1/user_profiles").mock(
+            side_effect=_echo_ids
+        )
+
+        first = await loader.load("user_profiles", "a")
+        rows = await loader.load_many("user_profiles", ["a", "b", "a"])
+
+        assert [row["id"] for row in rows] == ["a", "b", "a"]
+        assert rows[0] is first
+        assert route.call_count == 2
+        assert route.calls.last.request.url.params["id"] == 'in.("b")'
+
+    @respx.mock
+    async def test_select_adds_key_and_separates_batches(self, loader):
+        """測試不同 select 分開查詢，且自動補上 key 欄位"""
+        route = respx.get(f"{loader.supabase.url}/rest/v1/user_profiles").mock(
+            side_effect=_echo_ids
+        )
+
+        await asyncio.gather(
+            loader.load("user_profiles", "a", select="role"),
+            loader.load("user_profiles", "a"),
+        )
+
+        assert route.call_count == 2
+        selects = sorted(call.request.url.params["select"] for call in route.calls)
+        assert selects == ["*", "role,id"]
+
+    @respx.mock
+    async def test_error_propagates_and_is_not_cached(self, loader):
+        """測試查詢失敗時各呼叫端收到例外，且下次重新查詢"""
+        route = respx.get(f"{loader.supabase.url}/rest/v1/user_profiles").mock(
+            side_effect=[Response(500, json={"message": "boom"}), Response(200, json=[{"id": "a"}])]
+        )
+
+        results = await asyncio.gather(
+            loader.load("user_profiles", "a"),
+            loader.load("user_profiles", "b"),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, Exception) for r in results)
+
+        assert await loader.load("user_profiles", "a") == {"id": "a"}
+        assert route.call_count == 2
+
+    async def test_prime_and_clear(self, loader):
+        """測試預先放入資料與清除快取"""
+        loader.prime("user_profiles", "a", {"id": "a"})
+        assert await loader.load("user_profiles", "a") == {"id": "a"}
+
+        loader.clear("user_profiles")
+        assert loader._cache == {}
+
+    @respx.mock
+    async def test_inflight_batches_are_referenced(self, loader):
+        """測試執行中的批次查詢由 DataLoader 持有，完成後釋放"""
+        respx.get(f"{loader.supabase.url}/rest/v1/user_profiles").mock(side_effect=_echo_ids)
+
+        pending = asyncio.ensure_future(loader.load("user_profiles", "a"))
+        while not loader.batches:
+            await asyncio.sleep(0)
+
+        assert len(loader._tasks) == 1
+        assert (await pending)["id"] == "a"
+        await asyncio.gather(*loader._tasks)
+        await asyncio.sleep(0)
+        assert not loader._tasks
@@ -0,0 +1,121 @@
+import pytest
+import respx
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from uuid import UUID
+from httpx import Response
+
+from app.services.database_service import DatabaseService, QUERIES
+from app.services.supabase_service import supabase_service
+
+
+class FakePool:
+    """記錄查詢的連線池替身（依查詢名稱回傳預設結果）"""
+
+    def __init__(self, results: dict, error: Exception = None):
+        self.results = results
+        self.error = error
+        self.calls = []
+
+    async def fetch(self, sql, *args):
+        name = next(name for name, query in QUERIES.items() if query == sql)
+        self.calls.append((name, args))
+        if self.error:
+            raise self.error
+        return self.results.get(name, [])
+
+
+@pytest.fixture
+def service() -> DatabaseService:
+    return DatabaseService()
+
+
+@pytest.mark.asyncio
+class TestDatabaseService:
+    """Postgres 直連熱門查詢測試"""
+
+    @respx.mock
+    async def test_falls_back_to_postgrest_when_disabled(self, service):
+        """測試未建立連線池時走 PostgREST"""
+        route = respx.get(f"{supabase_service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[{"employee_subtype": "admin"}])
+        )
+
+        rows = await service.get_employee_subtype("user-1")
+
+        assert rows == [{"employee_subtype": "admin"}]
+        assert route.calls.last.request.url.params["id"] == "eq.user-1"
+
+    async def test_direct_rows_match_postgrest_shape(self, service):
+        """測試直連結果轉為與 PostgREST 相同的 JSON 表示"""
+        service._pool = FakePool({"line_binding_by_user": [{
+            "id": UUID("00000000-0000-0000-0000-000000000001"),
+            "channel_type": "teacher",
+            "bound_at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        }]})
+
+        rows = await service.get_binding_by_user("user-1", "teacher")
+
+        assert rows == [{
+            "id": "00000000-0000-0000-0000-000000000001",
+            "channel_type": "teacher",
+            "bound_at": "2026-01-02T03:04:05+00:00",
+        }]
+        assert service._pool.calls == [("line_binding_by_user", ("user-1", "teacher"))]
+
+    async def test_notification_history_total_from_window(self, service):
+        """測試通知歷史由 count(*) OVER () 取得總筆數"""
+        service._pool = FakePool({"notification_history_page": [
+            {"id": "a", "_total": 42},
+            {"id": "b", "_total": 42},
+        ]})
+
+        rows, total = await service.get_notification_history(user_id="user-1", limit=2, offset=4)
+
+        assert rows == [{"id": "a"}, {"id": "b"}]
+        assert total == 42
+        assert service._pool.calls == [
+            ("notification_history_page", ("user-1", None, None, 2, 4))
+        ]
+
+    async def test_notification_history_out_of_range(self, service):
+        """測試超出範圍的頁碼另外查詢總筆數"""
+        service._pool = FakePool({"notification_history_count": [{"count": 3}]})
+
+        rows, total = await service.get_notification_history(limit=20, offset=40)
+
+        assert rows == []
+        assert total == 3
+
+    @respx.mock
+    async def test_falls_back_on_query_error(self, service):
+        """測試直連失敗時改走 PostgREST"""
+        service._pool = FakePool({}, error=ConnectionError("pooler down"))
+        route = respx.get(f"{supabase_service.url}/rest/v1/teacher_available_slots").mock(
+            return_value=Response(200, json=[{"id": "slot-1"}])
+        )
+
+        rows = await service.search_available_slots(date(2026, 3, 1), teacher_id="t-1")
+
+        assert rows == [{"id": "slot-1"}]
+        params = route.calls.last.request.url.params
+        assert params["slot_date"] == "eq.2026-03-01"
+        assert params["teacher_id"] == "eq.t-1"
+        assert params["order"] == "start_time.asc,teacher_id.asc"
+
+    async def test_slot_values_converted(self, service):
+        """測試日期、時間與 numeric 型別轉換"""
+        service._pool = FakePool({"available_slots_by_date": [{
+            "slot_date": date(2026, 3, 1),
+            "start_time": time(9, 30),
+            "price": Decimal("12.5"),
+        }]})
+
+        rows = await service.search_available_slots(date(2026, 3, 1))
+
+        assert rows == [{"slot_date": "2026-03-01", "start_time": "09:30:00", "price": 12.5}]
+
+    async def test_connect_skipped_when_disabled(self, service):
+        """測試未啟用時不建立連線池"""
+        await service.connect()
+        assert service.available is False
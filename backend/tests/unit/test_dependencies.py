@@ -0,0 +1,226 @@
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis.asyncio as redis
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.requests import Request
+
+from app.config import settings
+from app.core import auth_context
+from app.core.auth_context import get_auth_context
+from app.core.dependencies import CurrentUser, get_current_user, require_intern_level, require_staff
+from app.core.exceptions import InvalidTokenException
+from app.core.resilience import CircuitBreaker
+from app.core.security import create_token, decode_token, hash_session_id, TokenType
+from app.middleware.auth_middleware import AuthMiddleware
+from app.services import redis_keys
+from app.services.data_loader import DataLoader
+from app.services.redis_pool import GuardedRedis, RedisUnavailableError
+from app.services.redis_service import RedisService
+from app.services.session_service import session_service
+
+
+def make_request(token: str, session_id: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [
+            (b"authorization", f"Bearer {token}".encode()),
+            (b"cookie", f"session_id={session_id}".encode()),
+        ],
+    })
+
+
+def access_token(**claims) -> str:
+    return create_token(
+        {"sub": "user-1", "email": "a@x.com", "role": "student", **claims},
+        TokenType.ACCESS
+    )
+
+
+@pytest.fixture
+def redis_down(monkeypatch) -> RedisService:
+    """無法連線的 Redis（斷路器門檻 1，第一次失敗後即快速失敗）"""
+    server = fakeredis.FakeServer()
+    server.connected = False
+    service = RedisService()
+    service.breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=60)
+    service._client = GuardedRedis(
+        connection_pool=redis.ConnectionPool(
+            connection_class=fakeredis.aioredis.FakeConnection,
+            server=server,
+            decode_responses=True
+        ),
+        breaker=service.breaker
+    )
+    monkeypatch.setattr(session_service, "redis", service)
+    return service
+
+
+@pytest.mark.asyncio
+class TestDegradedAuth:
+    """Redis 無法使用時的降級認證測試"""
+
+    async def test_unavailable_without_degraded_mode(self, redis_down, monkeypatch):
+        """測試未啟用降級模式時拋出 RedisUnavailableError（回應 503）"""
+        monkeypatch.setattr(settings, "AUTH_DEGRADED_MODE_ENABLED", False)
+
+        with pytest.raises(RedisUnavailableError):
+            await get_current_user(make_request(access_token(), "sid"), DataLoader())
+
+    async def test_trusts_claims_in_degraded_mode(self, redis_down, monkeypatch):
+        """測試降級模式以 Token 聲明建立用戶，且斷路器開啟後不再嘗試連線"""
+        monkeypatch.setattr(settings, "AUTH_DEGRADED_MODE_ENABLED", True)
+
+        for _ in range(3):
+            user = await get_current_user(make_request(access_token(), "sid"), DataLoader())
+
+        assert user.degraded is True
+        assert user.user_id == "user-1"
+        assert user.role == "student"
+        assert user.session_data.extra_data["degraded"] is True
+        assert redis_down.breaker.rejected == 2
+
+    async def test_invalid_token_rejected_in_degraded_mode(self, redis_down, monkeypatch):
+        """測試降級模式仍驗證簽章與 Token 類型"""
+        monkeypatch.setattr(settings, "AUTH_DEGRADED_MODE_ENABLED", True)
+        refresh = create_token({"sub": "user-1"}, TokenType.REFRESH)
+
+        with pytest.raises(InvalidTokenException):
+            await get_current_user(make_request("not-a-jwt", "sid"), DataLoader())
+        with pytest.raises(InvalidTokenException):
+            await get_current_user(make_request(refresh, "sid"), DataLoader())
+
+    async def test_session_writes_rejected(self, redis_down):
+        """測試需要 Redis 的寫入（建立 Session）回應明確錯誤"""
+        with pytest.raises(RedisUnavailableError) as exc:
+            await session_service.create_session(user_id="user-1", user_role="student")
+        assert exc.value.upstream == "redis"
+
+    async def test_healthy_redis_not_degraded(self, mock_session_service, monkeypatch):
+        """測試 Redis 正常時走 Session 驗證"""
+        monkeypatch.setattr(session_service, "redis", mock_session_service.redis)
+        session_id, _ = await session_service.create_session(user_id="user-1", user_role="student")
+
+        user = await get_current_user(make_request(access_token(), session_id), DataLoader())
+
+        assert user.degraded is False
+        assert user.session_data.user_agent is None
+        assert "degraded" not in user.session_data.extra_data
+
+
+@pytest.mark.asyncio
+class TestCurrentUserRoundTrips:
+    """get_current_user 的 Redis 往返次數測試"""
+
+    async def test_default_settings_single_round_trip(self, mock_session_service, redis_round_trips, monkeypatch):
+        """測試預設設定（JSON 格式 Session）認證只需一次 Redis 往返"""
+        monkeypatch.setattr(session_service, "redis", mock_session_service.redis)
+        session_id, _ = await session_service.create_session(user_id="user-1", user_role="student")
+        await mock_session_service.redis.load_scripts()
+        redis_round_trips.clear()
+
+        user = await get_current_user(make_request(access_token(), session_id), DataLoader())
+
+        assert len(redis_round_trips) == 1
+        assert user.session_data.user_id == "user-1"
+
+    async def test_employee_single_round_trip(
+        self, mock_session_service, redis_round_trips, monkeypatch, hash_session_storage
+    ):
+        """測試權限快取命中時認證只需一次 Redis 往返"""
+        monkeypatch.setattr(session_service, "redis", mock_session_service.redis)
+        session_id, _ = await session_service.create_session(user_id="user-1", user_role="employee")
+        await mock_session_service.redis.mset({
+            redis_keys.permission_level("user-1"): "30",
+            redis_keys.employee_type("user-1"): "full_time",
+        })
+        await mock_session_service.redis.load_scripts()
+        redis_round_trips.clear()
+
+        user = await get_current_user(
+            make_request(access_token(role="employee"), session_id), DataLoader()
+        )
+
+        assert len(redis_round_trips) == 1
+        assert user.permission_level == 30
+        assert user.employee_type == "full_time"
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("hash_session_storage")
+class TestRequestAuthContext:
+    """請求範圍認證內容測試（每個請求只解碼一次 Token、只檢查一次黑名單）"""
+
+    @pytest.fixture
+    def guarded_app(self) -> FastAPI:
+        app = FastAPI()
+        app.add_middleware(AuthMiddleware)
+
+        @app.get("/staff")
+        async def staff(
+            user: CurrentUser = Depends(require_staff),
+            level_user: CurrentUser = Depends(require_intern_level),
+            current_user: CurrentUser = Depends(get_current_user)
+        ):
+            return {"same": user is level_user is current_user, "level": current_user.permission_level}
+
+        return app
+
+    async def request(self, app: FastAPI, token: str, session_id: str):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(
+                "/staff",
+                headers={"Authorization": f"Bearer {token}"},
+                cookies={"session_id": session_id}
+            )
+
+    async def test_single_decode_and_blacklist_check(
+        self, guarded_app, mock_session_service, redis_round_trips, monkeypatch
+    ):
+        """測試中間件與多個認證依賴共用同一次解碼與黑名單檢查"""
+        monkeypatch.setattr(session_service, "redis", mock_session_service.redis)
+        session_id, _ = await session_service.create_session(user_id="user-1", user_role="employee")
+        await mock_session_service.redis.mset({
+            redis_keys.permission_level("user-1"): "30",
+            redis_keys.employee_type("user-1"): "full_time",
+        })
+        await mock_session_service.redis.load_scripts()
+        decoded = []
+        monkeypatch.setattr(auth_context, "decode_token", lambda token: decoded.append(token) or decode_token(token))
+        redis_round_trips.clear()
+
+        response = await self.request(guarded_app, access_token(role="employee"), session_id)
+
+        assert response.json() == {"same": True, "level": 30}
+        assert len(decoded) == 1
+        # 中間件的黑名單 EXISTS 與略過黑名單的認證腳本
+        assert len(redis_round_trips) == 2
+        assert sum(b"EXISTS" in b"".join(trip) for trip in redis_round_trips) == 1
+
+    async def test_revoked_token_rejected_by_middleware(self, guarded_app, mock_session_service, monkeypatch):
+        """測試已撤銷的 Token 由中間件拒絕"""
+        monkeypatch.setattr(session_service, "redis", mock_session_service.redis)
+        session_id, _ = await session_service.create_session(user_id="user-1", user_role="employee")
+        token = access_token(role="employee")
+        await session_service.blacklist_token(token, "user-1", 60)
+
+        response = await self.request(guarded_app, token, session_id)
+
+        assert response.status_code == 401
+
+    async def test_context_cached_on_request(self):
+        """測試未經過中間件時於第一次使用建立並快取，無效 Token 為 None"""
+        request = make_request(access_token(), "sid")
+        context = get_auth_context(request)
+
+        assert context is get_auth_context(request)
+        assert context.user_id == "user-1"
+        assert context.session_hash == hash_session_id("sid")
+        assert context.blacklisted is None
+        with pytest.raises(TypeError):
+            context.claims["sub"] = "user-2"
+        assert get_auth_context(make_request("not-a-jwt", "sid")) is None
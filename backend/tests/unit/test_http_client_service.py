@@ -0,0 +1,53 @@
+import pytest
+
+from app.config import settings
+from app.services.http_client_service import HttpClientService, Upstream
+
+
+@pytest.mark.asyncio
+class TestHttpClientService:
+    """對外 HTTP client 註冊表測試"""
+
+    async def test_each_upstream_has_own_client(self):
+        """測試每個上游擁有獨立的 client"""
+        service = HttpClientService()
+        await service.open()
+
+        clients = [service.get(upstream) for upstream in Upstream.ALL]
+        assert len({id(c) for c in clients}) == len(Upstream.ALL)
+
+        await service.close()
+
+    async def test_client_is_reused(self):
+        """測試同一上游重複取得相同的 client"""
+        service = HttpClientService()
+
+        first = service.get(Upstream.LINE_API)
+        second = service.get(Upstream.LINE_API)
+        assert first is second
+
+        await service.close()
+
+    async def test_timeout_follows_settings(self):
+        """測試逾時設定依上游套用"""
+        service = HttpClientService()
+
+        client = service.get(Upstream.LINE_API)
+        assert client.timeout.read == settings.LINE_API_TIMEOUT
+        assert client.timeout.connect == settings.HTTP_CONNECT_TIMEOUT
+
+        await service.close()
+
+    async def test_close_releases_clients(self):
+        """測試關閉後會重新建立 client"""
+        service = HttpClientService()
+        client = service.get(Upstream.POSTGREST)
+
+        await service.close()
+        assert client.is_closed
+
+        reopened = service.get(Upstream.POSTGREST)
+        assert reopened is not client
+        assert not reopened.is_closed
+
+        await service.close()
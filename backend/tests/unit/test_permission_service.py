@@ -0,0 +1,58 @@
+import pytest
+
+from app.services.permission_service import PermissionService
+
+
+@pytest.fixture
+def permissions(mock_redis_service, monkeypatch) -> PermissionService:
+    service = PermissionService()
+    calls = []
+
+    async def fetch(user_id, loader=None):
+        calls.append(user_id)
+        return "full_time"
+
+    monkeypatch.setattr(service, "_fetch_employee_type", fetch)
+    service.fetch_calls = calls
+    return service
+
+
+@pytest.mark.asyncio
+class TestPermissionCache:
+    """權限快取的 Redis 往返次數測試"""
+
+    async def test_miss_reads_and_writes_once(self, permissions, redis_round_trips):
+        """測試未命中時 MGET 一次、查詢一次、pipeline 寫回一次"""
+        assert await permissions.get_user_permissions("user-1") == (30, "full_time")
+        assert len(redis_round_trips) == 2
+        assert permissions.fetch_calls == ["user-1"]
+
+    async def test_hit_single_round_trip(self, permissions, redis_round_trips):
+        """測試命中時只需一次 MGET"""
+        await permissions.get_user_permissions("user-1")
+        redis_round_trips.clear()
+
+        assert await permissions.get_user_permissions("user-1") == (30, "full_time")
+        assert len(redis_round_trips) == 1
+        assert permissions.fetch_calls == ["user-1"]
+
+    async def test_non_employee_cached(self, permissions, monkeypatch):
+        """測試非員工以 "null" 快取"""
+        async def fetch(user_id, loader=None):
+            return None
+        monkeypatch.setattr(permissions, "_fetch_employee_type", fetch)
+
+        assert await permissions.get_user_permissions("user-2") == (0, None)
+        assert await permissions.get_user_employee_type("user-2") is None
+        assert await permissions.get_user_permission_level("user-2") == 0
+
+    async def test_invalidate_single_round_trip(self, permissions, redis_round_trips):
+        """測試清除快取以單次 DEL 完成"""
+        await permissions.get_user_permissions("user-1")
+        redis_round_trips.clear()
+
+        await permissions.invalidate_user_cache("user-1")
+
+        assert len(redis_round_trips) == 1
+        await permissions.get_user_permissions("user-1")
+        assert permissions.fetch_calls == ["user-1", "user-1"]
@@ -0,0 +1,119 @@
+import pytest
+import respx
+from httpx import Response
+
+from app.models.user import UserProfileRecord
+from app.services.profile_service import PROFILE_SELECT, ProfileService
+from app.services.select_builder import Embed, build_select
+from app.services.supabase_service import SupabaseService
+
+
+@pytest.fixture
+def service() -> ProfileService:
+    profile = ProfileService()
+    profile.supabase = SupabaseService()
+    return profile
+
+
+def _row(user_id: str, role: str, **entities) -> dict:
+    row = {
+        "id": user_id,
+        "role": role,
+        "employee_subtype": None,
+        "is_active": True,
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "students": None,
+        "teachers": None,
+        "employees": None,
+    }
+    row.update(entities)
+    return row
+
+
+class TestSelectBuilder:
+    """select 組合測試"""
+
+    def test_embeds(self):
+        """測試嵌入資源"""
+        assert PROFILE_SELECT == "*,students(*),teachers(*),employees(*)"
+
+    def test_alias_hint_inner_and_nested(self):
+        """測試別名、外鍵提示、!inner 與巢狀嵌入"""
+        select = build_select(
+            "id",
+            Embed(
+                "teachers",
+                columns=("id", "name"),
+                alias="teacher",
+                hint="teacher_id",
+                inner=True,
+                embeds=(Embed("teacher_details", columns=("bio",)),),
+            ),
+        )
+        assert select == "id,teacher:teachers!teacher_id!inner(id,name,teacher_details(bio))"
+
+
+@pytest.mark.asyncio
+class TestProfileService:
+    """用戶資料查詢測試"""
+
+    @respx.mock
+    async def test_get_profile_single_request(self, service):
+        """測試單次請求取回用戶與角色實體"""
+        route = respx.get(f"{service.supabase.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[_row(
+                "user-1", "teacher",
+                teachers={"id": "t-1", "name": "王老師", "email": "t@example.com", "is_active": True},
+            )])
+        )
+
+        profile = await service.get_profile("user-1")
+
+        assert route.call_count == 1
+        params = route.calls.last.request.url.params
+        assert params["select"] == PROFILE_SELECT
+        assert params["id"] == "eq.user-1"
+        assert profile.entity.name == "王老師"
+        assert profile.entity.email == "t@example.com"
+
+    @respx.mock
+    async def test_get_profile_not_found(self, service):
+        """測試用戶不存在"""
+        respx.get(f"{service.supabase.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[])
+        )
+
+        assert await service.get_profile("missing") is None
+
+    @respx.mock
+    async def test_list_profiles(self, service):
+        """測試分頁列出用戶並取得總數"""
+        route = respx.get(f"{service.supabase.url}/rest/v1/user_profiles").mock(
+            return_value=Response(
+                206,
+                json=[_row("u1", "student")],
+                headers={"Content-Range": "20-20/21"},
+            )
+        )
+
+        profiles, total = await service.list_profiles(role="student", limit=20, offset=20)
+
+        request = route.calls.last.request
+        assert request.url.params["role"] == "eq.student"
+        assert request.headers["Range"] == "20-39"
+        assert total == 21
+        assert profiles[0].entity is None
+
+    @respx.mock
+    async def test_null_is_active(self, service):
+        """測試 is_active 為 NULL 時保留為 None（不預設為啟用）"""
+        respx.get(f"{service.supabase.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[_row(
+                "u1", "student", is_active=None, students={"id": "s-1", "is_active": None},
+            )])
+        )
+
+        profile = await service.get_profile("u1")
+
+        assert profile.is_active is None
+        assert profile.entity.is_active is None
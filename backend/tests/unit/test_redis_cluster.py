@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from redis.crc import key_slot
+from redis.exceptions import RedisClusterException
+
+from app.config import settings
+from app.services import redis_keys
+from app.services.redis_service import RedisService
+from app.services.session_service import SessionService
+
+# 本機叢集見 tests/docker-compose.redis-cluster.yml
+CLUSTER_URL = os.getenv("REDIS_CLUSTER_TEST_URL")
+
+
+def slot(key: str) -> int:
+    return key_slot(key.encode())
+
+
+class TestKeyLayout:
+    """Hash tag 鍵配置測試"""
+
+    def test_user_keys_share_slot(self):
+        """測試同一用戶的 Session、集合與權限快取位於同一個 slot"""
+        user_id = "3f1c2a9e-0000-4000-8000-000000000001"
+        keys = [
+            redis_keys.session(user_id, "a" * 64),
+            redis_keys.session(user_id, "b" * 64),
+            redis_keys.user_sessions(user_id),
+            redis_keys.permission_level(user_id),
+            redis_keys.employee_type(user_id),
+            redis_keys.user_profile(user_id),
+        ]
+
+        assert len({slot(key) for key in keys}) == 1
+
+    def test_users_spread_across_slots(self):
+        """測試不同用戶分散到不同 slot"""
+        slots = {slot(redis_keys.user_sessions(f"user-{i}")) for i in range(100)}
+        assert len(slots) > 90
+
+
+@pytest.fixture
+async def cluster(monkeypatch):
+    """連線本機 Redis Cluster 的 RedisService"""
+    if not CLUSTER_URL:
+        pytest.skip("未設定 REDIS_CLUSTER_TEST_URL")
+    monkeypatch.setattr(settings, "REDIS_URL", CLUSTER_URL)
+    monkeypatch.setattr(settings, "REDIS_CLUSTER_ENABLED", True)
+    service = RedisService()
+    await service.connect()
+    yield service
+    await service.client.flushall()
+    await service.disconnect()
+
+
+@pytest.mark.asyncio
+class TestRedisCluster:
+    """Redis Cluster 模式測試（需要本機叢集）"""
+
+    async def test_session_lifecycle(self, cluster):
+        """測試 Session 的建立、讀取、更新與登出所有裝置"""
+        sessions = SessionService()
+        sessions.redis = cluster
+        ids = [
+            (await sessions.create_session(user_id="user-1", user_role="student", user_agent=f"A{i}"))[0]
+            for i in range(3)
+        ]
+
+        assert (await sessions.get_session(ids[0], "user-1")).user_agent == "A0"
+        assert await sessions.update_session_activity(ids[0], "user-1") is True
+        assert len(await sessions.get_user_sessions("user-1")) == 3
+
+        await sessions.destroy_session(ids[0], "user-1")
+        assert len(await sessions.get_user_sessions("user-1")) == 2
+        assert await sessions.destroy_all_user_sessions("user-1") == 2
+        assert await sessions.get_session(ids[1], "user-1") is None
+
+    async def test_multi_key_across_slots(self, cluster):
+        """測試跨 slot 的 MGET、MSET 與刪除依 slot 分組執行"""
+        mapping = {f"user_dir:user:{i}": str(i) for i in range(20)}
+        await cluster.mset(mapping)
+
+        assert await cluster.mget(list(mapping)) == list(mapping.values())
+        assert await cluster.delete_many(*mapping) == 20
+
+    async def test_scripts(self, cluster):
+        """測試 Lua 腳本於各節點可用"""
+        assert await cluster.incr_with_expire("rate_limit:1.2.3.4", 60) == 1
+        await cluster.set_json("line_oauth_state:abc", {"nonce": "n"})
+        assert await cluster.pop_json("line_oauth_state:abc") == {"nonce": "n"}
+
+    async def test_transaction_not_supported(self, cluster):
+        """測試叢集模式不支援 MULTI/EXEC"""
+        with pytest.raises(RedisClusterException):
+            async with cluster.transaction() as pipe:
+                pipe.set("a", "1")
@@ -0,0 +1,370 @@
+import asyncio
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError, NoScriptError, ResponseError, TimeoutError as RedisTimeoutError
+
+from app.core.resilience import CircuitBreaker
+from app.services.near_cache import NearCache
+from app.services.redis_pool import (
+    GuardedRedis, InstrumentedConnectionPool, PoolWaitTimeoutError, RedisUnavailableError
+)
+
+
+@pytest.mark.asyncio
+class TestRedisBatch:
+    """RedisService 批次操作測試"""
+
+    async def test_mset_mget_json_with_ttl(self, mock_redis_service, redis_round_trips):
+        """測試批次寫入（含 TTL）與讀取 JSON 各一次往返"""
+        redis_round_trips.clear()
+        await mock_redis_service.mset_json({"a": {"n": 1}, "b": [2]}, expire_seconds=60)
+        values = await mock_redis_service.mget_json(["a", "missing", "b"])
+
+        assert values == [{"n": 1}, None, [2]]
+        assert len(redis_round_trips) == 2
+        assert 0 < await mock_redis_service.ttl("a") <= 60
+
+    async def test_transaction_discarded_on_error(self, mock_redis_service):
+        """測試交易區塊拋出例外時不執行任何指令"""
+        with pytest.raises(RuntimeError):
+            async with mock_redis_service.transaction() as tx:
+                tx.set("k", "v")
+                raise RuntimeError("abort")
+
+        assert await mock_redis_service.get("k") is None
+
+    async def test_delete_many(self, mock_redis_service):
+        """測試批次刪除"""
+        await mock_redis_service.mset({"x": "1", "y": "2"})
+
+        assert await mock_redis_service.delete_many("x", "y", "z") == 2
+        assert await mock_redis_service.delete_many() == 0
+
+
+@pytest.mark.asyncio
+class TestRedisScripts:
+    """Lua 腳本註冊與 EVALSHA 測試"""
+
+    async def test_reloads_on_noscript(self, mock_redis_service, redis_round_trips):
+        """測試伺服器腳本快取清空後自動重新載入"""
+        await mock_redis_service.load_scripts()
+        await mock_redis_service.client.script_flush()
+        redis_round_trips.clear()
+
+        assert await mock_redis_service.incr_with_expire("counter", 60) == 1
+        # EVALSHA（NOSCRIPT）→ SCRIPT LOAD → EVALSHA
+        assert len(redis_round_trips) == 3
+
+        redis_round_trips.clear()
+        assert await mock_redis_service.incr_with_expire("counter", 60) == 2
+        assert len(redis_round_trips) == 1
+
+    async def test_run_script_many_single_pipeline(self, mock_redis_service, redis_round_trips):
+        """測試批次執行腳本只需一次往返，腳本快取清空時重新載入後重送"""
+        await mock_redis_service.client.script_flush()
+        redis_round_trips.clear()
+
+        results = await mock_redis_service.run_script_many(
+            "incr_with_expire", [(["a"], [60]), (["b"], [60]), (["a"], [60])]
+        )
+
+        assert results == [1, 1, 2]
+        # pipeline（NOSCRIPT）→ SCRIPT LOAD → pipeline
+        assert len(redis_round_trips) == 3
+
+    async def test_incr_with_expire_sets_window(self, mock_redis_service):
+        """測試計數視窗設定過期時間，並修復遺失的過期時間"""
+        await mock_redis_service.incr_with_expire("rate", 60)
+        assert 0 < await mock_redis_service.ttl("rate") <= 60
+
+        await mock_redis_service.client.persist("rate")
+        assert await mock_redis_service.incr_with_expire("rate", 60) == 2
+        assert await mock_redis_service.ttl("rate") > 0
+
+    async def test_pop_json_once(self, mock_redis_service):
+        """測試取出並刪除只會成功一次"""
+        await mock_redis_service.set_json("state", {"user_id": "u1"})
+
+        assert await mock_redis_service.pop_json("state") == {"user_id": "u1"}
+        assert await mock_redis_service.pop_json("state") is None
+
+    async def test_unknown_error_not_swallowed(self, mock_redis_service):
+        """測試非 NOSCRIPT 錯誤直接拋出"""
+        mock_redis_service.register_script("broken", "return redis.call('NOPE')")
+
+        with pytest.raises(Exception) as exc:
+            await mock_redis_service.run_script("broken")
+        assert not isinstance(exc.value, NoScriptError)
+
+
+@pytest.fixture
+def near_cache(mock_redis_service):
+    cache = NearCache(["session:", "permission_level:"], max_entries=3, ttl_seconds=60)
+    cache._ready.set()  # 視為已收到追蹤確認
+    mock_redis_service.near_cache = cache
+    yield cache
+    mock_redis_service.near_cache = None
+
+
+@pytest.mark.asyncio
+class TestNearCache:
+    """CLIENT TRACKING 近端快取測試"""
+
+    async def test_repeat_reads_skip_network(self, mock_redis_service, near_cache, redis_round_trips):
+        """測試追蹤前綴的鍵重複讀取不產生往返（含不存在的鍵）"""
+        await mock_redis_service.set("session:a", "v1")
+        redis_round_trips.clear()
+
+        for _ in range(3):
+            assert await mock_redis_service.get("session:a") == "v1"
+            assert await mock_redis_service.get("session:none") is None
+        assert len(redis_round_trips) == 2
+        assert near_cache.hits == 4
+
+    async def test_untracked_prefix_not_cached(self, mock_redis_service, near_cache, redis_round_trips):
+        """測試未追蹤的前綴每次都讀取 Redis"""
+        await mock_redis_service.get("other:a")
+        await mock_redis_service.get("other:a")
+
+        assert len(redis_round_trips) == 2
+
+    async def test_server_invalidation(self, mock_redis_service, near_cache):
+        """測試收到其他 worker 修改的失效通知後重新讀取"""
+        await mock_redis_service.set("session:a", "v1")
+        await mock_redis_service.get("session:a")
+        await mock_redis_service.client.set("session:a", "v2")  # 模擬其他 worker 寫入
+
+        near_cache.invalidate(["session:a"])
+
+        assert await mock_redis_service.get("session:a") == "v2"
+
+    async def test_local_writes_invalidate(self, mock_redis_service, near_cache):
+        """測試本程序的寫入、刪除、腳本與 pipeline 立即失效"""
+        await mock_redis_service.set("session:a", "v1")
+        await mock_redis_service.get("session:a")
+        await mock_redis_service.set("session:a", "v2")
+        assert await mock_redis_service.get("session:a") == "v2"
+
+        async with mock_redis_service.pipeline() as pipe:
+            pipe.delete("session:a")
+        assert await mock_redis_service.get("session:a") is None
+
+        await mock_redis_service.set_json("session:b", {"last_activity": "t0"})
+        await mock_redis_service.get_json("session:b")
+        await mock_redis_service.run_script("touch_session", ["session:b"], ["t1", 60])
+        assert (await mock_redis_service.get_json("session:b"))["last_activity"] == "t1"
+
+    async def test_invalidation_during_read_not_stored(self, near_cache):
+        """測試讀取期間收到失效通知時不寫入舊值"""
+        token = near_cache.begin("session:a")
+        near_cache.invalidate(["session:a"])
+        near_cache.store("session:a", token, "stale")
+
+        assert near_cache.get("session:a") is None
+
+    async def test_inactive_bypasses_cache(self, mock_redis_service, near_cache, redis_round_trips):
+        """測試失效通知中斷時不使用快取"""
+        await mock_redis_service.set("session:a", "v1")
+        await mock_redis_service.get("session:a")
+        near_cache._ready.clear()
+        redis_round_trips.clear()
+
+        await mock_redis_service.get("session:a")
+
+        assert len(redis_round_trips) == 1
+
+    async def test_lru_bound(self, near_cache):
+        """測試超過上限時移除最久未使用的鍵"""
+        for key in ("session:1", "session:2", "session:3"):
+            near_cache.store(key, near_cache.begin(key), "v")
+        near_cache.get("session:1")
+        near_cache.store("session:4", near_cache.begin("session:4"), "v")
+
+        assert near_cache.get("session:2") is None
+        assert near_cache.get("session:1") == "v"
+
+    async def test_mget_fetches_only_misses(self, mock_redis_service, near_cache, redis_round_trips):
+        """測試 MGET 只讀取未快取的鍵"""
+        await mock_redis_service.mset({"permission_level:u1": "30", "employee_type:u1": "admin"})
+        await mock_redis_service.mget(["permission_level:u1", "employee_type:u1"])
+        redis_round_trips.clear()
+
+        values = await mock_redis_service.mget(["permission_level:u1", "employee_type:u1"])
+
+        assert values == ["30", "admin"]
+        assert len(redis_round_trips) == 1
+        assert b"permission_level:u1" not in b"".join(redis_round_trips[0])
+
+
+@pytest.fixture
+def small_pool() -> InstrumentedConnectionPool:
+    return InstrumentedConnectionPool(
+        max_connections=2,
+        timeout=0.05,
+        connection_class=fakeredis.aioredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True
+    )
+
+
+@pytest.mark.asyncio
+class TestConnectionPool:
+    """連線池等待指標測試"""
+
+    async def test_checkout_metrics(self, small_pool):
+        """測試借出數與峰值"""
+        client = redis.Redis(connection_pool=small_pool)
+        await asyncio.gather(*[client.set(f"k{i}", i) for i in range(10)])
+
+        stats = small_pool.stats()
+        assert stats["acquired"] == 10
+        assert stats["in_use"] == 0
+        assert 1 <= stats["peak_in_use"] <= 2
+        assert stats["wait_ms"]["count"] == 10
+
+    async def test_exhaustion_waits_then_times_out(self, small_pool):
+        """測試連線耗盡時等待，超過等待上限拋出錯誤並計數"""
+        held = [await small_pool.get_connection("GET") for _ in range(2)]
+
+        with pytest.raises(ConnectionError):
+            await small_pool.get_connection("GET")
+
+        waiter = asyncio.create_task(small_pool.get_connection("GET"))
+        await asyncio.sleep(0.01)
+        await small_pool.release(held.pop())
+        await small_pool.release(await waiter)
+
+        stats = small_pool.stats()
+        assert stats["exhausted"] == 2
+        assert stats["timeouts"] == 1
+        assert stats["wait_ms"]["errors"] == 1
+        assert stats["wait_ms"]["max_ms"] >= 10
+
+    async def test_unresponsive_server_fails_each_call_by_socket_timeout(self, silent_server):
+        """測試 Redis 無回應時各呼叫依 socket 逾時各自失敗，不在連線池等待鎖排隊"""
+        pool = InstrumentedConnectionPool(
+            host="127.0.0.1", port=silent_server, max_connections=5, timeout=2, socket_timeout=0.2
+        )
+        start = asyncio.get_running_loop().time()
+
+        results = await asyncio.gather(
+            *[pool.get_connection("GET") for _ in range(5)], return_exceptions=True
+        )
+
+        assert all(isinstance(error, RedisTimeoutError) for error in results)
+        assert asyncio.get_running_loop().time() - start < 1
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["timeouts"] == 0
+        await pool.disconnect()
+
+
+@pytest.fixture
+async def silent_server():
+    """接受連線但從不回應的伺服器（模擬 Redis 無回應）"""
+    async def ignore(reader, writer):
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_server(ignore, "127.0.0.1", 0)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def guarded():
+    """經過斷路器的 Redis 客戶端（FakeServer 可模擬斷線）"""
+    server = fakeredis.FakeServer()
+    breaker = CircuitBreaker("redis", failure_threshold=2, reset_timeout=0.05)
+    client = GuardedRedis(
+        connection_pool=InstrumentedConnectionPool(
+            max_connections=2,
+            timeout=0.05,
+            connection_class=fakeredis.aioredis.FakeConnection,
+            server=server,
+            decode_responses=True
+        ),
+        breaker=breaker
+    )
+    return client, server, breaker
+
+
+@pytest.mark.asyncio
+class TestRedisBreaker:
+    """Redis 斷路器測試"""
+
+    async def test_opens_and_fails_fast(self, guarded):
+        """測試連續連線失敗後開啟，開啟期間不再嘗試連線"""
+        client, server, breaker = guarded
+        server.connected = False
+
+        for _ in range(2):
+            with pytest.raises(RedisUnavailableError):
+                await client.get("k")
+        assert breaker.state == CircuitBreaker.OPEN
+
+        server.connected = True  # 冷卻前即使恢復也直接失敗
+        with pytest.raises(RedisUnavailableError, match="斷路器"):
+            await client.get("k")
+        with pytest.raises(RedisUnavailableError):
+            async with client.pipeline() as pipe:
+                await pipe.set("k", "v").execute()
+        assert breaker.rejected == 2
+
+    async def test_recovers_after_probe(self, guarded):
+        """測試冷卻後試探成功即恢復"""
+        client, server, breaker = guarded
+        server.connected = False
+        for _ in range(2):
+            with pytest.raises(RedisUnavailableError):
+                await client.get("k")
+
+        server.connected = True
+        await asyncio.sleep(0.06)
+
+        assert await client.set("k", "v")
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    async def test_refused_connection_opens_breaker(self):
+        """測試連線被拒（Redis 未啟動）計入失敗並開啟斷路器，之後快速失敗"""
+        breaker = CircuitBreaker("redis", failure_threshold=2, reset_timeout=60)
+        client = GuardedRedis(
+            connection_pool=InstrumentedConnectionPool(
+                host="127.0.0.1", port=1, max_connections=2, timeout=2, socket_connect_timeout=0.2
+            ),
+            breaker=breaker
+        )
+        start = asyncio.get_running_loop().time()
+
+        for _ in range(5):
+            with pytest.raises(RedisUnavailableError):
+                await client.exists("blacklist:{u1}:abc")
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.rejected == 3
+        assert asyncio.get_running_loop().time() - start < 1
+
+    async def test_pool_wait_timeout_does_not_trip(self, guarded):
+        """測試連線全部借出的等待逾時不計入失敗"""
+        client, _, breaker = guarded
+        pool = client.connection_pool
+        held = [await pool.get_connection("GET") for _ in range(2)]
+
+        for _ in range(3):
+            with pytest.raises(PoolWaitTimeoutError):
+                await client.get("k")
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        for connection in held:
+            await pool.release(connection)
+
+    async def test_command_errors_do_not_trip(self, guarded):
+        """測試指令錯誤（WRONGTYPE）不計入失敗"""
+        client, _, breaker = guarded
+        await client.set("k", "v")
+
+        for _ in range(3):
+            with pytest.raises(ResponseError):
+                await client.sadd("k", "x")
+        assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,108 @@
+import time
+
+from app.core.resilience import (
+    CircuitBreaker, LatencyHistogram, backoff_delay, deadline_scope, remaining_time
+)
+
+
+class TestCircuitBreaker:
+    """斷路器測試"""
+
+    def test_opens_after_threshold(self):
+        """測試連續失敗達門檻後開啟並拒絕請求"""
+        breaker = CircuitBreaker("postgrest", failure_threshold=3, reset_timeout=30)
+
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.allow() is True
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow() is False
+        assert breaker.stats()["rejected"] == 1
+        assert breaker.stats()["opened"] == 1
+
+    def test_success_resets_failures(self):
+        """測試成功會清除連續失敗次數"""
+        breaker = CircuitBreaker("postgrest", failure_threshold=2, reset_timeout=30)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_allows_single_probe(self, monkeypatch):
+        """測試冷卻後只放行一個試探請求，成功後關閉"""
+        breaker = CircuitBreaker("gotrue", failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow() is True
+
+    def test_half_open_failure_reopens(self, monkeypatch):
+        """測試試探失敗時重新開啟"""
+        breaker = CircuitBreaker("gotrue", failure_threshold=5, reset_timeout=10)
+        for _ in range(5):
+            breaker.record_failure()
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+        assert breaker.allow() is True
+
+        breaker.record_failure()
+        assert breaker._state == CircuitBreaker.OPEN
+        assert breaker.opened == 2
+
+
+class TestBackoffAndDeadline:
+    """退避與請求期限測試"""
+
+    def test_backoff_bounded(self):
+        """測試退避時間介於 0 與上限之間"""
+        for attempt in range(6):
+            delay = backoff_delay(attempt, base=0.1, cap=1.0)
+            assert 0 <= delay <= min(1.0, 0.1 * 2 ** attempt)
+
+    def test_deadline_scope_nested_takes_earliest(self):
+        """測試巢狀期限取較早者，離開區塊後還原"""
+        assert remaining_time() is None
+
+        with deadline_scope(10):
+            assert 9 < remaining_time() <= 10
+            with deadline_scope(60):
+                assert remaining_time() <= 10
+            with deadline_scope(1):
+                assert remaining_time() <= 1
+            with deadline_scope(0):
+                assert 9 < remaining_time() <= 10
+
+        assert remaining_time() is None
+
+
+class TestLatencyHistogram:
+    """延遲直方圖測試"""
+
+    def test_cumulative_buckets(self):
+        """測試累積區間計數"""
+        histogram = LatencyHistogram()
+        for ms in (3, 5, 40, 20000):
+            histogram.observe(ms)
+        histogram.observe(300, error=True)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 5
+        assert snapshot["errors"] == 1
+        assert snapshot["max_ms"] == 20000
+        assert snapshot["buckets"]["5"] == 2
+        assert snapshot["buckets"]["50"] == 3
+        assert snapshot["buckets"]["500"] == 4
+        assert snapshot["buckets"]["+Inf"] == 5
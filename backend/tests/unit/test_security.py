@@ -1,13 +1,18 @@
 import pytest
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from freezegun import freeze_time
 from unittest.mock import Mock
 
+from app.config import settings
+from app.core import security
+from app.core.jwt_codec import (
+    HmacBackend, JoseBackend, JWTDecodeError, available_backends, get_backend
+)
 from app.core.security import (
     create_token, decode_token, TokenType,
     generate_session_id, hash_session_id,
     set_auth_cookies, clear_auth_cookies,
-    get_token_from_request
+    get_token_from_request, VerifiedTokenCache
 )
 
 class TestTokenCreation:
@@ -191,4 +196,85 @@ class TestCookieOperations:
         request.headers = {}
         
         token = get_token_from_request(request)
-        assert token is None
\ No newline at end of file
+        assert token is None
+
+@pytest.fixture
+def empty_token_cache(monkeypatch) -> VerifiedTokenCache:
+    cache = VerifiedTokenCache(max_entries=100)
+    monkeypatch.setattr(security, "token_cache", cache)
+    return cache
+
+
+class TestJWTBackends:
+    """JWT 編解碼後端測試"""
+
+    @pytest.mark.parametrize("name", available_backends())
+    def test_backends_interoperable(self, name, monkeypatch, empty_token_cache):
+        """測試各後端建立的 Token 可由預設後端驗證，反之亦然"""
+        monkeypatch.setattr(settings, "JWT_BACKEND", name)
+        token = create_token({"sub": "user-123", "role": "admin"})
+
+        assert JoseBackend().decode(token, settings.SECRET_KEY)["sub"] == "user-123"
+        jose_token = JoseBackend().encode({"sub": "user-456"}, settings.SECRET_KEY)
+        assert decode_token(jose_token) == {"sub": "user-456"}
+
+    def test_hmac_rejects_invalid(self):
+        """測試 hmac 後端拒絕錯誤簽章、非 HS256、過期與未指定 audience 的 Token"""
+        backend = HmacBackend()
+        expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+        invalid = [
+            backend.encode({"sub": "user-123"}, "other-secret"),
+            "eyJhbGciOiJub25lIn0." + backend.encode({"sub": "user-123"}, "secret").split(".", 1)[1],
+            backend.encode({"sub": "user-123", "exp": expired}, "secret"),
+            backend.encode({"sub": "user-123", "aud": "authenticated"}, "secret"),
+            "not.a-jwt",
+        ]
+
+        for token in invalid:
+            with pytest.raises(JWTDecodeError):
+                backend.decode(token, "secret")
+        token = backend.encode({"sub": "user-123", "aud": "authenticated"}, "secret")
+        assert backend.decode(token, "secret", audience="authenticated")["sub"] == "user-123"
+
+    def test_unknown_backend(self):
+        """測試未知的後端名稱"""
+        with pytest.raises(ValueError):
+            get_backend("unknown")
+
+
+class TestVerifiedTokenCache:
+    """已驗證 Token 快取測試"""
+
+    def test_cache_hit_skips_verification(self, monkeypatch, empty_token_cache):
+        """測試同一 Token 第二次解碼由快取取得，且回傳複本"""
+        token = create_token({"sub": "user-123"})
+        decoded = decode_token(token)
+        decoded["sub"] = "changed"
+
+        monkeypatch.setattr(JoseBackend, "decode", Mock(side_effect=AssertionError("不應重新驗證")))
+
+        assert decode_token(token)["sub"] == "user-123"
+        assert empty_token_cache.stats()["hits"] == 1
+
+    def test_expires_at_token_exp(self, empty_token_cache):
+        """測試快取於 Token 的 exp 到期"""
+        with freeze_time("2024-01-01 12:00:00") as frozen:
+            token = create_token({"sub": "user-123"}, expires_delta=timedelta(seconds=30))
+            assert decode_token(token) is not None
+
+            frozen.tick(timedelta(seconds=31))
+
+            assert decode_token(token) is None
+            assert empty_token_cache.stats()["entries"] == 0
+
+    def test_invalid_tokens_not_cached_and_bounded(self, empty_token_cache, monkeypatch):
+        """測試驗證失敗不快取，且筆數不超過上限（LRU）"""
+        monkeypatch.setattr(empty_token_cache, "max_entries", 2)
+        decode_token("invalid-token")
+        tokens = [create_token({"sub": f"user-{i}"}) for i in range(3)]
+        for token in tokens:
+            decode_token(token)
+
+        assert empty_token_cache.stats()["entries"] == 2
+        assert decode_token(tokens[-1])["sub"] == "user-2"
+        assert empty_token_cache.stats()["hits"] == 1
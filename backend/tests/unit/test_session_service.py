@@ -1,6 +1,10 @@
 import pytest
 from datetime import datetime, timezone
 
+from app.config import settings
+from app.core.exceptions import InvalidTokenException, SessionExpiredException
+from app.core.security import hash_session_id
+from app.services import redis_keys
 from app.services.session_service import SessionService
 from app.models.session import SessionData
 
@@ -31,7 +35,7 @@ class TestSessionService:
         )
         
         # 取得 Session
-        session_data = await mock_session_service.get_session(session_id)
+        session_data = await mock_session_service.get_session(session_id, "user-123")
         
         assert session_data is not None
         assert session_data.user_id == "user-123"
@@ -39,7 +43,7 @@ class TestSessionService:
     
     async def test_get_nonexistent_session(self, mock_session_service):
         """測試取得不存在的 Session"""
-        session_data = await mock_session_service.get_session("nonexistent-id")
+        session_data = await mock_session_service.get_session("nonexistent-id", "user-123")
         assert session_data is None
     
     async def test_update_session_activity(self, mock_session_service):
@@ -50,11 +54,11 @@ class TestSessionService:
         )
         
         # 更新活動時間
-        result = await mock_session_service.update_session_activity(session_id)
+        result = await mock_session_service.update_session_activity(session_id, "user-123")
         assert result is True
         
         # 驗證時間已更新
-        updated = await mock_session_service.get_session(session_id)
+        updated = await mock_session_service.get_session(session_id, "user-123")
         assert updated.last_activity >= original.last_activity
     
     async def test_destroy_session(self, mock_session_service):
@@ -65,11 +69,11 @@ class TestSessionService:
         )
         
         # 銷毀 Session
-        result = await mock_session_service.destroy_session(session_id)
+        result = await mock_session_service.destroy_session(session_id, "user-123")
         assert result is True
         
         # 驗證已刪除
-        session_data = await mock_session_service.get_session(session_id)
+        session_data = await mock_session_service.get_session(session_id, "user-123")
         assert session_data is None
     
     async def test_destroy_all_user_sessions(self, mock_session_service):
@@ -91,7 +95,7 @@ class TestSessionService:
         
         # 驗證全部已刪除
         for sid in sessions:
-            data = await mock_session_service.get_session(sid)
+            data = await mock_session_service.get_session(sid, user_id)
             assert data is None
     
     async def test_get_user_sessions(self, mock_session_service):
@@ -120,16 +124,394 @@ class TestSessionService:
         token = "test-access-token"
         
         # 加入黑名單
-        result = await mock_session_service.blacklist_token(token, 3600)
+        result = await mock_session_service.blacklist_token(token, "user-123", 3600)
         assert result is True
         
         # 驗證在黑名單中
-        is_blacklisted = await mock_session_service.is_token_blacklisted(token)
+        is_blacklisted = await mock_session_service.is_token_blacklisted(token, "user-123")
         assert is_blacklisted is True
     
     async def test_token_not_blacklisted(self, mock_session_service):
         """測試 Token 不在黑名單中"""
         is_blacklisted = await mock_session_service.is_token_blacklisted(
-            "not-blacklisted-token"
+            "not-blacklisted-token", "user-123"
         )
-        assert is_blacklisted is False
\ No newline at end of file
+        assert is_blacklisted is False
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("hash_session_storage")
+class TestSessionRoundTrips:
+    """Session 操作的 Redis 往返次數測試"""
+
+    async def test_create_session_single_round_trip(self, mock_session_service, redis_round_trips):
+        """測試建立 Session 只需一次往返"""
+        redis_round_trips.clear()
+        await mock_session_service.create_session(user_id="user-123", user_role="student")
+
+        assert len(redis_round_trips) == 1
+
+    async def test_get_user_sessions_batched(self, mock_session_service, redis_round_trips):
+        """測試取得所有 Sessions 不隨 Session 數量增加往返次數"""
+        for _ in range(5):
+            await mock_session_service.create_session(user_id="user-123", user_role="student")
+        redis_round_trips.clear()
+
+        sessions = await mock_session_service.get_user_sessions("user-123")
+
+        assert len(sessions) == 5
+        assert len(redis_round_trips) == 2  # SMEMBERS + HGETALL pipeline
+
+    async def test_destroy_all_sessions_batched(self, mock_session_service, redis_round_trips):
+        """測試登出所有裝置以單次 DEL 刪除"""
+        ids = [
+            (await mock_session_service.create_session(user_id="user-123", user_role="student"))[0]
+            for _ in range(5)
+        ]
+        redis_round_trips.clear()
+
+        assert await mock_session_service.destroy_all_user_sessions("user-123") == 5
+        assert len(redis_round_trips) == 2  # SMEMBERS + DEL
+        assert await mock_session_service.get_session(ids[0], "user-123") is None
+        assert await mock_session_service.get_user_sessions("user-123") == []
+
+    async def test_destroy_session_removes_membership(self, mock_session_service, redis_round_trips):
+        """測試銷毀 Session 同時移出用戶集合"""
+        session_id, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        redis_round_trips.clear()
+
+        await mock_session_service.destroy_session(session_id, "user-123")
+
+        assert len(redis_round_trips) == 1  # pipeline(SREM, DEL)
+        assert not await mock_session_service.redis.sismember("user_sessions:{user-123}", data.session_id)
+
+
+    async def test_update_activity_single_round_trip(self, mock_session_service, redis_round_trips):
+        """測試更新活動時間以單一腳本完成並保留其他欄位"""
+        session_id, original = await mock_session_service.create_session(
+            user_id="user-123", user_role="student", extra_data={"email": "a@x.com"}
+        )
+        await mock_session_service.redis.load_scripts()
+        redis_round_trips.clear()
+
+        assert await mock_session_service.update_session_activity(session_id, "user-123") is True
+        assert len(redis_round_trips) == 1
+
+        updated = await mock_session_service.get_session(session_id, "user-123")
+        assert updated.last_activity >= original.last_activity
+        assert updated.extra_data == {"email": "a@x.com"}
+        assert await mock_session_service.update_session_activity("missing", "user-123") is False
+
+
+async def create_legacy_session(service: SessionService, user_id: str) -> str:
+    """以舊 JSON 格式建立 Session"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(settings, "SESSION_STORAGE_FORMAT", "json")
+        session_id, _ = await service.create_session(
+            user_id=user_id, user_role="student", extra_data={"email": "old@x.com"}
+        )
+    return session_id
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("hash_session_storage")
+class TestSessionStorage:
+    """Session hash 儲存與舊 JSON 格式相容測試"""
+
+    async def test_stored_as_hash(self, mock_session_service):
+        """測試 Session 以 hash 欄位儲存並可還原"""
+        session_id, original = await mock_session_service.create_session(
+            user_id="user-123", user_role="student", extra_data={"email": "a@x.com"}
+        )
+        key = redis_keys.session("user-123", original.session_id)
+
+        fields = await mock_session_service.redis.hgetall(key)
+        assert fields["user_role"] == "student"
+        assert "user_agent" not in fields
+        assert await mock_session_service.redis.ttl(key) > 0
+        assert await mock_session_service.get_session(session_id, "user-123") == original
+
+    async def test_get_session_fields(self, mock_session_service):
+        """測試只讀取指定欄位"""
+        session_id, _ = await mock_session_service.create_session(user_id="user-123", user_role="teacher")
+
+        fields = await mock_session_service.get_session_fields(session_id, "user-123", "user_id", "user_role")
+
+        assert fields == {"user_id": "user-123", "user_role": "teacher"}
+        assert await mock_session_service.get_session_fields("missing", "user-123", "user_id") is None
+
+    async def test_touch_writes_only_last_activity(self, mock_session_service):
+        """測試更新活動時間只寫入 last_activity 並重設過期，不存在時不建立"""
+        session_id, original = await mock_session_service.create_session(
+            user_id="user-123", user_role="student", extra_data={"email": "a@x.com"}
+        )
+        key = redis_keys.session("user-123", original.session_id)
+        await mock_session_service.redis.expire(key, 10)
+
+        assert await mock_session_service.update_session_activity(session_id, "user-123") is True
+
+        fields = await mock_session_service.redis.hgetall(key)
+        assert fields["extra_data"] == '{"email":"a@x.com"}'
+        assert fields["last_activity"] >= original.last_activity
+        assert await mock_session_service.redis.ttl(key) > 10
+        assert await mock_session_service.update_session_activity("missing", "user-123") is False
+        assert not await mock_session_service.redis.exists(redis_keys.session("user-123", "missing"))
+
+    async def test_reads_legacy_json(self, mock_session_service):
+        """測試舊 JSON 格式的 Session 仍可讀取與更新"""
+        legacy_id = await create_legacy_session(mock_session_service, "user-123")
+        await mock_session_service.create_session(user_id="user-123", user_role="teacher")
+
+        session = await mock_session_service.get_session(legacy_id, "user-123")
+        assert session.extra_data == {"email": "old@x.com"}
+        assert await mock_session_service.get_session_fields(legacy_id, "user-123", "user_role") == {
+            "user_role": "student"
+        }
+        assert await mock_session_service.update_session_activity(legacy_id, "user-123") is True
+        assert (await mock_session_service.get_session(legacy_id, "user-123")).extra_data == {
+            "email": "old@x.com"
+        }
+
+        sessions = await mock_session_service.get_user_sessions("user-123")
+        assert sorted(s.user_role for s in sessions) == ["student", "teacher"]
+        assert await mock_session_service.destroy_all_user_sessions("user-123") == 2
+
+
+@pytest.mark.asyncio
+class TestSessionActivity:
+    """Session 活動時間去抖動與批次寫入測試"""
+
+    async def test_skips_recent_activity(self, mock_session_service, redis_round_trips):
+        """測試 last_activity 未超過間隔時不寫入"""
+        session_id, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        redis_round_trips.clear()
+
+        for _ in range(20):
+            await mock_session_service.record_activity("user-123", data.session_id, data.last_activity)
+
+        assert redis_round_trips == []
+        assert mock_session_service.activity_skipped == 20
+
+    async def test_writes_stale_activity(self, mock_session_service):
+        """測試 last_activity 超過間隔時立即寫入並重設過期"""
+        session_id, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        key = redis_keys.session("user-123", data.session_id)
+        await mock_session_service.redis.expire(key, 10)
+
+        await mock_session_service.record_activity("user-123", data.session_id, "2020-01-01T00:00:00+00:00")
+
+        assert mock_session_service.activity_written == 1
+        assert await mock_session_service.redis.ttl(key) > 10
+        assert (await mock_session_service.get_session(session_id, "user-123")).last_activity > "2020"
+
+    async def test_buffered_flush(self, mock_session_service, redis_round_trips, monkeypatch):
+        """測試啟用緩衝時累積活動時間並以單次 pipeline 寫入"""
+        monkeypatch.setattr(settings, "SESSION_ACTIVITY_BUFFER_ENABLED", True)
+        monkeypatch.setattr(settings, "SESSION_ACTIVITY_FLUSH_SECONDS", 3600)
+        await mock_session_service.redis.load_scripts()
+        created = [
+            await mock_session_service.create_session(user_id="user-123", user_role="student")
+            for _ in range(3)
+        ]
+        hashes = [data.session_id for _, data in created]
+        await mock_session_service.start()
+        redis_round_trips.clear()
+
+        for session_hash in hashes * 2:
+            await mock_session_service.record_activity("user-123", session_hash, "2020-01-01T00:00:00+00:00")
+        assert redis_round_trips == []
+        assert mock_session_service.stats()["activity_pending"] == 3
+
+        await mock_session_service.stop()
+
+        assert len(redis_round_trips) == 1
+        assert mock_session_service.activity_written == 3
+        for session_id, original in created:
+            updated = await mock_session_service.get_session(session_id, "user-123")
+            assert updated.last_activity > original.last_activity
+
+    async def test_failed_flush_kept(self, mock_session_service, monkeypatch):
+        """測試批次寫入失敗時保留活動時間至下次"""
+        mock_session_service._activity["session:{user-123}:abc"] = "2026-01-01T00:00:00+00:00"
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("down")
+
+        monkeypatch.setattr(mock_session_service.redis, "run_script_many", unavailable)
+
+        with pytest.raises(ConnectionError):
+            await mock_session_service.flush_activity()
+        assert mock_session_service.stats()["activity_pending"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("hash_session_storage")
+class TestAuthenticate:
+    """單次往返請求認證腳本測試"""
+
+    async def test_single_round_trip(self, mock_session_service, redis_round_trips, monkeypatch):
+        """測試一次往返取得 Session 與權限快取並更新活動時間"""
+        monkeypatch.setattr(settings, "SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS", 0)
+        session_id, original = await mock_session_service.create_session(
+            user_id="user-123", user_role="employee", extra_data={"email": "a@x.com"}
+        )
+        await mock_session_service.redis.mset({
+            redis_keys.permission_level("user-123"): "30",
+            redis_keys.employee_type("user-123"): "full_time",
+        })
+        await mock_session_service.redis.load_scripts()
+        redis_round_trips.clear()
+
+        session, level, employee_type = await mock_session_service.authenticate(
+            "user-123", hash_session_id("token"), original.session_id
+        )
+
+        assert len(redis_round_trips) == 1
+        assert (level, employee_type) == ("30", "full_time")
+        assert session.extra_data == {"email": "a@x.com"}
+        assert session.last_activity > original.last_activity
+        assert mock_session_service.activity_written == 1
+
+    async def test_recent_activity_not_written(self, mock_session_service):
+        """測試 last_activity 未超過間隔時腳本不寫入"""
+        session_id, original = await mock_session_service.create_session(user_id="user-123", user_role="student")
+
+        session, level, employee_type = await mock_session_service.authenticate(
+            "user-123", hash_session_id("token"), original.session_id
+        )
+
+        assert session.last_activity == original.last_activity
+        assert level is None and employee_type is None
+        assert mock_session_service.activity_skipped == 1
+
+    async def test_rejects_revoked_and_missing(self, mock_session_service):
+        """測試已撤銷的 Token 與不存在的 Session"""
+        _, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        await mock_session_service.blacklist_token("revoked", "user-123", 60)
+
+        revoked, token = hash_session_id("revoked"), hash_session_id("token")
+
+        with pytest.raises(InvalidTokenException):
+            await mock_session_service.authenticate("user-123", revoked, data.session_id)
+        with pytest.raises(SessionExpiredException):
+            await mock_session_service.authenticate("user-123", token, hash_session_id("missing"))
+        with pytest.raises(SessionExpiredException):
+            await mock_session_service.authenticate("user-456", token, data.session_id)
+
+    async def test_skip_blacklist_check(self, mock_session_service):
+        """測試中間件已檢查黑名單時腳本略過黑名單"""
+        _, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        await mock_session_service.blacklist_token("revoked", "user-123", 60)
+
+        session, _, _ = await mock_session_service.authenticate(
+            "user-123", hash_session_id("revoked"), data.session_id, check_blacklist=False
+        )
+
+        assert session.user_id == "user-123"
+
+    async def test_json_session_single_round_trip(self, mock_session_service, redis_round_trips, monkeypatch):
+        """測試 JSON 格式 Session 同樣一次往返認證並更新活動時間"""
+        monkeypatch.setattr(settings, "SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS", 0)
+        legacy_id = await create_legacy_session(mock_session_service, "user-123")
+        original = await mock_session_service.get_session(legacy_id, "user-123")
+        await mock_session_service.redis.load_scripts()
+        redis_round_trips.clear()
+
+        session, _, _ = await mock_session_service.authenticate(
+            "user-123", hash_session_id("token"), hash_session_id(legacy_id)
+        )
+
+        assert len(redis_round_trips) == 1
+        assert session.extra_data == {"email": "old@x.com"}
+        assert session.last_activity > original.last_activity
+        stored = await mock_session_service.get_session(legacy_id, "user-123")
+        assert stored.last_activity == session.last_activity
+        assert stored.extra_data == {"email": "old@x.com"}
+
+    async def test_json_session_rejects_other_user(self, mock_session_service):
+        """測試 JSON 格式 Session 不屬於此用戶時拒絕"""
+        legacy_id = await create_legacy_session(mock_session_service, "user-123")
+        session_hash = hash_session_id(legacy_id)
+        raw = await mock_session_service.redis.get(redis_keys.session("user-123", session_hash))
+        await mock_session_service.redis.set(redis_keys.session("user-456", session_hash), raw)
+
+        with pytest.raises(InvalidTokenException):
+            await mock_session_service.authenticate("user-456", hash_session_id("token"), session_hash)
+
+
+async def create_pre_cluster_session(service: SessionService, user_id: str) -> str:
+    """建立 Session 後改放到不含 user_id 的舊鍵（session:<hash>）"""
+    session_id = await create_legacy_session(service, user_id)
+    session_hash = hash_session_id(session_id)
+    client = service.redis.client
+    await client.rename(redis_keys.session(user_id, session_hash), redis_keys.legacy_session(session_hash))
+    await client.rename(redis_keys.user_sessions(user_id), redis_keys.legacy_user_sessions(user_id))
+    return session_id
+
+
+@pytest.mark.asyncio
+class TestLegacyKeyFallback:
+    """舊鍵格式（session:<hash>、blacklist:<hash>）相容測試"""
+
+    async def test_authenticate_migrates_legacy_session(self, mock_session_service):
+        """測試舊鍵的 Session 可認證並搬移到新鍵，保留有效期"""
+        session_id = await create_pre_cluster_session(mock_session_service, "user-123")
+        session_hash = hash_session_id(session_id)
+        redis = mock_session_service.redis
+        await redis.expire(redis_keys.legacy_session(session_hash), 600)
+
+        session, _, _ = await mock_session_service.authenticate(
+            "user-123", hash_session_id("token"), session_hash
+        )
+
+        assert session.extra_data == {"email": "old@x.com"}
+        assert not await redis.exists(redis_keys.legacy_session(session_hash))
+        assert 0 < await redis.ttl(redis_keys.session("user-123", session_hash)) <= 600
+        assert await redis.smembers(redis_keys.user_sessions("user-123")) == {session_hash}
+        assert await redis.smembers(redis_keys.legacy_user_sessions("user-123")) == set()
+
+    async def test_legacy_session_of_other_user_not_migrated(self, mock_session_service):
+        """測試舊鍵的 Session 不屬於此用戶時不搬移"""
+        session_id = await create_pre_cluster_session(mock_session_service, "user-123")
+        session_hash = hash_session_id(session_id)
+
+        with pytest.raises(SessionExpiredException):
+            await mock_session_service.authenticate("user-456", hash_session_id("token"), session_hash)
+        assert await mock_session_service.redis.exists(redis_keys.legacy_session(session_hash))
+
+    async def test_legacy_blacklist_rejected(self, mock_session_service):
+        """測試舊鍵黑名單中的 Token 仍被拒絕"""
+        _, data = await mock_session_service.create_session(user_id="user-123", user_role="student")
+        revoked = hash_session_id("revoked")
+        await mock_session_service.redis.set(redis_keys.legacy_blacklist(revoked), "1", expire_seconds=60)
+
+        assert await mock_session_service.is_blacklisted("user-123", revoked)
+        with pytest.raises(InvalidTokenException):
+            await mock_session_service.authenticate("user-123", revoked, data.session_id)
+
+    async def test_blacklist_check_single_round_trip(self, mock_session_service, redis_round_trips):
+        """測試單一節點同時檢查新舊黑名單鍵仍為一次往返"""
+        assert not await mock_session_service.is_blacklisted("user-123", hash_session_id("token"))
+        assert len(redis_round_trips) == 1
+
+    async def test_destroy_all_removes_legacy_sessions(self, mock_session_service):
+        """測試登出所有裝置同時刪除舊鍵的 Session"""
+        legacy_id = await create_pre_cluster_session(mock_session_service, "user-123")
+        await mock_session_service.create_session(user_id="user-123", user_role="student")
+        redis = mock_session_service.redis
+
+        assert await mock_session_service.destroy_all_user_sessions("user-123") == 2
+        assert not await redis.exists(redis_keys.legacy_session(hash_session_id(legacy_id)))
+        assert not await redis.exists(redis_keys.legacy_user_sessions("user-123"))
+
+    async def test_fallback_disabled(self, mock_session_service, monkeypatch):
+        """測試關閉相容設定後不讀取舊鍵"""
+        monkeypatch.setattr(settings, "REDIS_LEGACY_KEY_FALLBACK", False)
+        session_id = await create_pre_cluster_session(mock_session_service, "user-123")
+        revoked = hash_session_id("revoked")
+        await mock_session_service.redis.set(redis_keys.legacy_blacklist(revoked), "1", expire_seconds=60)
+
+        assert not await mock_session_service.is_blacklisted("user-123", revoked)
+        with pytest.raises(SessionExpiredException):
+            await mock_session_service.authenticate(
+                "user-123", hash_session_id("token"), hash_session_id(session_id)
+            )
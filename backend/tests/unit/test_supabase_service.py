@@ -0,0 +1,856 @@
+import asyncio
+import contextlib
+import json
+import httpx
+import pytest
+import respx
+from httpx import Response
+
+from app.config import settings
+from app.services.supabase_service import SupabaseService, SupabaseAuthResponse, SupabaseUser
+from app.services.line_binding_service import LineBinding
+from app.services.query_cache_service import query_cache_service
+from app.services import redis_keys
+from app.core.resilience import CircuitOpenError, DeadlineExceededError, deadline_scope
+from app.core.replica_router import ReplicaRouter, set_read_affinity
+
+
+@pytest.fixture
+def service() -> SupabaseService:
+    return SupabaseService()
+
+
+@pytest.mark.asyncio
+class TestTableSelect:
+    """PostgREST 查詢測試"""
+
+    @respx.mock
+    async def test_select_with_order_and_range(self, service):
+        """測試排序與 Range 分頁"""
+        route = respx.get(f"{service.url}/rest/v1/line_notification_logs").mock(
+            return_value=Response(200, json=[{"id": "a"}])
+        )
+
+        rows = await service.table_select(
+            table="line_notification_logs",
+            filters={"user_id": "user-1"},
+            order="created_at.desc",
+            limit=20,
+            offset=40,
+        )
+
+        assert rows == [{"id": "a"}]
+        request = route.calls.last.request
+        assert request.url.params["order"] == "created_at.desc"
+        assert request.url.params["user_id"] == "eq.user-1"
+        assert request.headers["Range"] == "40-59"
+        assert request.headers["Range-Unit"] == "items"
+        assert "Prefer" not in request.headers
+
+    @respx.mock
+    async def test_select_page_returns_total(self, service):
+        """測試由 Content-Range 取得總筆數"""
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(
+                206,
+                json=[{"id": "a"}, {"id": "b"}],
+                headers={"Content-Range": "0-1/342"},
+            )
+        )
+
+        rows, total = await service.table_select_page(
+            table="user_profiles", limit=2, count="planned"
+        )
+
+        assert len(rows) == 2
+        assert total == 342
+        assert route.calls.last.request.headers["Prefer"] == "count=planned"
+
+    @respx.mock
+    async def test_select_page_out_of_range(self, service):
+        """測試超出範圍的頁碼"""
+        respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(416, json={}, headers={"Content-Range": "*/12"})
+        )
+
+        rows, total = await service.table_select_page(
+            table="user_profiles", limit=10, offset=100
+        )
+
+        assert rows == []
+        assert total == 12
+
+    async def test_select_rejects_zero_limit(self, service):
+        """測試 limit 小於 1 時不送出請求"""
+        with pytest.raises(ValueError):
+            await service.table_select_page(table="user_profiles", limit=0)
+
+
+@pytest.mark.asyncio
+class TestBulkWrite:
+    """批次寫入測試"""
+
+    @respx.mock
+    async def test_insert_many_is_chunked(self, service):
+        """測試依筆數切塊，一塊一次請求"""
+        route = respx.post(f"{service.url}/rest/v1/line_notification_logs").mock(
+            side_effect=lambda request: Response(201, content=request.content)
+        )
+        rows = [{"user_id": f"u{i}", "notification_type": "general"} for i in range(5)]
+
+        result = await service.table_insert_many(
+            "line_notification_logs", rows, chunk_size=2
+        )
+
+        assert route.call_count == 3
+        assert result.ok
+        assert [c.row_count for c in result.chunks] == [2, 2, 1]
+        assert len(result.rows) == 5
+        assert route.calls.last.request.headers["Prefer"] == "return=representation"
+
+    @respx.mock
+    async def test_upsert_sends_resolution_and_on_conflict(self, service):
+        """測試 Upsert 的 Prefer 與 on_conflict"""
+        route = respx.post(f"{service.url}/rest/v1/line_user_bindings").mock(
+            return_value=Response(201, json=[{"id": "b1"}])
+        )
+
+        await service.table_upsert(
+            "line_user_bindings",
+            [{"line_user_id": "U1", "channel_type": "student"}],
+            on_conflict="line_user_id,channel_type",
+            ignore_duplicates=True,
+        )
+
+        request = route.calls.last.request
+        assert request.url.params["on_conflict"] == "line_user_id,channel_type"
+        assert "resolution=ignore-duplicates" in request.headers["Prefer"]
+
+    @respx.mock
+    async def test_mixed_columns_use_defaults(self, service):
+        """測試欄位不一致時指定 columns 並以 missing=default 使用欄位 DEFAULT"""
+        route = respx.post(f"{service.url}/rest/v1/courses").mock(
+            side_effect=lambda request: Response(201, content=request.content)
+        )
+
+        await service.table_insert_many(
+            "courses", [{"id": 1, "is_active": False}, {"id": 2}, {"id": 3}], chunk_size=2
+        )
+
+        mixed, uniform = route.calls[0].request, route.calls[1].request
+        assert mixed.url.params["columns"] == "id,is_active"
+        assert mixed.headers["Prefer"] == "return=representation,missing=default"
+        assert "columns" not in uniform.url.params
+        assert uniform.headers["Prefer"] == "return=representation"
+
+    @respx.mock
+    async def test_chunk_errors_are_reported(self, service):
+        """測試單一區塊失敗不影響其他區塊"""
+        respx.post(f"{service.url}/rest/v1/courses").mock(side_effect=[
+            Response(201, json=[{"id": 1}]),
+            Response(409, json={"message": "duplicate key"}),
+        ])
+
+        result = await service.table_insert_many(
+            "courses", [{"id": 1}, {"id": 2}], chunk_size=1
+        )
+
+        assert not result.ok
+        assert result.rows == [{"id": 1}]
+        assert result.errors[0].index == 1
+        assert result.errors[0].error == "duplicate key"
+
+
+@pytest.mark.asyncio
+class TestIterRows:
+    """Keyset 分頁走訪測試"""
+
+    @staticmethod
+    def _pages(total: int, page_size: int):
+        def handler(request):
+            after = request.url.params.get("id")
+            start = int(after[3:]) + 1 if after else 0
+            ids = range(start, min(start + page_size, total))
+            return Response(200, json=[{"id": i} for i in ids])
+        return handler
+
+    @respx.mock
+    @pytest.mark.parametrize("prefetch", [True, False])
+    async def test_walks_all_pages(self, service, prefetch):
+        """測試走訪所有頁面且依 key 接續"""
+        route = respx.get(f"{service.url}/rest/v1/bookings").mock(
+            side_effect=self._pages(total=7, page_size=3)
+        )
+
+        ids = [
+            row["id"]
+            async for row in service.iter_rows("bookings", page_size=3, prefetch=prefetch)
+        ]
+
+        assert ids == list(range(7))
+        assert route.call_count == 3
+        first, second = route.calls[0].request, route.calls[1].request
+        assert "id" not in first.url.params
+        assert first.url.params["order"] == "id.asc"
+        assert second.url.params["id"] == "gt.2"
+        assert second.headers["Range"] == "0-2"
+
+    async def test_early_exit_cancels_prefetch(self, service, monkeypatch):
+        """測試提前結束走訪時取消並等待預取，不留下背景任務"""
+        prefetch_started, prefetch_cancelled = asyncio.Event(), asyncio.Event()
+
+        async def fake_select(table, select, filters, order, limit, *args, extra_params=None, **kwargs):
+            if extra_params is None:
+                return [{"id": i} for i in range(limit)], None
+            prefetch_started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                prefetch_cancelled.set()
+                raise
+
+        monkeypatch.setattr(service, "_select", fake_select)
+
+        async with contextlib.aclosing(service.iter_rows("bookings", page_size=3)) as rows:
+            async for row in rows:
+                # 預取已送出、尚未完成時結束走訪
+                await prefetch_started.wait()
+                break
+
+        assert prefetch_cancelled.is_set()
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    @respx.mock
+    async def test_adds_key_to_select(self, service):
+        """測試 select 未包含 key 時自動補上"""
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[])
+        )
+
+        rows = [row async for row in service.iter_rows("user_profiles", select="role")]
+
+        assert rows == []
+        assert route.calls.last.request.url.params["select"] == "role,id"
+
+    @respx.mock
+    async def test_raises_on_error(self, service):
+        """測試查詢失敗時拋出例外"""
+        respx.get(f"{service.url}/rest/v1/bookings").mock(
+            return_value=Response(500, json={"message": "boom"})
+        )
+
+        with pytest.raises(Exception, match="boom"):
+            async for _ in service.iter_rows("bookings"):
+                pass
+
+
+@pytest.mark.asyncio
+class TestSelectIn:
+    """批次 id 查詢測試"""
+
+    @respx.mock
+    async def test_chunks_by_count(self, service, monkeypatch):
+        """測試依筆數上限切分並去除重複值"""
+        monkeypatch.setattr(settings, "SUPABASE_IN_FILTER_MAX_IDS", 2)
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            side_effect=lambda request: Response(200, json=[
+                {"id": v.strip('"')}
+                for v in request.url.params["id"][4:-1].split(",")
+            ])
+        )
+
+        rows = await service.table_select_in("user_profiles", ["a", "b", "c", "a", None])
+
+        assert sorted(row["id"] for row in rows) == ["a", "b", "c"]
+        assert route.call_count == 2
+        assert [call.request.url.params["id"] for call in route.calls] == [
+            'in.("a","b")', 'in.("c")'
+        ]
+
+    @respx.mock
+    async def test_chunks_by_length(self, service, monkeypatch):
+        """測試依 URL 長度上限切分"""
+        monkeypatch.setattr(settings, "SUPABASE_IN_FILTER_MAX_CHARS", 100)
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[])
+        )
+
+        await service.table_select_in("user_profiles", [f"{i:036d}" for i in range(5)])
+
+        assert route.call_count == 3
+        assert all(len(str(call.request.url)) < 250 for call in route.calls)
+
+    @respx.mock
+    async def test_quotes_reserved_characters(self, service):
+        """測試值含逗號、括號與引號時正確跳脫"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(200, json=[])
+        )
+
+        await service.table_select_in("courses", ['a,b', 'c"(d)'], key="course_code")
+
+        assert route.calls.last.request.url.params["course_code"] == 'in.("a,b","c\\"(d)")'
+
+    async def test_empty_values(self, service):
+        """測試空列表不發出請求"""
+        assert await service.table_select_in("user_profiles", []) == []
+
+    @respx.mock
+    async def test_raises_on_error(self, service):
+        """測試查詢失敗時拋出例外"""
+        respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(400, json={"message": "bad filter"})
+        )
+
+        with pytest.raises(Exception, match="bad filter"):
+            await service.table_select_in("user_profiles", ["a"])
+
+
+@pytest.mark.asyncio
+class TestRequestCoalescing:
+    """相同讀取請求合併測試"""
+
+    @respx.mock
+    async def test_identical_reads_are_coalesced(self, service):
+        """測試同時送出的相同查詢只打一次上游"""
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[{"employee_subtype": "full_time"}])
+        )
+
+        results = await asyncio.gather(*[
+            service.table_select(
+                "user_profiles",
+                select="employee_subtype",
+                filters={"id": "eq.user-1"},
+                use_service_key=True,
+            )
+            for _ in range(5)
+        ])
+
+        assert route.call_count == 1
+        assert all(r == [{"employee_subtype": "full_time"}] for r in results)
+        assert service.coalesce_stats["issued"] == 1
+        assert service.coalesce_stats["coalesced"] == 4
+
+    @respx.mock
+    async def test_different_keys_are_not_coalesced(self, service):
+        """測試不同金鑰的查詢不會合併"""
+        route = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[])
+        )
+
+        await asyncio.gather(
+            service.table_select("user_profiles", filters={"id": "u1"}),
+            service.table_select("user_profiles", filters={"id": "u1"}, use_service_key=True),
+        )
+
+        assert route.call_count == 2
+        assert service.coalesce_stats["coalesced"] == 0
+
+
+@pytest.mark.asyncio
+class TestQueryCache:
+    """PostgREST 讀取快取測試"""
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self, monkeypatch, mock_redis_service):
+        monkeypatch.setattr(settings, "SUPABASE_CACHE_ENABLED", True)
+        monkeypatch.setattr(settings, "SUPABASE_CACHE_TABLES", {"courses": 60})
+        query_cache_service._stats.clear()
+
+    @respx.mock
+    async def test_read_through_and_write_invalidation(self, service):
+        """測試快取命中與寫入後失效"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(200, json=[{"id": "c1"}])
+        )
+        respx.post(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(201, json=[{"id": "c2"}])
+        )
+
+        # 欄位順序與 eq. 前綴不同仍視為相同查詢
+        await service.table_select("courses", select="id,name", filters={"id": "c1"})
+        rows = await service.table_select("courses", select="name, id", filters={"id": "eq.c1"})
+        assert rows == [{"id": "c1"}]
+        assert route.call_count == 1
+
+        await service.table_insert("courses", {"id": "c2"})
+        await service.table_select("courses", select="id,name", filters={"id": "c1"})
+        assert route.call_count == 2
+
+        stats = query_cache_service.stats()["courses"]
+        assert stats == {"hits": 1, "misses": 2, "invalidations": 1, "errors": 0}
+
+    @respx.mock
+    async def test_uncached_table_and_bypass(self, service):
+        """測試未設定的表格與 cache=False 不使用快取"""
+        users = respx.get(f"{service.url}/rest/v1/user_profiles").mock(
+            return_value=Response(200, json=[])
+        )
+        courses = respx.get(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(200, json=[])
+        )
+
+        for _ in range(2):
+            await service.table_select("user_profiles")
+            await service.table_select("courses", cache=False)
+
+        assert users.call_count == 2
+        assert courses.call_count == 2
+        assert "user_profiles" not in query_cache_service.stats()
+
+    @respx.mock
+    async def test_primary_skips_cache_read(self, service):
+        """測試 primary=True 不讀取快取，但查詢結果仍寫入快取"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(side_effect=[
+            Response(200, json=[{"id": "c1", "name": "old"}]),
+            Response(200, json=[{"id": "c1", "name": "new"}]),
+        ])
+
+        await service.table_select("courses")
+        assert await service.table_select("courses", primary=True) == [{"id": "c1", "name": "new"}]
+        assert await service.table_select("courses") == [{"id": "c1", "name": "new"}]
+        assert route.call_count == 2
+
+    @respx.mock
+    async def test_errors_are_not_cached(self, service):
+        """測試查詢失敗的結果不寫入快取"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(side_effect=[
+            Response(500, json={}),
+            Response(200, json=[{"id": "c1"}]),
+        ])
+
+        assert await service.table_select("courses") == []
+        assert await service.table_select("courses") == [{"id": "c1"}]
+        assert route.call_count == 2
+
+
+@pytest.mark.asyncio
+class TestRpc:
+    """資料庫函數呼叫測試"""
+
+    @respx.mock
+    async def test_scalar_via_post(self, service):
+        """測試純量回傳"""
+        route = respx.post(f"{service.url}/rest/v1/rpc/get_user_by_line_id").mock(
+            return_value=Response(200, json="user-uuid")
+        )
+
+        result = await service.rpc(
+            "get_user_by_line_id",
+            {"p_line_user_id": "U1", "p_channel_type": "student"},
+            returns="scalar",
+        )
+
+        assert result == "user-uuid"
+        assert json.loads(route.calls.last.request.content) == {
+            "p_line_user_id": "U1", "p_channel_type": "student"
+        }
+
+    @respx.mock
+    async def test_read_only_uses_get_and_drops_nulls(self, service):
+        """測試唯讀函數使用 GET 並略過 None 參數"""
+        route = respx.get(f"{service.url}/rest/v1/rpc/is_line_bound").mock(
+            return_value=Response(200, json=True)
+        )
+
+        result = await service.rpc(
+            "is_line_bound",
+            {"p_user_id": "u1", "p_channel_type": None},
+            returns="scalar",
+            read_only=True,
+        )
+
+        assert result is True
+        assert dict(route.calls.last.request.url.params) == {"p_user_id": "u1"}
+
+    @respx.mock
+    async def test_single_and_rows(self, service):
+        """測試單筆與列表回傳"""
+        respx.post(f"{service.url}/rest/v1/rpc/fn").mock(
+            return_value=Response(200, json=[{"id": 1}, {"id": 2}])
+        )
+
+        assert await service.rpc("fn", returns="single") == {"id": 1}
+        assert await service.rpc("fn") == [{"id": 1}, {"id": 2}]
+
+    @respx.mock
+    async def test_error_raises(self, service):
+        """測試呼叫失敗時拋出例外"""
+        respx.post(f"{service.url}/rest/v1/rpc/missing").mock(
+            return_value=Response(404, json={"message": "function not found"})
+        )
+
+        with pytest.raises(Exception, match="function not found"):
+            await service.rpc("missing")
+
+
+@pytest.mark.asyncio
+class TestResilience:
+    """重試、斷路器與請求期限測試"""
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        monkeypatch.setattr(settings, "SUPABASE_RETRY_BACKOFF_BASE", 0)
+
+    @respx.mock
+    async def test_idempotent_read_retried(self, service):
+        """測試 GET 遇到 503 與連線錯誤時重試"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(side_effect=[
+            Response(503),
+            httpx.ConnectError("reset"),
+            Response(200, json=[{"id": "c1"}]),
+        ])
+
+        assert await service.table_select("courses") == [{"id": "c1"}]
+        assert route.call_count == 3
+
+    @respx.mock
+    async def test_non_idempotent_write_not_retried(self, service):
+        """測試 POST 插入不重試"""
+        route = respx.post(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(503, json={"message": "unavailable"})
+        )
+
+        with pytest.raises(Exception, match="unavailable"):
+            await service.table_insert("courses", {"name": "x"})
+        assert route.call_count == 1
+
+    @respx.mock
+    async def test_upsert_retried(self, service):
+        """測試 merge-duplicates upsert 視為冪等並重試"""
+        route = respx.post(f"{service.url}/rest/v1/courses").mock(side_effect=[
+            Response(502),
+            Response(201, json=[{"id": "c1"}]),
+        ])
+
+        result = await service.table_upsert("courses", [{"id": "c1"}])
+
+        assert result.ok
+        assert route.call_count == 2
+
+    @respx.mock
+    async def test_breaker_fails_fast(self, service, monkeypatch):
+        """測試斷路器開啟後不再送出請求"""
+        monkeypatch.setattr(settings, "SUPABASE_RETRY_ATTEMPTS", 0)
+        service._breakers["postgrest"].failure_threshold = 2
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(
+            side_effect=httpx.ConnectError("down")
+        )
+
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await service.table_select("courses")
+        with pytest.raises(CircuitOpenError):
+            await service.table_select("courses")
+
+        assert route.call_count == 2
+        stats = service.resilience_stats
+        assert stats["breakers"]["postgrest"]["state"] == "open"
+        assert stats["breakers"]["gotrue"]["state"] == "closed"
+        assert stats["latency"]["GET /rest/v1/courses"]["errors"] == 2
+
+    @respx.mock
+    async def test_client_errors_keep_breaker_closed(self, service):
+        """測試 4xx 不計入斷路器失敗"""
+        respx.get(f"{service.url}/auth/v1/user").mock(return_value=Response(401))
+
+        for _ in range(10):
+            assert await service.get_user("bad-token") is None
+        assert service.resilience_stats["breakers"]["gotrue"]["state"] == "closed"
+
+    @respx.mock
+    async def test_deadline_exceeded(self, service):
+        """測試超過請求期限時不送出請求"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(200, json=[])
+        )
+
+        with deadline_scope(0.01):
+            await asyncio.sleep(0.02)
+            with pytest.raises(DeadlineExceededError):
+                await service.table_select("courses")
+        assert route.call_count == 0
+
+    @respx.mock
+    async def test_timeout_capped_by_deadline(self, service):
+        """測試單次逾時不超過剩餘期限"""
+        route = respx.get(f"{service.url}/rest/v1/courses").mock(
+            return_value=Response(200, json=[])
+        )
+
+        with deadline_scope(2):
+            await service.table_select("courses")
+
+        timeout = route.calls.last.request.extensions["timeout"]
+        assert 0 < timeout["read"] <= 2
+        assert timeout["connect"] <= 2
+
+    @respx.mock
+    async def test_latency_recorded_per_endpoint(self, service):
+        """測試依端點（路徑樣板）記錄延遲"""
+        respx.get(url__regex=rf"{service.url}/auth/v1/admin/users/.*").mock(
+            return_value=Response(404)
+        )
+
+        await service.admin_get_user("u1")
+        await service.admin_get_user("u2")
+
+        latency = service.resilience_stats["latency"]
+        assert latency["GET /auth/v1/admin/users/{id}"]["count"] == 2
+
+
+REPLICA_1 = "http://replica-1:8000"
+REPLICA_2 = "http://replica-2:8000"
+
+
+@pytest.mark.asyncio
+class TestReadReplicas:
+    """唯讀副本路由測試"""
+
+    @pytest.fixture
+    def replicated(self, service, mock_redis_service) -> SupabaseService:
+        service._replicas = ReplicaRouter(
+            [REPLICA_1, REPLICA_2], sticky_seconds=5, down_seconds=30, redis=mock_redis_service
+        )
+        return service
+
+    @pytest.fixture
+    def other_worker(self, mock_redis_service) -> SupabaseService:
+        """共用同一個 Redis 的另一個行程"""
+        worker = SupabaseService()
+        worker._replicas = ReplicaRouter(
+            [REPLICA_1, REPLICA_2], sticky_seconds=5, down_seconds=30, redis=mock_redis_service
+        )
+        return worker
+
+    @staticmethod
+    def _mock_hosts(service, path: str):
+        """主庫以 "primary" 為鍵"""
+        hosts = {"primary": service.url, REPLICA_1: REPLICA_1, REPLICA_2: REPLICA_2}
+        return {
+            name: respx.get(f"{host}{path}").mock(return_value=Response(200, json=[]))
+            for name, host in hosts.items()
+        }
+
+    @respx.mock
+    async def test_round_robin(self, replicated):
+        """測試讀取輪流送往各副本"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+
+        for offset in range(4):
+            await replicated.table_select("bookings", offset=offset)
+
+        assert routes[REPLICA_1].call_count == 2
+        assert routes[REPLICA_2].call_count == 2
+        assert routes["primary"].call_count == 0
+
+    @respx.mock
+    async def test_failover_marks_replica_down(self, replicated):
+        """測試副本失敗時改走主庫並暫停使用該副本"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+        routes[REPLICA_1].mock(side_effect=httpx.ConnectError("down"))
+
+        await replicated.table_select("bookings", offset=1)
+        await replicated.table_select("bookings", offset=2)
+        await replicated.table_select("bookings", offset=3)
+
+        assert routes[REPLICA_1].call_count == 1
+        assert routes["primary"].call_count == 1
+        assert routes[REPLICA_2].call_count == 2
+        stats = replicated.replica_stats
+        assert stats["replicas"] == {REPLICA_1: "down", REPLICA_2: "up"}
+        assert stats["failovers"] == 1
+
+    @respx.mock
+    async def test_read_your_writes(self, replicated):
+        """測試寫入後同一用戶的讀取走主庫，其他用戶不受影響"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+        respx.post(f"{replicated.url}/rest/v1/bookings").mock(
+            return_value=Response(201, json=[{"id": "b1"}])
+        )
+
+        async def as_user(user_id: str, write: bool):
+            set_read_affinity(user_id)
+            if write:
+                await replicated.table_insert("bookings", {"id": "b1"})
+            await replicated.table_select("bookings", offset=1)
+
+        await asyncio.create_task(as_user("writer", write=True))
+        await asyncio.create_task(as_user("reader", write=False))
+
+        assert routes["primary"].call_count == 1
+        assert routes[REPLICA_1].call_count + routes[REPLICA_2].call_count == 1
+
+    @respx.mock
+    async def test_read_your_writes_across_workers(self, replicated, other_worker, mock_redis_service):
+        """測試寫入後同一用戶在其他行程的讀取同樣走主庫"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+        respx.post(f"{replicated.url}/rest/v1/bookings").mock(
+            return_value=Response(201, json=[{"id": "b1"}])
+        )
+
+        async def as_user(service: SupabaseService, user_id: str, write: bool):
+            set_read_affinity(user_id)
+            if write:
+                await service.table_insert("bookings", {"id": "b1"})
+            await service.table_select("bookings", offset=1)
+
+        await asyncio.create_task(as_user(replicated, "writer", write=True))
+        await asyncio.create_task(as_user(other_worker, "writer", write=False))
+        await asyncio.create_task(as_user(other_worker, "reader", write=False))
+
+        assert routes["primary"].call_count == 2
+        assert routes[REPLICA_1].call_count + routes[REPLICA_2].call_count == 1
+        assert 0 < await mock_redis_service.ttl(redis_keys.read_sticky("writer")) <= 5
+
+    @respx.mock
+    async def test_read_only_rpc_not_sticky(self, replicated):
+        """測試唯讀 RPC 不視為寫入"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+        respx.get(f"{REPLICA_1}/rest/v1/rpc/is_line_bound").mock(return_value=Response(200, json=True))
+
+        async def as_user():
+            set_read_affinity("reader")
+            await replicated.rpc("is_line_bound", {"p_user_id": "u1"}, read_only=True)
+            await replicated.table_select("bookings", offset=1)
+
+        await asyncio.create_task(as_user())
+
+        assert routes["primary"].call_count == 0
+        assert routes[REPLICA_2].call_count == 1
+
+    @respx.mock
+    async def test_sticky_lookup_failure_uses_primary(self, replicated, monkeypatch):
+        """測試無法查詢讀寫一致紀錄時改走主庫"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+
+        async def unavailable(key):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr(replicated._replicas.redis, "exists", unavailable)
+
+        async def as_user():
+            set_read_affinity("reader")
+            await replicated.table_select("bookings", offset=1)
+
+        await asyncio.create_task(as_user())
+
+        assert routes["primary"].call_count == 1
+
+    @respx.mock
+    async def test_anonymous_writes_not_sticky(self, replicated):
+        """測試未設定識別的寫入不會使其他匿名讀取改走主庫"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+        respx.post(f"{replicated.url}/rest/v1/bookings").mock(
+            return_value=Response(201, json=[{"id": "b1"}])
+        )
+
+        async def anonymous(write: bool):
+            set_read_affinity(None)
+            if write:
+                await replicated.table_insert("bookings", {"id": "b1"})
+            await replicated.table_select("bookings", offset=1)
+
+        await asyncio.create_task(anonymous(write=True))
+        await asyncio.create_task(anonymous(write=False))
+
+        assert routes["primary"].call_count == 0
+
+    @respx.mock
+    async def test_force_primary(self, replicated):
+        """測試 primary=True 強制走主庫"""
+        routes = self._mock_hosts(replicated, "/rest/v1/bookings")
+
+        await replicated.table_select("bookings", primary=True)
+        await replicated.table_select_page("bookings", limit=10, primary=True)
+
+        assert routes["primary"].call_count == 2
+
+    @respx.mock
+    async def test_rpc_routing(self, replicated):
+        """測試唯讀 RPC 可走副本，一般 RPC 走主庫"""
+        routes = self._mock_hosts(replicated, "/rest/v1/rpc/is_line_bound")
+        post = respx.post(f"{replicated.url}/rest/v1/rpc/is_line_bound").mock(
+            return_value=Response(200, json=True)
+        )
+
+        await replicated.rpc("is_line_bound", {"p_user_id": "u1"}, read_only=True)
+        await replicated.rpc("is_line_bound", {"p_user_id": "u1"})
+
+        assert routes[REPLICA_1].call_count == 1
+        assert post.call_count == 1
+
+    @respx.mock
+    async def test_no_replicas_configured(self, service):
+        """測試未設定副本時所有讀取走主庫"""
+        route = respx.get(f"{service.url}/rest/v1/bookings").mock(
+            return_value=Response(200, json=[])
+        )
+
+        await service.table_select("bookings")
+
+        assert route.call_count == 1
+        assert service.replica_stats["replicas"] == {}
+
+
+class TestHelpers:
+    """同步輔助函數測試"""
+
+    def test_parse_content_range(self):
+        """測試 Content-Range 解析"""
+        assert SupabaseService._parse_content_range("0-19/342") == 342
+        assert SupabaseService._parse_content_range("*/0") == 0
+        assert SupabaseService._parse_content_range("0-19/*") is None
+        assert SupabaseService._parse_content_range(None) is None
+
+    def test_chunk_by_bytes(self):
+        """測試依 JSON 大小切塊"""
+        rows = [{"text": "x" * 100} for _ in range(10)]
+        chunks = list(SupabaseService._chunk_rows(rows, max_rows=100, max_bytes=300))
+        assert all(len(c) <= 2 for c in chunks)
+        assert sum(len(c) for c in chunks) == 10
+
+
+class TestRecords:
+    """回應資料物件測試"""
+
+    def test_user_reads_without_copy(self):
+        """測試用戶物件直接讀取原始 dict 且為唯讀"""
+        data = {"id": "u1", "email": "a@x.com", "user_metadata": {"role": "student"}}
+        user = SupabaseUser(data)
+
+        assert user.id == "u1"
+        assert user.user_metadata is data["user_metadata"]
+        assert user.email_confirmed_at is None
+        with pytest.raises(AttributeError):
+            user.email = "b@x.com"
+        with pytest.raises(AttributeError):
+            user.extra = 1
+
+    def test_auth_response_wraps_lazily(self):
+        """測試 Auth 回應的 user / session"""
+        response = SupabaseAuthResponse({
+            "user": {"id": "u1"},
+            "session": {"access_token": "t", "expires_in": 3600},
+        })
+
+        assert response.user.id == "u1"
+        assert response.session.expires_in == 3600
+        assert response.error is None
+        assert SupabaseAuthResponse({}).user is None
+
+    def test_line_binding_from_row(self):
+        """測試 Line 綁定由資料列建立（預設值與唯讀）"""
+        binding = LineBinding.from_row({
+            "id": "b1", "user_id": "u1", "line_user_id": "U1",
+            "created_at": "2026-01-01T00:00:00Z",
+        })
+
+        assert binding.binding_status == "active"
+        assert binding.channel_type == "student"
+        assert binding.notify_booking_reminder is True
+        assert binding.bound_at == "2026-01-01T00:00:00Z"
+        assert not hasattr(binding, "__dict__")
+        with pytest.raises(AttributeError):
+            binding.user_id = "u2"
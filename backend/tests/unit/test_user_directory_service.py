@@ -0,0 +1,186 @@
+import pytest
+import respx
+from httpx import Response
+
+from app.config import settings
+from app.services.supabase_service import supabase_service, SupabaseUser
+from app.services.user_directory_service import UserDirectoryService
+
+ADMIN_USERS = f"{supabase_service.url}/auth/v1/admin/users"
+UPDATED_USERS = f"{supabase_service.url}/rest/v1/rpc/list_users_updated_after"
+
+
+def user(user_id: str, email: str, updated_at: str = "2026-01-01T00:00:00Z") -> dict:
+    return {
+        "id": user_id,
+        "email": email,
+        "created_at": "2026-01-01T00:00:00Z",
+        "updated_at": updated_at,
+        "user_metadata": {"name": user_id},
+    }
+
+
+@pytest.fixture
+def directory(mock_redis_service, monkeypatch) -> UserDirectoryService:
+    monkeypatch.setattr(settings, "USER_DIRECTORY_PAGE_SIZE", 2)
+    service = UserDirectoryService()
+    service.redis = mock_redis_service
+    return service
+
+
+@pytest.mark.asyncio
+class TestUserDirectoryService:
+    """用戶目錄鏡像測試"""
+
+    @respx.mock
+    async def test_full_sync_pages_and_indexes(self, directory):
+        """測試全量同步逐頁讀取並建立 id / email 索引"""
+        route = respx.get(ADMIN_USERS).mock(side_effect=[
+            Response(200, json={"users": [user("u1", "A@x.com"), user("u2", "b@x.com")]}),
+            Response(200, json={"users": [user("u3", "c@x.com")]}),
+        ])
+
+        assert await directory.full_sync() == 3
+        assert route.call_count == 2
+        assert route.calls[1].request.url.params["page"] == "2"
+
+        found = await directory.get_by_email("a@X.com")
+        assert found.id == "u1"
+        assert found.to_dict()["user_metadata"] == {"name": "u1"}
+        assert (await directory.get_by_id("u3")).email == "c@x.com"
+        # 查詢皆由鏡像回應
+        assert route.call_count == 2
+        assert directory.hits == 2
+
+    @respx.mock
+    async def test_full_sync_removes_deleted_users(self, directory):
+        """測試全量同步移除已不存在的用戶"""
+        await directory.put(SupabaseUser(user("gone", "gone@x.com")))
+        respx.get(ADMIN_USERS).mock(
+            return_value=Response(200, json={"users": [user("u1", "a@x.com")]})
+        )
+
+        await directory.full_sync()
+
+        assert await directory._get_record("gone") is None
+        assert await directory.redis.hget(directory.EMAIL_INDEX, "gone@x.com") is None
+        assert await directory.redis.smembers(directory.IDS_KEY) == {"u1"}
+
+    @respx.mock
+    async def test_full_sync_failure_keeps_mirror(self, directory):
+        """測試讀取失敗時不清除既有鏡像"""
+        await directory.put(SupabaseUser(user("u1", "a@x.com")))
+        respx.get(ADMIN_USERS).mock(return_value=Response(500, json={}))
+
+        with pytest.raises(Exception):
+            await directory.full_sync()
+
+        assert await directory._get_record("u1") is not None
+
+    @respx.mock
+    async def test_refresh_reads_updated_users(self, directory):
+        """測試增量更新依 updated_at 分頁讀取，涵蓋較早建立但之後更新的用戶"""
+        respx.get(ADMIN_USERS).mock(side_effect=[
+            Response(200, json={"users": [
+                user("u1", "a@x.com", "2026-01-01T00:00:00Z"),
+                user("u2", "b@x.com", "2026-01-02T00:00:00Z"),
+            ]}),
+            Response(200, json={"users": []}),
+        ])
+        await directory.full_sync()
+        route = respx.get(UPDATED_USERS).mock(side_effect=[
+            Response(200, json=[
+                # 與鏡像相同（時間格式不同）的重疊資料不算變更
+                user("u2", "b@x.com", "2026-01-02T00:00:00+00:00"),
+                user("u1", "a2@x.com", "2026-03-01T00:00:00+00:00"),
+            ]),
+            Response(200, json=[user("u3", "c@x.com", "2026-03-02T00:00:00+00:00")]),
+        ])
+
+        assert await directory.refresh() == 2
+        assert route.call_count == 2
+        first, second = (call.request.url.params for call in route.calls)
+        # 自上次游標往前重疊，之後以 (updated_at, id) 接續
+        assert first["p_updated_at"] == "2026-01-01T23:59:00+00:00"
+        assert "p_id" not in first
+        assert (second["p_updated_at"], second["p_id"]) == ("2026-03-01T00:00:00+00:00", "u1")
+        assert (await directory.get_by_email("a2@x.com")).id == "u1"
+        assert await directory.redis.hget(directory.EMAIL_INDEX, "a@x.com") is None
+        assert (await directory.get_by_email("c@x.com")).id == "u3"
+        assert await directory.redis.hget(directory.META_KEY, "updated_cursor") == "2026-03-02T00:00:00+00:00"
+
+    async def test_put_moves_email_index(self, directory):
+        """測試 email 變更時更新索引"""
+        await directory.put(SupabaseUser(user("u1", "old@x.com")))
+        await directory.put(SupabaseUser(user("u1", "new@x.com")))
+
+        assert await directory.redis.hget(directory.EMAIL_INDEX, "old@x.com") is None
+        assert await directory.redis.hget(directory.EMAIL_INDEX, "new@x.com") == "u1"
+
+    @respx.mock
+    async def test_get_by_id_miss_writes_through(self, directory):
+        """測試鏡像未命中時查詢 GoTrue 並寫回"""
+        route = respx.get(f"{ADMIN_USERS}/u9").mock(
+            return_value=Response(200, json=user("u9", "z@x.com"))
+        )
+
+        assert (await directory.get_by_id("u9")).email == "z@x.com"
+        assert (await directory.get_by_id("u9")).email == "z@x.com"
+        assert route.call_count == 1
+        assert directory.misses == 1
+
+    @respx.mock
+    async def test_get_by_email_miss_uses_rpc(self, directory):
+        """測試 email 未命中時以資料庫函數查詢"""
+        rpc = respx.get(f"{supabase_service.url}/rest/v1/rpc/find_user_by_line_email").mock(
+            return_value=Response(200, json="u5")
+        )
+        respx.get(f"{ADMIN_USERS}/u5").mock(
+            return_value=Response(200, json=user("u5", "e@x.com"))
+        )
+
+        assert (await directory.get_by_email("e@x.com")).id == "u5"
+        assert (await directory.get_by_email("e@x.com")).id == "u5"
+        assert rpc.call_count == 1
+
+    @respx.mock
+    async def test_update_user_writes_through(self, directory):
+        """測試管理員更新用戶後同步寫入鏡像"""
+        await directory.put(SupabaseUser(user("u1", "a@x.com")))
+        respx.put(f"{ADMIN_USERS}/u1").mock(
+            return_value=Response(200, json=user("u1", "a2@x.com", "2026-02-01T00:00:00Z"))
+        )
+
+        await directory.update_user("u1", {"email": "a2@x.com"})
+
+        assert (await directory.get_by_email("a2@x.com")).id == "u1"
+        assert await directory.redis.hget(directory.EMAIL_INDEX, "a@x.com") is None
+
+    @respx.mock
+    async def test_sync_once_uses_shared_full_sync_time(self, directory):
+        """測試上次全量同步時間記錄於 Redis：其他實例不重複全量同步"""
+        route = respx.get(ADMIN_USERS).mock(
+            return_value=Response(200, json={"users": [user("u1", "a@x.com")]})
+        )
+
+        updated = respx.get(UPDATED_USERS).mock(return_value=Response(200, json=[]))
+
+        assert await directory.sync_once() is True
+        assert route.call_count == 1
+        # 其他實例持有鎖時略過
+        assert await directory.sync_once() is False
+
+        other = UserDirectoryService()
+        other.redis = directory.redis
+        await directory.redis.delete(directory.LOCK_KEY)
+        assert await other.sync_once() is True
+        assert route.call_count == 1
+        assert updated.call_count == 1
+
+    async def test_renew_lock_only_own_token(self, directory):
+        """測試只延長自己持有的鎖"""
+        await directory.redis.set(directory.LOCK_KEY, "mine", expire_seconds=10)
+
+        assert await directory.redis.run_script("renew_lock", [directory.LOCK_KEY], ["mine", 60]) == 1
+        assert await directory.redis.ttl(directory.LOCK_KEY) > 10
+        assert await directory.redis.run_script("renew_lock", [directory.LOCK_KEY], ["other", 60]) == 0
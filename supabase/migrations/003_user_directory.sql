@@ -0,0 +1,29 @@
+-- ============================================
+-- 用戶目錄鏡像增量同步
+-- GoTrue Admin API 只能依 created_at 排序，無法找出較早建立、之後才更新的用戶；
+-- 後端改以此函數依 (updated_at, id) 分頁讀取上次同步後變更的用戶
+-- ============================================
+
+CREATE OR REPLACE FUNCTION list_users_updated_after(
+    p_updated_at TIMESTAMPTZ,
+    p_id UUID DEFAULT '00000000-0000-0000-0000-000000000000',
+    p_limit INT DEFAULT 500
+)
+RETURNS TABLE (
+    id UUID,
+    email VARCHAR,
+    email_confirmed_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    user_metadata JSONB
+) AS $$
+    SELECT u.id, u.email, u.email_confirmed_at, u.created_at, u.updated_at, u.raw_user_meta_data
+    FROM auth.users u
+    WHERE (u.updated_at, u.id) > (p_updated_at, p_id)
+    ORDER BY u.updated_at, u.id
+    LIMIT p_limit;
+$$ LANGUAGE sql SECURITY DEFINER STABLE;
+
+-- 可讀取所有用戶的 email 與 metadata，僅限 service_role 呼叫
+REVOKE EXECUTE ON FUNCTION list_users_updated_after(TIMESTAMPTZ, UUID, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION list_users_updated_after(TIMESTAMPTZ, UUID, INT) TO service_role;